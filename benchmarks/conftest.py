@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: conftest
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Shared fixtures for the benchmarks.
+"""
+from typing import Iterator
+import pytest
+from elastalk.fake import FakeElasticsearch
+
+try:
+    import pytest_benchmark  # pylint: disable=unused-import
+except ImportError:
+    # Without the plugin, there's no `benchmark` fixture (so there's nothing
+    # we can run).
+    collect_ignore_glob = ['test_*.py']  # pylint: disable=invalid-name
+
+
+@pytest.fixture(scope='session', name='fake_es')
+def fake_es_fixture() -> Iterator[FakeElasticsearch]:
+    """
+    This fixture runs a :py:class:`fake Elasticsearch server
+    <elastalk.fake.FakeElasticsearch>`.
+
+    :return: the server
+    """
+    with FakeElasticsearch() as fake:
+        yield fake
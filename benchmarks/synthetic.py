@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: synthetic
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Synthetic documents for the benchmarks.
+"""
+import random
+import string
+from typing import Any, Dict
+
+
+def make_doc(width: int, value_size: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Make a synthetic document.
+
+    :param width: the number of (top-level) fields
+    :param value_size: the length of each string value
+    :param seed: the random seed (The same arguments always make the same
+        document.)
+    :return: the document
+    """
+    rnd = random.Random(f'{width}:{value_size}:{seed}')
+    doc: Dict[str, Any] = {'id': str(seed)}
+    for i in range(width - 1):
+        # Mix strings, numbers and small nested objects.
+        if i % 3 == 0:
+            doc[f'field_{i}'] = ''.join(
+                rnd.choices(string.ascii_letters, k=value_size)
+            )
+        elif i % 3 == 1:
+            doc[f'field_{i}'] = rnd.random() * 1000
+        else:
+            doc[f'field_{i}'] = {'flag': bool(i % 2), 'count': i}
+    return doc
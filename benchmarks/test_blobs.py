@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_blobs
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Benchmarks for packing, unpacking, encoding and decoding blobs.
+"""
+import pytest
+from elastalk.config import ElastalkConf
+from elastalk.connect import ElastalkConnection, _decode, _encode
+from synthetic import make_doc
+
+WIDTHS = [10, 100, 1000]  #: the numbers of fields in the synthetic documents
+VALUE_SIZES = [8, 256]  #: the lengths of the string values
+
+
+@pytest.fixture(scope='module', name='cnx')
+def cnx_fixture() -> ElastalkConnection:
+    """
+    This fixture returns a connection that blobs everything but the ID.
+
+    :return: the connection
+    """
+    return ElastalkConnection(
+        ElastalkConf().from_dict({
+            'blobs': {'enabled': True, 'excluded': ['id']}
+        })
+    )
+
+
+@pytest.mark.parametrize('value_size', VALUE_SIZES)
+@pytest.mark.parametrize('width', WIDTHS)
+def test_pack(benchmark, cnx: ElastalkConnection, width: int, value_size: int):
+    """
+    Pack a document.
+
+    :param benchmark: the benchmark fixture
+    :param cnx: the connection
+    :param width: the number of fields in the document
+    :param value_size: the length of each string value
+    """
+    doc = make_doc(width, value_size)
+    benchmark.group = f'pack width={width}'
+    benchmark(cnx.pack, doc, index='bench')
+
+
+@pytest.mark.parametrize('value_size', VALUE_SIZES)
+@pytest.mark.parametrize('width', WIDTHS)
+def test_unpack(
+        benchmark, cnx: ElastalkConnection, width: int, value_size: int
+):
+    """
+    Unpack a packed document.
+
+    :param benchmark: the benchmark fixture
+    :param cnx: the connection
+    :param width: the number of fields in the document
+    :param value_size: the length of each string value
+    """
+    packed = cnx.pack(make_doc(width, value_size), index='bench')
+    benchmark.group = f'unpack width={width}'
+    benchmark(cnx.unpack, packed, index='bench')
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+@pytest.mark.parametrize('width', WIDTHS)
+def test_encode(benchmark, width: int, compression: str):
+    """
+    Encode a document as a blob.
+
+    :param benchmark: the benchmark fixture
+    :param width: the number of fields in the document
+    :param compression: the compression applied to the blob
+    """
+    doc = make_doc(width, 64)
+    benchmark.group = f'encode width={width}'
+    benchmark(_encode, doc, compression=compression)
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+@pytest.mark.parametrize('width', WIDTHS)
+def test_decode(benchmark, width: int, compression: str):
+    """
+    Decode a blob.
+
+    :param benchmark: the benchmark fixture
+    :param width: the number of fields in the document
+    :param compression: the compression applied to the blob
+    """
+    blob = _encode(make_doc(width, 64), compression=compression)
+    benchmark.group = f'decode width={width}'
+    benchmark(_decode, blob)
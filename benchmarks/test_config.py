@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_config
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Benchmarks for looking up per-index blob configurations.
+"""
+import pytest
+from elastalk.config import ElastalkConf
+
+
+@pytest.fixture(scope='module', name='config')
+def config_fixture() -> ElastalkConf:
+    """
+    This fixture returns a configuration with a few dozen indexes.
+
+    :return: the configuration
+    """
+    return ElastalkConf().from_dict({
+        'blobs': {'enabled': True, 'excluded': ['id', 'owner_']},
+        'indexes': {
+            f'index{i}': {
+                'blobs': {'enabled': bool(i % 2), 'excluded': [f'field{i}']}
+            }
+            for i in range(50)
+        }
+    })
+
+
+@pytest.mark.parametrize('index', [None, 'index7', 'unconfigured'])
+def test_blobs_enabled(benchmark, config: ElastalkConf, index: str):
+    """
+    Determine whether or not blobbing is enabled for an index.
+
+    :param benchmark: the benchmark fixture
+    :param config: the configuration
+    :param index: the name of the index
+    """
+    benchmark.group = 'blobs_enabled'
+    benchmark(config.blobs_enabled, index=index)
+
+
+@pytest.mark.parametrize('index', [None, 'index7', 'unconfigured'])
+def test_blob_key(benchmark, config: ElastalkConf, index: str):
+    """
+    Get the blob key for an index.
+
+    :param benchmark: the benchmark fixture
+    :param config: the configuration
+    :param index: the name of the index
+    """
+    benchmark.group = 'blob_key'
+    benchmark(config.blob_key, index=index)
+
+
+@pytest.mark.parametrize('index', [None, 'index7', 'unconfigured'])
+def test_blob_exclusions(benchmark, config: ElastalkConf, index: str):
+    """
+    Get the blob exclusions for an index.
+
+    :param benchmark: the benchmark fixture
+    :param config: the configuration
+    :param index: the name of the index
+    """
+    benchmark.group = 'blob_exclusions'
+    benchmark(config.blob_exclusions, index=index)
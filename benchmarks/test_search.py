@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_search
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Benchmarks for extracting documents from search results.
+"""
+import uuid
+import pytest
+from elastalk.search import extract_hits
+from synthetic import make_doc
+
+
+def _result(hits: int, width: int) -> dict:
+    """
+    Make a search result.
+
+    :param hits: the number of hits
+    :param width: the number of fields in each document
+    :return: the search result
+    """
+    return {
+        'hits': {
+            'hits': [
+                {
+                    '_id': str(uuid.UUID(int=i)),
+                    '_source': make_doc(width, 16, seed=i)
+                }
+                for i in range(hits)
+            ]
+        }
+    }
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('width', [10, 100])
+def test_extract_hits(benchmark, width: int, lazy: bool):
+    """
+    Extract the documents from a large search result.
+
+    :param benchmark: the benchmark fixture
+    :param width: the number of fields in each document
+    :param lazy: `True` to extract lazy views of the hits
+    """
+    result = _result(10000, width)
+    benchmark.group = f'extract_hits width={width}'
+    benchmark(lambda: list(extract_hits(result, lazy=lazy)))
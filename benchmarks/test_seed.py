@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: test_seed
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Benchmarks for seeding indexes (against a fake Elasticsearch server).
+"""
+import json
+from pathlib import Path
+import uuid
+import pytest
+from elastalk.fake import FakeElasticsearch
+from elastalk.seed import seed
+from synthetic import make_doc
+
+DOCUMENTS = 5000  #: the number of documents in each index
+
+
+@pytest.fixture(scope='module', name='seed_root')
+def seed_root_fixture(tmp_path_factory) -> Path:
+    """
+    This fixture writes synthetic seed data.
+
+    :param tmp_path_factory: the temporary path factory
+    :return: the root directory of the seed data
+    """
+    root = tmp_path_factory.mktemp('seed')
+    (root / 'config.toml').write_text(
+        "[indexes.wide.blobs]\n"
+        "enabled = true\n"
+        "excluded = ['id']\n"
+    )
+    for index, width in [('narrow', 10), ('wide', 200)]:
+        docdir = root / 'indexes' / index / 'doc'
+        docdir.mkdir(parents=True)
+        for i in range(DOCUMENTS):
+            (docdir / str(uuid.UUID(int=i))).write_text(
+                json.dumps(make_doc(width, 32, seed=i))
+            )
+    lines = root / 'indexes' / 'lines' / 'doc' / 'lines.ndjson'
+    lines.parent.mkdir(parents=True)
+    lines.write_text(''.join(
+        json.dumps({'_id': str(i), **make_doc(10, 32, seed=i)}) + '\n'
+        for i in range(DOCUMENTS)
+    ))
+    return root
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_seed(
+        benchmark,
+        seed_root: Path,
+        fake_es: FakeElasticsearch,
+        processes: bool
+):
+    """
+    Seed indexes of narrow, wide (blobbed) and NDJSON documents.
+
+    :param benchmark: the benchmark fixture
+    :param seed_root: the root directory of the seed data
+    :param fake_es: the fake Elasticsearch server
+    :param processes: `True` to read and pack the files in processes
+    """
+    benchmark.group = 'seed'
+    stats = benchmark.pedantic(
+        seed,
+        kwargs={
+            'root': seed_root,
+            'force': True,
+            'options': {
+                'seeds': fake_es.address,
+                'seed_processes': processes
+            }
+        },
+        rounds=3,
+        iterations=1
+    )
+    assert sum(s.indexed for s in stats.values()) == 3 * DOCUMENTS
+
+
+@pytest.mark.parametrize('latency', [0.002, 0.01])
+def test_seed_busy_cluster(benchmark, seed_root: Path, latency: float):
+    """
+    Seed a cluster that's slow to respond (and rejects some documents), so
+    the bulk threads and retries earn their keep.
+
+    :param benchmark: the benchmark fixture
+    :param seed_root: the root directory of the seed data
+    :param latency: the number of seconds the server takes to respond
+    """
+    benchmark.group = 'seed (busy cluster)'
+    with FakeElasticsearch(
+            latency=latency, rejection_rate=0.01, seed=0
+    ) as fake:
+        stats = benchmark.pedantic(
+            seed,
+            kwargs={
+                'root': seed_root,
+                'force': True,
+                'options': {
+                    'seeds': fake.address,
+                    'bulk_initial_backoff': 0.01,
+                    'bulk_max_retries': 10
+                }
+            },
+            rounds=3,
+            iterations=1
+        )
+    assert sum(s.indexed for s in stats.values()) == 3 * DOCUMENTS
@@ -9,6 +9,14 @@ Simple Conveniences for Talking to Elasticsearch
 """
 from .version import __version__, __release__
 from .config import ElastalkConf, ElastalkConfigException
-from .connect import ElastalkMixin
-from .seed import seed
-from .search import extract_hit, extract_hits
+from .connect import ConnectionRegistry, ElastalkMixin
+from .dump import dump
+from .reindex import reindex
+from .seed import iter_seed_files, seed
+from .search import (
+    extract_hit,
+    extract_hits,
+    export_slices,
+    iter_documents,
+    iter_sliced_documents
+)
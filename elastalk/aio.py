@@ -0,0 +1,542 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.aio
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Talk to Elasticsearch without leaving the event loop!
+
+.. note::
+
+    The classes and functions in this module require an asynchronous
+    Elasticsearch client, which is provided by the
+    `elasticsearch-async <https://pypi.org/project/elasticsearch-async/>`_
+    package (or by `elasticsearch[async]` in newer versions of the
+    Elasticsearch client).
+"""
+import asyncio
+from functools import partial
+from itertools import chain
+import logging
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Set,
+    Tuple
+)
+import elasticsearch
+from .cache import cache_key, invalidate
+from .config import ElastalkConf, ElastalkConfigException
+from .connect import ElastalkConnection
+from .search import ID_FIELD, _body, extract_hit
+from .seed import (
+    SeedStats,
+    _BulkAttempts,
+    _BulkItem,
+    _LOAD_MODE_BODY,
+    _chunks,
+    _document_count,
+    _index_dirs,
+    _originals,
+    _pipeline,
+    _prepare,
+    _restore_requests,
+    _seed_files
+)
+
+try:
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    try:
+        from elasticsearch_async import AsyncElasticsearch
+    except ImportError:  # pragma: no cover
+        AsyncElasticsearch = None
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
+
+
+class AsyncElastalkConnection(ElastalkConnection):
+    """
+    Defines an Elasticsearch environment for use with :py:mod:`asyncio`.
+    """
+    def __init__(self, config: ElastalkConf = None):
+        """
+
+        :param config: the configuration
+        """
+        super().__init__(config)
+        # These are the asynchronous connections to the clusters to which
+        # indexes are routed (by cluster name).
+        self._routed: Dict[str, 'AsyncElastalkConnection'] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = super().__getstate__()
+        state['_routed'] = {}
+        return state
+
+    @property
+    def client(self) -> 'AsyncElasticsearch':
+        """
+        Get the asynchronous Elasticsearch client.
+
+        :return: the asynchronous Elasticsearch client
+        :raises ElasticsearchConfigurationException: if there is an error in
+            the current configuration, or no asynchronous client is installed
+        """
+        return super().client
+
+    def _create_client(self) -> 'AsyncElasticsearch':
+        if AsyncElasticsearch is None:
+            raise ElastalkConfigException(
+                'An asynchronous Elasticsearch client is not installed.'
+            )
+        return AsyncElasticsearch(
+            list(self.config.seeds),
+            **self._client_kwargs()
+        )
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        kwargs = super()._client_kwargs()
+        # The synchronous connection classes don't work with the asynchronous
+        # client, which brings its own.
+        if kwargs.pop('connection_class', None) is not None:
+            __logger__.warning(
+                'The connection class is ignored by the asynchronous client.'
+            )
+        return kwargs
+
+    @staticmethod
+    def _close_client(client: 'AsyncElasticsearch'):
+        # Closing the transport is a coroutine.  If the event loop is running
+        # we can only schedule it.  (Use `close()` if you can wait for it.)
+        coro = client.transport.close()
+        try:
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                loop.create_task(coro)
+            else:
+                loop.run_until_complete(coro)
+        except RuntimeError:
+            coro.close()
+            __logger__.warning(
+                'The client could not be closed because there is no event '
+                'loop.'
+            )
+
+    def for_index(
+            self,
+            index: str,
+            write: bool = False
+    ) -> 'AsyncElastalkConnection':
+        """
+        Get the asynchronous connection to the cluster that serves reads from
+        (or writes to) an index.  The cluster is looked up the way
+        :py:meth:`ElastalkConnection.for_index
+        <elastalk.connect.ElastalkConnection.for_index>` looks it up.  If the
+        registered connection isn't asynchronous, an asynchronous connection
+        with the same configuration is created (once for each cluster).
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the connection
+        :raises ElastalkConfigException: if the index is routed to a cluster
+            that isn't registered
+        """
+        cnx = super().for_index(index, write=write)
+        if isinstance(cnx, AsyncElastalkConnection):
+            return cnx
+        name = self.config.cluster_for(index, write=write)
+        with self._lock:
+            routed = self._routed.get(name)
+            if routed is None or routed.config is not cnx.config:
+                routed = self._routed[name] = AsyncElastalkConnection(
+                    cnx.config
+                )
+            return routed
+
+    async def search(
+            self,
+            index: str,
+            body: Mapping[str, Any] = None,
+            **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Search an index.  This is the asynchronous counterpart of
+        :py:meth:`ElastalkConnection.search
+        <elastalk.connect.ElastalkConnection.search>` (and results are
+        :ref:`cached <configuration_cache>` the same way).
+
+        :param index: the name of the index
+        :param body: the search body
+        :param kwargs: other arguments for the asynchronous client's `search()`
+        :return: the search result (Don't modify it, it may be shared.)
+        """
+        # Send the search to the cluster that serves reads from the index.
+        client = self.for_index(index).client
+        fetch = partial(client.search, index=index, body=body, **kwargs)
+        cache = self._cache(index)
+        if cache is None:
+            return await fetch()
+        return await cache.aget(cache_key(index, body, **kwargs), fetch)
+
+    async def close(self):
+        """Close the client (if it has been created) and reset the connection."""
+        with self._lock:
+            client, self._client = self._client, None
+            routed, self._routed = list(self._routed.values()), {}
+        if client is not None:
+            await client.transport.close()
+        # Close the connections to the clusters to which indexes are routed.
+        for cnx in routed:
+            await cnx.close()
+        self.reset()
+
+    @staticmethod
+    def default(
+            cnx: 'AsyncElastalkConnection' = None
+    ) -> 'AsyncElastalkConnection':
+        """
+        Set and/or retrieve the default asynchronous connection object.
+
+        :param cnx: Provide a new connection object if you want to change the
+            default.  Otherwise, leave this argument out to retrieve the
+            current object.
+        :return: the default connection object
+        """
+        if cnx:
+            setattr(AsyncElastalkConnection, '__async_default__', cnx)
+            return cnx
+        try:
+            return getattr(AsyncElastalkConnection, '__async_default__')
+        except AttributeError:
+            _cnx = AsyncElastalkConnection()
+            return AsyncElastalkConnection.default(cnx=_cnx)
+
+
+class AsyncElastalkMixin:
+    """
+    Mix this into your class to get easy access to the asynchronous
+    Elasticsearch client.
+    """
+
+    @property
+    def es_cnx(self) -> AsyncElastalkConnection:
+        """
+        Get the asynchronous Elastalk connection object.
+
+        :return: the asynchronous Elastalk connection object
+        """
+        try:
+            return getattr(self, '__async_elastalk_connection__')
+        except AttributeError:
+            _cnx = AsyncElastalkConnection.default()
+            setattr(self, '__async_elastalk_connection__', _cnx)
+            return _cnx
+
+    @es_cnx.setter
+    def es_cnx(self, cnx: AsyncElastalkConnection):
+        """
+        Set the mixin's asynchronous Elastalk connection object.
+
+        :param cnx: the object
+        """
+        setattr(self, '__async_elastalk_connection__', cnx)
+
+    @property
+    def es(self) -> 'AsyncElasticsearch':
+        """Get the asynchronous Elasticsearch client."""
+        return self.es_cnx.client
+
+
+async def iter_documents(
+        cnx: AsyncElastalkConnection,
+        index: str,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        sort: List[Any] = None,
+        scroll: str = '5m',
+        slice_: Tuple[int, int] = None,
+        includes: Tuple[str] = (ID_FIELD,),
+        source: str = '_source',
+        unpack: bool = False,
+        uuids: bool = True
+) -> AsyncIterator[Mapping[str, Any]]:
+    """
+    Page through all the documents in an index that match a query.  This is
+    the asynchronous counterpart of
+    :py:func:`elastalk.search.iter_documents`: the next page is requested
+    while the current one is being consumed and the scroll (if there is one)
+    is cleared when the iteration finishes (or is closed early).
+
+    :param cnx: the connection (If the configuration routes reads from the
+        index to another cluster, that cluster's :py:meth:`connection
+        <AsyncElastalkConnection.for_index>` is used instead.)
+    :param index: the name of the index
+    :param query: the query (If you don't supply a query, all documents are
+        returned.)
+    :param size: the number of documents in a page
+    :param sort: the search_after sort (If you don't supply one, a scroll is
+        used.)
+    :param scroll: how long Elasticsearch should keep the scroll context
+    :param slice_: the slice ID and the number of slices (for a sliced
+        scroll)
+    :param includes: the metadata keys to include in the return document
+    :param source: the key that contains the source document
+    :param unpack: `True` to :py:func:`unpack
+        <elastalk.connect.ElastalkConnection.unpack>` the documents
+    :param uuids: `True` to convert the document IDs to UUIDs
+    :return: an asynchronous iteration of search result documents
+    """
+    # Read from the cluster that serves the index.
+    cnx = cnx.for_index(index)
+    es = cnx.client
+    body = _body(query=query, size=size, sort=sort if sort else ['_doc'])
+    scroll_id: str = None
+    if sort:
+        fetch = es.search(index=index, body=body)
+    else:
+        if slice_:
+            body['slice'] = {'id': slice_[0], 'max': slice_[1]}
+        fetch = es.search(index=index, body=body, scroll=scroll)
+    pending: asyncio.Future = asyncio.ensure_future(fetch)
+    try:
+        while pending:
+            resp = await pending
+            pending = None
+            if not sort:
+                scroll_id = resp.get('_scroll_id', scroll_id)
+            hits = resp['hits']['hits']
+            if not hits:
+                break
+            # Start fetching the next page before handing over this one.
+            if not sort:
+                pending = asyncio.ensure_future(
+                    es.scroll(scroll_id=scroll_id, scroll=scroll)
+                )
+            elif len(hits) == size:
+                body['search_after'] = hits[-1]['sort']
+                pending = asyncio.ensure_future(
+                    es.search(index=index, body=body)
+                )
+            for hit in hits:
+                doc = extract_hit(
+                    hit, includes=includes, source=source, uuids=uuids
+                )
+                yield cnx.unpack(doc, index=index) if unpack else doc
+    finally:
+        # Let the request that's in flight finish...
+        if pending:
+            resp = await pending
+            if not sort:
+                scroll_id = resp.get('_scroll_id', scroll_id)
+        # ...so we can clean up the scroll.
+        if scroll_id:
+            await es.clear_scroll(
+                body={'scroll_id': [scroll_id]}, ignore=(404,)
+            )
+
+
+async def seed(root: str or Path,
+               config: str or Path = 'config.toml',
+               force: bool = False) -> Dict[str, SeedStats]:
+    """
+    Populate an Elasticsearch instance with seed data.  This is the
+    asynchronous counterpart of :py:func:`elastalk.seed.seed`: seed files are
+    read and packed by a pool of workers while up to
+    :py:attr:`bulk_threads <elastalk.config.ElastalkConf.bulk_threads>` bulk
+    requests are in flight on the event loop.  (Like the synchronous
+    version, indexes are seeded on the :ref:`cluster <configuration_clusters>`
+    that serves writes to them, and :py:attr:`load mode
+    <elastalk.config.ElastalkConf.seed_load_mode>` is supported.)
+
+    :param root: the root directory that contains the seed data
+    :param config: the path to the configuration
+    :param force: delete existing indexes and replace them with seed data
+    :return: a summary of the outcome for each index
+    :raises FileNotFoundError: if the path does not exist
+    :raises NotADirectoryError: if the path is not a directory
+    """
+    # Figure out where the indexes are and how they're configured.
+    _indexes, registry = _prepare(root=root, config=config)
+    etconf = registry.config
+    # We'll create an asynchronous connection for each cluster we write to.
+    etconns: Dict[str, AsyncElastalkConnection] = {}
+
+    def _client(index: str) -> 'AsyncElasticsearch':
+        name = etconf.cluster_for(index, write=True) or registry.DEFAULT
+        if name not in etconns:
+            etconns[name] = AsyncElastalkConnection(registry.get(name).config)
+        return etconns[name].client
+
+    # We'll keep track of what happens to each index...
+    stats: Dict[str, SeedStats] = {}
+    # ...and the original settings of the indexes in load mode.
+    loading: Dict[str, Dict[str, Any]] = {}
+    loop = asyncio.get_event_loop()
+    limit = max(1, etconf.bulk_threads)
+    chunks: Iterator[List[_BulkItem]] or None = None
+    pending: Set[asyncio.Future] = set()
+
+    def _tally(done: Set[asyncio.Future]):
+        for task in done:
+            for _index, _, ok in task.result():
+                if ok:
+                    stats[_index].indexed += 1
+                else:
+                    stats[_index].failed += 1
+
+    try:
+        # Prepare the indexes.
+        idxdirs: List[Path] = []
+        for idxdir in _index_dirs(_indexes):
+            _index: str = idxdir.stem
+            stats[_index] = SeedStats()
+            es = _client(_index)
+            # If we've been instructed to *force* the seed data into the
+            # database...
+            if force:  # ...drop the index.
+                await es.indices.delete(index=_index, ignore=[400, 404])
+            elif await es.indices.exists(index=_index):
+                __logger__.warning(
+                    f"Index '{_index}' already exists. Skipping."
+                )
+                stats[_index].skipped = _document_count(idxdir)
+                continue
+            await es.indices.create(
+                index=_index, body=etconf.index_body(_index, root=_indexes)
+            )
+            if etconf.seed_load_mode:
+                loading[_index] = _originals(
+                    await es.indices.get_settings(
+                        index=_index, flat_settings=True
+                    ),
+                    index=_index
+                )
+                await es.indices.put_settings(index=_index, body=_LOAD_MODE_BODY)
+            idxdirs.append(idxdir)
+
+        # Read, parse, pack and chunk the files on other threads...
+        chunks = _chunks(
+            _pipeline(
+                files=chain.from_iterable(_seed_files(d) for d in idxdirs),
+                packer=ElastalkConnection(etconf),
+                workers=etconf.seed_workers,
+                queue_size=etconf.seed_queue_size,
+                processes=etconf.seed_processes
+            ),
+            chunk_size=etconf.bulk_chunk_size,
+            max_bytes=etconf.bulk_max_bytes,
+            serializer=registry.get().serializer,
+            route=partial(etconf.cluster_for, write=True)
+        )
+        # ...and send them from the event loop.
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            # Wait until we're allowed to send another request (and count
+            # the results of those that have finished so we don't hold on to
+            # them).
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                _tally(done)
+            pending.add(asyncio.ensure_future(
+                _send_chunk(
+                    _client(chunk[0][0]),
+                    chunk=chunk,
+                    max_retries=etconf.bulk_max_retries,
+                    initial_backoff=etconf.bulk_initial_backoff
+                )
+            ))
+        # Tally up the rest of the results.
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            _tally(done)
+    finally:
+        # If something went wrong, don't leave requests behind.
+        for task in pending:
+            task.cancel()
+        if chunks is not None:
+            chunks.close()
+        # Take the indexes out of load mode.
+        for _index, originals in loading.items():
+            await _restore(
+                _client(_index),
+                index=_index,
+                originals=originals,
+                forcemerge=etconf.seed_forcemerge
+            )
+        # Cached search results for the indexes we've written are no good
+        # anymore.
+        for _index in stats:
+            invalidate(_index)
+        for etconn in etconns.values():
+            await etconn.close()
+    return stats
+
+
+async def _send_chunk(
+        es: 'AsyncElasticsearch',
+        chunk: List[_BulkItem],
+        max_retries: int,
+        initial_backoff: float
+) -> List[Tuple[str, str, bool]]:
+    """
+    Send a chunk of bulk items to Elasticsearch, retrying only the items the
+    server rejected because it was too busy.  (This is the asynchronous
+    counterpart of :py:func:`elastalk.seed._send_chunk`.)
+
+    :param es: the asynchronous Elasticsearch client
+    :param chunk: the bulk items
+    :param max_retries: the maximum number of times rejected items are retried
+    :param initial_backoff: the number of seconds to wait before the first
+        retry (The wait doubles with each subsequent retry.)
+    :return: the index name, document ID and outcome for each item
+    """
+    attempts = _BulkAttempts(chunk, max_retries, initial_backoff)
+    for backoff, body in attempts:
+        if backoff:
+            await asyncio.sleep(backoff)
+        try:
+            resp = await es.bulk(body=body)
+        except elasticsearch.TransportError as ex:
+            attempts.failed(ex)
+            continue
+        attempts.answered(resp)
+    return attempts.results
+
+
+async def _restore(
+        es: 'AsyncElasticsearch',
+        index: str,
+        originals: Mapping[str, Any],
+        forcemerge: int or None
+):
+    """
+    Take an index out of load mode.  (This is the asynchronous counterpart of
+    :py:func:`elastalk.seed._restore`.)
+
+    :param es: the asynchronous Elasticsearch client
+    :param index: the name of the index
+    :param originals: the original index settings
+    :param forcemerge: the number of segments to force-merge the index into
+        (or `None`)
+    """
+    try:
+        for method, kwargs in _restore_requests(index, originals, forcemerge):
+            await getattr(es.indices, method)(**kwargs)
+    except Exception as ex:  # pylint: disable=broad-except
+        __logger__.error(
+            f"The settings for index '{index}' could not be restored: {ex}"
+        )
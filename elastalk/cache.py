@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.cache
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Don't ask Elasticsearch the same question twice (at least not too often).
+"""
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Set, Tuple
+from .config import CacheConf
+from .serializers import default
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
+
+
+class _Generations:
+    """
+    Track writes to indexes.  (Cached results from an older generation of an
+    index are no good anymore.)
+    """
+    lock: threading.Lock = threading.Lock()  #: guards the generations
+    indexes: Dict[str, int] = {}  #: the current generation of each index
+
+
+def invalidate(index: str):
+    """
+    Invalidate the cached search results for an index (in every
+    :py:class:`ResultCache` in the process).  Call this when you write to the
+    index.
+
+    :param index: the name of the index
+    """
+    with _Generations.lock:
+        _Generations.indexes[index] = _Generations.indexes.get(index, 0) + 1
+
+
+def generation(index: str) -> int:
+    """
+    Get the current generation of an index.
+
+    :param index: the name of the index
+    :return: the number of times the index has been :py:func:`invalidated
+        <invalidate>`
+    """
+    return _Generations.indexes.get(index, 0)
+
+
+def cache_key(index: str, body: Mapping[str, Any] or None, **kwargs) -> str:
+    """
+    Create a canonical key for a search.  (Searches that differ only in the
+    order of their keys have the same key.)
+
+    :param index: the name of the index
+    :param body: the search body
+    :param kwargs: the other search arguments
+    :return: the key
+    """
+    canonical = json.dumps(
+        [index, body, kwargs],
+        sort_keys=True,
+        separators=(',', ':'),
+        default=default
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """
+    Count what happens in a :py:class:`ResultCache`.
+    """
+    hits: int = 0  #: the number of searches answered with a fresh result
+    stale_hits: int = 0  #: the number of searches answered with a stale result
+    misses: int = 0  #: the number of searches sent to Elasticsearch
+    evictions: int = 0  #: the number of results pushed out to make room
+    refreshes: int = 0  #: the number of stale results refreshed in the background
+
+
+class ResultCache:
+    """
+    A size- and time-bounded, least-recently-used cache of search results for
+    a single index.
+
+    .. note::
+
+        Cached results are shared, so don't modify them.
+    """
+    def __init__(self, index: str, config: CacheConf):
+        """
+
+        :param index: the name of the index
+        :param config: the caching configuration
+        """
+        self.index: str = index  #: the name of the index
+        self.config: CacheConf = config  #: the caching configuration
+        self.stats: CacheStats = CacheStats()  #: the cache statistics
+        # Each entry is the time it was stored, the generation of the index at
+        # the time and the result.
+        self._entries: 'OrderedDict[str, Tuple[float, int, Any]]' = (
+            OrderedDict()
+        )
+        # These are the keys being refreshed in the background.
+        self._refreshing: Set[str] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Get a search result from the cache, or fetch (and cache) it.
+
+        :param key: the :py:func:`cache key <cache_key>`
+        :param fetch: a function that retrieves the result from Elasticsearch
+        :return: the search result
+        """
+        found, result, refresh = self._lookup(key)
+        # If the result is stale, we'll refresh it in the background.
+        if refresh:
+            threading.Thread(
+                target=self._refresh, args=(key, fetch), daemon=True
+            ).start()
+        if found:
+            return result
+        return self._fetch(key, fetch)
+
+    async def aget(self, key: str, fetch: Callable[[], Awaitable]) -> Any:
+        """
+        Get a search result from the cache, or fetch (and cache) it, on the
+        event loop.
+
+        :param key: the :py:func:`cache key <cache_key>`
+        :param fetch: a function that returns an awaitable that retrieves the
+            result from Elasticsearch
+        :return: the search result
+        """
+        found, result, refresh = self._lookup(key)
+        # If the result is stale, we'll refresh it in the background.
+        if refresh:
+            asyncio.ensure_future(self._arefresh(key, fetch))
+        if found:
+            return result
+        # Note the generation *before* we ask, so a write that happens while
+        # we wait isn't hidden.
+        _generation = generation(self.index)
+        result = await fetch()
+        self._store(key, _generation, result)
+        return result
+
+    def _lookup(self, key: str) -> Tuple[bool, Any, bool]:
+        """
+        Look up a search result.
+
+        :param key: the cache key
+        :return: whether or not the result was found, the result and whether
+            or not the caller should refresh it
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            # Results from before the index was last written are discarded.
+            if entry is not None and entry[1] != generation(self.index):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                age = now - entry[0]
+                # If the result is still fresh...
+                if age <= self.config.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return True, entry[2], False  # ...it's all yours.
+                # If it's stale, but not too stale...
+                if age <= self.config.ttl + self.config.stale:
+                    self._entries.move_to_end(key)
+                    self.stats.stale_hits += 1
+                    # ...it should be refreshed (unless somebody is already
+                    # doing that), but it'll do for now.
+                    refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                    return True, entry[2], refresh
+            self.stats.misses += 1
+        return False, None, False
+
+    def _fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """
+        Fetch a search result and put it in the cache.
+
+        :param key: the cache key
+        :param fetch: a function that retrieves the result from Elasticsearch
+        :return: the search result
+        """
+        # Note the generation *before* we ask, so a write that happens while
+        # we wait isn't hidden.
+        _generation = generation(self.index)
+        result = fetch()
+        self._store(key, _generation, result)
+        return result
+
+    def _store(self, key: str, _generation: int, result: Any):
+        """
+        Put a search result in the cache.
+
+        :param key: the cache key
+        :param _generation: the generation of the index when the result was
+            fetched
+        :param result: the search result
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), _generation, result)
+            self._entries.move_to_end(key)
+            # If we're over the limit, the least recently used results go.
+            while len(self._entries) > max(0, self.config.size):
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]):
+        """
+        Refresh a stale search result.
+
+        :param key: the cache key
+        :param fetch: a function that retrieves the result from Elasticsearch
+        """
+        refreshed = False
+        try:
+            self._fetch(key, fetch)
+            refreshed = True
+        except Exception as ex:  # pylint: disable=broad-except
+            __logger__.warning(f"A cached search could not be refreshed: {ex}")
+        finally:
+            self._refreshed(key, refreshed=refreshed)
+
+    async def _arefresh(self, key: str, fetch: Callable[[], Awaitable]):
+        """
+        Refresh a stale search result on the event loop.
+
+        :param key: the cache key
+        :param fetch: a function that returns an awaitable that retrieves the
+            result from Elasticsearch
+        """
+        refreshed = False
+        try:
+            _generation = generation(self.index)
+            self._store(key, _generation, await fetch())
+            refreshed = True
+        except Exception as ex:  # pylint: disable=broad-except
+            __logger__.warning(f"A cached search could not be refreshed: {ex}")
+        finally:
+            self._refreshed(key, refreshed=refreshed)
+
+    def _refreshed(self, key: str, refreshed: bool):
+        """
+        Note that an attempt to refresh a search result has finished.
+
+        :param key: the cache key
+        :param refreshed: `True` if the result was refreshed
+        """
+        with self._lock:
+            self._refreshing.discard(key)
+            if refreshed:
+                self.stats.refreshes += 1
+
+    def clear(self):
+        """Discard all the cached results."""
+        with self._lock:
+            self._entries.clear()
@@ -17,9 +17,20 @@ can be used as a handy facility for running the task from a command line.
     To learn more about running Luigi, visit the Luigi project's
     `Read-The-Docs <http://luigi.readthedocs.io/en/stable/>`_ page.
 """
+from functools import partial
+import importlib
+import json
 import logging
+from pathlib import Path
+import time
+from typing import Callable, Dict, List, Tuple
 import click
 from .__init__ import __version__
+from .connect import ConnectionRegistry
+from .dump import COMPRESSIONS, LAYOUTS, dump
+from .fake import FakeElasticsearch
+from .reindex import reindex
+from .seed import SeedProgress, _is_lines, iter_seed_files, seed
 
 LOGGING_LEVELS = {
     0: logging.NOTSET,
@@ -80,3 +91,503 @@ def version():
     Get the library version.
     """
     click.echo(click.style(f'{__version__}', bold=True))
+
+
+def _size(nbytes: float) -> str:
+    """
+    Express a number of bytes in friendlier units.
+
+    :param nbytes: the number of bytes
+    :return: the friendlier expression
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(nbytes) < 1024:
+            return f'{nbytes:.1f} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:.1f} TB'
+
+
+def _expected(root: str) -> Dict[str, int or None]:
+    """
+    Count the documents we expect to find in each index of the seed data.
+    (We can't tell how many documents are in a compressed NDJSON file without
+    decompressing it, so we don't try.)
+
+    :param root: the root directory that contains the seed data
+    :return: the number of documents expected in each index (`None` if
+        there's no telling)
+    """
+    expected: Dict[str, int or None] = {}
+    for index, _, path in iter_seed_files(root):
+        count = expected.get(index, 0)
+        if count is None:
+            continue
+        if not _is_lines(path):
+            expected[index] = count + 1
+        elif path.suffix.lower() in ('.ndjson', '.jsonl'):
+            lines = 0
+            with open(str(path), 'rb') as file:
+                for block in iter(partial(file.read, 1 << 20), b''):
+                    lines += block.count(b'\n')
+            expected[index] = count + lines
+        else:
+            expected[index] = None
+    return expected
+
+
+def _report(progress: SeedProgress, expected: Dict[str, int or None]):
+    """
+    Report the progress of a seed run (on `stderr`).
+
+    :param progress: the progress
+    :param expected: the number of documents expected in each index
+    """
+    indexes = []
+    for index in sorted(progress.stats):
+        total = expected.get(index)
+        if not total:
+            continue
+        stats = progress.stats[index]
+        done = stats.indexed + stats.skipped + stats.failed + stats.deleted
+        eta = progress.eta(index, total)
+        indexes.append(
+            f'{index} {min(100, 100 * done // total)}%'
+            + (f' (ETA {eta:.0f}s)' if eta else '')
+        )
+    click.echo(
+        '  '.join([
+            f'{progress.elapsed:.1f}s',
+            f'{progress.documents:,} docs',
+            f'{progress.docs_per_second:,.0f} docs/s',
+            f'{_size(progress.bytes_per_second)}/s',
+            f'queue {progress.queue_depth}'
+        ] + indexes),
+        err=True
+    )
+
+
+@cli.command('seed')
+@click.argument(
+    'root', type=click.Path(exists=True, file_okay=False, resolve_path=True)
+)
+@click.option(
+    '--config', '-c',
+    default='config.toml',
+    show_default=True,
+    help="The configuration (relative to the root directory)."
+)
+@click.option('--force', is_flag=True, help="Replace existing indexes.")
+@click.option(
+    '--incremental', is_flag=True, help="Only send new and changed seed files."
+)
+@click.option(
+    '--manifest', type=click.Path(), help="The incremental seeding manifest."
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help="Read and pack everything, but don't send anything."
+)
+@click.option(
+    '--workers', type=int, help="The number of workers that load seed files."
+)
+@click.option(
+    '--processes/--threads',
+    default=None,
+    help="Load seed files in worker processes (or threads)."
+)
+@click.option(
+    '--queue-size', type=int, help="The number of loads that may be waiting."
+)
+@click.option(
+    '--bulk-threads', type=int, help="The number of bulk requests in flight."
+)
+@click.option(
+    '--chunk-size', type=int, help="The maximum documents per bulk request."
+)
+@click.option(
+    '--max-bytes', type=int, help="The maximum bytes per bulk request."
+)
+@click.option(
+    '--interval',
+    type=float,
+    default=1,
+    show_default=True,
+    help="The number of seconds between progress reports."
+)
+@click.option(
+    '--eta/--no-eta',
+    default=False,
+    show_default=True,
+    help="Count the seed documents first (so we can estimate how long it "
+         "will take).  This reads every NDJSON file before seeding starts."
+)
+@pass_info
+def seed_(_: Info,
+          root: str,
+          config: str,
+          force: bool,
+          incremental: bool,
+          manifest: str,
+          dry_run: bool,
+          workers: int,
+          processes: bool,
+          queue_size: int,
+          bulk_threads: int,
+          chunk_size: int,
+          max_bytes: int,
+          interval: float,
+          eta: bool):
+    """
+    Populate Elasticsearch with seed data.
+    """
+    options = {
+        option: value for option, value in {
+            'seed_workers': workers,
+            'seed_processes': processes,
+            'seed_queue_size': queue_size,
+            'bulk_threads': bulk_threads,
+            'bulk_chunk_size': chunk_size,
+            'bulk_max_bytes': max_bytes
+        }.items() if value is not None
+    }
+    expected = _expected(root) if eta else {}
+    finished: List[SeedProgress] = []
+
+    def _progress(progress: SeedProgress):
+        if progress.finished:
+            finished.append(progress)
+        else:
+            _report(progress, expected=expected)
+
+    try:
+        stats = seed(
+            root=root,
+            config=config,
+            force=force,
+            incremental=incremental,
+            manifest=manifest,
+            dry_run=dry_run,
+            options=options,
+            progress=_progress,
+            interval=interval
+        )
+    except (FileNotFoundError, NotADirectoryError) as ex:
+        raise click.ClickException(str(ex))
+    # Summarize what happened to each index...
+    for index in sorted(stats):
+        _stats = stats[index]
+        click.echo(
+            f'{index}: {_stats.indexed:,} indexed, {_stats.skipped:,} skipped, '
+            f'{_stats.failed:,} failed, {_stats.deleted:,} deleted'
+        )
+    # ...and how long it took.
+    progress = finished[0]
+    timings = progress.timings
+    click.echo(
+        f'{"Prepared" if dry_run else "Seeded"} {progress.documents:,} '
+        f'documents ({_size(progress.bytes)}) in {progress.elapsed:.1f}s '
+        f'({progress.docs_per_second:,.0f} docs/s, '
+        f'{_size(progress.bytes_per_second)}/s)'
+    )
+    click.echo(
+        f'Time (cumulative seconds): scan {timings.scan:.2f}, '
+        f'read {timings.read:.2f}, parse {timings.parse:.2f}, '
+        f'pack {timings.pack:.2f}, network {timings.network:.2f}'
+    )
+    # If anything failed, the exit code should say so.
+    if any(s.failed for s in stats.values()):
+        raise click.exceptions.Exit(1)
+
+
+@cli.command('dump')
+@click.argument('indexes', nargs=-1, required=True)
+@click.option(
+    '--output', '-o',
+    type=click.Path(file_okay=False),
+    default='.',
+    show_default=True,
+    help="The root directory of the seed data."
+)
+@click.option(
+    '--config', '-c',
+    type=click.Path(exists=True, dir_okay=False),
+    help="The configuration."
+)
+@click.option(
+    '--layout',
+    type=click.Choice(LAYOUTS),
+    default='ndjson',
+    show_default=True,
+    help="Write NDJSON files (or one file per document)."
+)
+@click.option(
+    '--compression',
+    type=click.Choice(COMPRESSIONS),
+    help="Compress the NDJSON files."
+)
+@click.option('--slices', type=int, help="The number of slices to read.")
+@click.option(
+    '--size',
+    type=int,
+    default=1000,
+    show_default=True,
+    help="The number of documents in a page."
+)
+@click.option('--query', help="A query (in JSON) that selects the documents.")
+@click.option(
+    '--unpack/--no-unpack',
+    default=True,
+    show_default=True,
+    help="Unpack blobbed documents."
+)
+@click.option(
+    '--workers', type=int, help="The number of workers that unpack documents."
+)
+@click.option(
+    '--processes/--threads',
+    default=False,
+    show_default=True,
+    help="Unpack documents in worker processes (or threads)."
+)
+@pass_info
+def dump_(_: Info,
+          indexes: Tuple[str, ...],
+          output: str,
+          config: str,
+          layout: str,
+          compression: str,
+          slices: int,
+          size: int,
+          query: str,
+          unpack: bool,
+          workers: int,
+          processes: bool):
+    """
+    Export indexes as seed data.
+    """
+    if compression and layout != 'ndjson':
+        raise click.BadParameter(
+            "Only NDJSON files can be compressed.", param_hint='--compression'
+        )
+    try:
+        _query = json.loads(query) if query else None
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint='--query')
+    registry = (
+        ConnectionRegistry.from_toml(Path(config)) if config
+        else ConnectionRegistry()
+    )
+    started = time.perf_counter()
+    try:
+        counts = dump(
+            registry.get(),
+            indexes=indexes,
+            path=output,
+            layout=layout,
+            compression=compression,
+            slices=slices,
+            query=_query,
+            size=size,
+            unpack=unpack,
+            workers=workers,
+            processes=processes
+        )
+    finally:
+        registry.close()
+    elapsed = time.perf_counter() - started
+    for index, count in counts.items():
+        click.echo(f'{index}: {count:,} documents')
+    total = sum(counts.values())
+    click.echo(
+        f'Dumped {total:,} documents in {elapsed:.1f}s '
+        f'({total / max(elapsed, 1e-9):,.0f} docs/s)'
+    )
+
+
+def _transform(spec: str) -> Callable[[Dict], Dict or None]:
+    """
+    Import a transform function.
+
+    :param spec: the module and the function (`package.module:function`)
+    :return: the function
+    """
+    module, _, name = spec.partition(':')
+    if not module or not name:
+        raise click.BadParameter(
+            "Expected 'package.module:function'.", param_hint='--transform'
+        )
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError) as ex:
+        raise click.BadParameter(str(ex), param_hint='--transform')
+
+
+@cli.command('reindex')
+@click.argument('source')
+@click.argument('target')
+@click.option(
+    '--config', '-c',
+    type=click.Path(exists=True, dir_okay=False),
+    help="The configuration."
+)
+@click.option(
+    '--target-cluster',
+    help="The cluster to which documents are written (if it isn't the one "
+         "that serves writes to the target index)."
+)
+@click.option(
+    '--transform',
+    help="A function that changes each document (package.module:function)."
+)
+@click.option('--query', help="A query (in JSON) that selects the documents.")
+@click.option('--sort', help="The sort (in JSON) used to page through them.")
+@click.option(
+    '--size',
+    type=int,
+    default=1000,
+    show_default=True,
+    help="The number of documents in a page."
+)
+@click.option('--rate', type=float, help="The maximum documents per second.")
+@click.option(
+    '--checkpoint',
+    type=click.Path(dir_okay=False),
+    help="Save progress here (and resume from it)."
+)
+@pass_info
+def reindex_(_: Info,
+             source: str,
+             target: str,
+             config: str,
+             target_cluster: str,
+             transform: str,
+             query: str,
+             sort: str,
+             size: int,
+             rate: float,
+             checkpoint: str):
+    """
+    Copy (and transform) the documents in one index to another.
+    """
+    try:
+        _query = json.loads(query) if query else None
+        _sort = json.loads(sort) if sort else None
+    except ValueError as ex:
+        raise click.BadParameter(str(ex))
+    registry = (
+        ConnectionRegistry.from_toml(Path(config)) if config
+        else ConnectionRegistry()
+    )
+    started = time.perf_counter()
+    try:
+        stats = reindex(
+            registry.get(),
+            source=source,
+            target=target,
+            transform=_transform(transform) if transform else None,
+            target_cnx=registry.get(target_cluster) if target_cluster else None,
+            query=_query,
+            size=size,
+            sort=_sort,
+            rate=rate,
+            checkpoint=checkpoint
+        )
+    except ValueError as ex:
+        raise click.ClickException(str(ex))
+    finally:
+        registry.close()
+    elapsed = time.perf_counter() - started
+    click.echo(
+        f'{stats.read:,} read, {stats.indexed:,} indexed, '
+        f'{stats.dropped:,} dropped, {stats.failed:,} failed '
+        f'in {elapsed:.1f}s'
+    )
+    # If anything failed, the exit code should say so.
+    if stats.failed:
+        raise click.exceptions.Exit(1)
+
+
+@cli.command('fake')
+@click.option(
+    '--host',
+    default='127.0.0.1',
+    show_default=True,
+    help="The address to which the server binds."
+)
+@click.option(
+    '--port', '-p',
+    type=int,
+    default=9200,
+    show_default=True,
+    help="The port."
+)
+@click.option(
+    '--latency',
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Seconds added to every request."
+)
+@click.option(
+    '--max-docs-per-second',
+    type=float,
+    help="The maximum documents written (or returned) per second."
+)
+@click.option(
+    '--error-rate',
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="The fraction of bulk, document and search requests that fail."
+)
+@click.option(
+    '--error-status',
+    type=click.Choice(['429', '503']),
+    multiple=True,
+    help="The status of failed requests (429, 503 or both)."
+)
+@click.option(
+    '--rejection-rate',
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="The fraction of bulk items rejected with a 429."
+)
+@pass_info
+def fake_(_: Info,
+          host: str,
+          port: int,
+          latency: float,
+          max_docs_per_second: float,
+          error_rate: float,
+          error_status: Tuple[str],
+          rejection_rate: float):
+    """
+    Run a fake Elasticsearch server (for load testing without a cluster).
+    """
+    server = FakeElasticsearch(
+        host=host,
+        port=port,
+        latency=latency,
+        max_docs_per_second=max_docs_per_second,
+        error_rate=error_rate,
+        error_statuses=(
+            [int(status) for status in error_status] if error_status
+            else (429, 503)
+        ),
+        rejection_rate=rejection_rate
+    )
+    click.echo(f'Serving a fake Elasticsearch at {server.address}...')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    stats = server.stats
+    click.echo(
+        f'{stats.requests:,} requests, {stats.written:,} written, '
+        f'{stats.read:,} read, {stats.rejected:,} rejected, '
+        f'{stats.errors:,} errors'
+    )
@@ -8,16 +8,16 @@
 
 Make things work the way you want!
 """
-from functools import lru_cache
 import importlib
-import json
 import logging
 import os
 from pathlib import Path
+import threading
 import uuid
-from typing import Iterable, Dict, Set
+from typing import Any, Iterable, Dict, FrozenSet, Set, Tuple
 from dataclasses import dataclass, field
 import toml
+from .serializers import get_serializer
 
 
 #: the module logger
@@ -29,12 +29,39 @@ class _Defaults:
     Module-level default values.
     """
     blob_key: str = '_blob'  #: the default key for blobs
+    cache_size: int = 128  #: the default number of cached search results
+    cache_ttl: float = 5  #: the default number of seconds results are fresh
+
+
+class _Revisions:
+    """
+    Track changes to blob configurations.
+    """
+    lock: threading.Lock = threading.Lock()  #: guards the revision
+    current: int = 0  #: incremented each time a blob configuration changes
+
+    @classmethod
+    def bump(cls):
+        """
+        Note that a blob configuration has changed.
+        """
+        with cls.lock:
+            cls.current += 1
 
 
 class ElastalkConfigException(Exception):
     """Raised when a configuration error is detected."""
 
 
+class _MappingDocuments:
+    """
+    Cache parsed mapping documents (by path).
+    """
+    lock: threading.Lock = threading.Lock()  #: guards the cache
+    #: the modification time and contents of each mapping document
+    documents: Dict[Path, Tuple[int, dict]] = {}
+
+
 @dataclass
 class BlobConf:
     """
@@ -49,6 +76,9 @@ class BlobConf:
     #: the key that stores blobbed values in packed documents
     key: str = None
 
+    #: the compression applied to blobbed values (`zlib` or `lz4`)
+    compression: str = None
+
     def exclude(self, *keys: str):
         """
         Add to the set of excluded document keys.
@@ -56,6 +86,8 @@ class BlobConf:
         :param keys: the excluded document keys
         """
         self.excluded.update(keys)  # pylint: disable=no-member
+        # Compiled blob plans may include the old exclusions.
+        _Revisions.bump()
 
     @classmethod
     def load(cls, dict_: Dict) -> 'BlobConf' or None:
@@ -77,25 +109,103 @@ class BlobConf:
             {
                 'enabled': dict_.get('enabled'),
                 'excluded': set(_excluded) if _excluded else None,
-                'key': dict_.get('key')
+                'key': dict_.get('key'),
+                'compression': dict_.get('compression')
             }.items() if v is not None
         }
         # Create the instance and return it.
         return cls(**cargs)
 
 
+@dataclass
+class CacheConf:
+    """
+    Define search result caching parameters.
+    """
+    #: indicates whether or not search results are cached
+    enabled: bool = None
+
+    #: the maximum number of cached search results
+    size: int = None
+
+    #: the number of seconds a cached search result is fresh
+    ttl: float = None
+
+    #: the number of seconds after a result goes stale during which it is
+    #: still served (while it's refreshed in the background)
+    stale: float = None
+
+    @classmethod
+    def load(cls, dict_: Dict) -> 'CacheConf' or None:
+        """
+        Create an instance of the class from a dictionary.
+
+        :param dict_: the dictionary
+        :return: the instance
+        """
+        # If we don't get any input...
+        if not dict_:
+            # ...we give nothing back.
+            return None
+        # Compile a dictionary of constructor arguments.
+        cargs = {
+            k: v for k, v in
+            {
+                'enabled': dict_.get('enabled'),
+                'size': dict_.get('size'),
+                'ttl': dict_.get('ttl'),
+                'stale': dict_.get('stale')
+            }.items() if v is not None
+        }
+        # Create the instance and return it.
+        return cls(**cargs)
+
+
+@dataclass(frozen=True)
+class BlobPlan:
+    """
+    The compiled blobbing behavior for an index.
+
+    .. seealso::
+
+        :py:func:`ElastalkConf.blob_plan`
+    """
+    enabled: bool  #: indicates whether or not blobbing is enabled
+    key: str  #: the key that stores blobbed values in packed documents
+    exclusions: FrozenSet[str]  #: the keys that are never blobbed
+    compression: str or None  #: the compression applied to blobbed values
+
+
 @dataclass
 class IndexConf:
     """
     Define index-specific configuration settings.
     """
-    blobs: BlobConf = BlobConf()  #: blobbing configuration for the index
+    #: blobbing configuration for the index
+    blobs: BlobConf = field(default_factory=BlobConf)
+    #: search result caching configuration for the index
+    cache: CacheConf = field(default_factory=CacheConf)
     #: the path to Elasticsearch mappings for the configuration
     mappings: str = None
+    #: the settings used when the index is created (like
+    #: `number_of_shards`)
+    settings: Dict[str, Any] = None
+    #: the name of the cluster (in the
+    #: :py:class:`connection registry <elastalk.connect.ConnectionRegistry>`)
+    #: that serves the index
+    cluster: str = None
+    #: the name of the cluster that serves reads from the index (if it isn't
+    #: the :py:attr:`cluster`)
+    read_cluster: str = None
+    #: the name of the cluster that serves writes to the index (if it isn't
+    #: the :py:attr:`cluster`)
+    write_cluster: str = None
 
     def mappings_document(self, root: Path = None) -> dict or None:
         """
         Get the contents of the index mapping document (if one is defined).
+        The parsed document is cached until the file is modified.  (It's
+        shared, so don't modify it.)
 
         :param root: the root path that contains the document file
         :return: the index mapping document (or `None` if one isn't defined)
@@ -116,8 +226,16 @@ class IndexConf:
         if not full_path.exists():
             __logger__.warning(f"{mappings_path} does not exist.")
             return None  # ..there isn't much more we can do.
-        # Read the text in the mappings document.
-        return json.loads(full_path.read_text())
+        # If we've read this version of the file before...
+        mtime = full_path.stat().st_mtime_ns
+        cached = _MappingDocuments.documents.get(full_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]  # ...we don't need to read it again.
+        # Read the mappings document.
+        document = get_serializer().loads(full_path.read_bytes())
+        with _MappingDocuments.lock:
+            _MappingDocuments.documents[full_path] = (mtime, document)
+        return document
 
     @classmethod
     def load(cls, dict_: Dict) -> 'IndexConf' or None:
@@ -138,7 +256,12 @@ class IndexConf:
             k: v for k, v in
             {
                 'blobs': BlobConf.load(dict_.get('blobs')),
-                'mappings': _mappings if _mappings else None
+                'cache': CacheConf.load(dict_.get('cache')),
+                'mappings': _mappings if _mappings else None,
+                'settings': dict_.get('settings'),
+                'cluster': dict_.get('cluster'),
+                'read_cluster': dict_.get('read_cluster'),
+                'write_cluster': dict_.get('write_cluster')
             }.items() if v is not None
         }
         # Create the instance and return it.
@@ -167,13 +290,111 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
     sniff_on_connection_fail: bool = True  #: Sniff when the connection fails?
     sniffer_timeout: int = 60  #: the sniffer timeout
     maxsize: int = 10  #: the maximum number of connections
+    timeout: float = 10  #: the number of seconds to wait for a response
+    max_retries: int = 3  #: the number of times a failed request is retried
+    retry_on_timeout: bool = False  #: Retry requests that time out?
+    #: the HTTP status codes of responses that are retried
+    retry_on_status: Iterable[int] = field(
+        default_factory=lambda: [502, 503, 504]
+    )
+    http_compress: bool = False  #: Compress (gzip) request bodies?
+    #: the HTTP connection class (`urllib3` or `requests`; if it isn't set
+    #: the client's default is used)
+    connection_class: str = None
+    keep_alive: bool = True  #: Keep idle connections open for reuse?
     mapping_field_limit: int = 1000  #: the maximum number of mapped fields
-    blobs: BlobConf = BlobConf()  #: global BLOB behavior configuration
+    bulk_chunk_size: int = 500  #: the maximum number of documents per bulk request
+    bulk_max_bytes: int = 10485760  #: the maximum size (in bytes) of a bulk request
+    bulk_threads: int = 4  #: the number of bulk requests that may be in flight
+    bulk_max_retries: int = 3  #: the number of times rejected (429) documents are retried
+    bulk_initial_backoff: float = 2  #: seconds to wait before retrying rejected documents
+    seed_workers: int = 4  #: the number of workers that read and pack seed files
+    seed_queue_size: int = 1000  #: the maximum number of seed documents waiting to be sent
+    seed_processes: bool = False  #: Read and pack seed files in processes (not threads)?
+    seed_id_field: str = '_id'  #: the field that holds the ID of each document in NDJSON seed files
+    seed_load_mode: bool = False  #: Relax durability and refreshes while seeding?
+    #: the number of segments each index is force-merged into after it's
+    #: seeded (if it isn't set, indexes aren't force-merged)
+    seed_forcemerge: int = None
+    #: the name of the JSON serializer (`orjson`, `ujson`, `rapidjson` or
+    #: `json`; if it isn't set the standard library's `json` is used)
+    serializer: str = None
+    #: global BLOB behavior configuration
+    blobs: BlobConf = field(default_factory=BlobConf)
+    #: global search result caching configuration
+    cache: CacheConf = field(default_factory=CacheConf)
     indexes: Dict[str, IndexConf] = field(
         default_factory=dict
     )  #: index-specific configurations
 
-    @lru_cache(maxsize=128)
+    def blob_plan(self, index: str = None) -> BlobPlan:
+        """
+        Get the compiled blobbing behavior for an index.  Plans are compiled
+        the first time an index is seen and reused until the configuration
+        changes (see :py:func:`invalidate`).
+
+        :param index: the name of the index
+        :return: the blobbing plan
+        """
+        # The compiled plans (and the blob configuration revision they were
+        # compiled from) aren't fields, so they don't show up in `asdict()`
+        # or `replace()`.
+        revision, plans = getattr(self, '_plans', (None, None))
+        current = _Revisions.current
+        # If the cached plans were compiled before the last change to a blob
+        # configuration...
+        if revision != current:
+            # ...they're no good anymore.
+            plans = {}
+            setattr(self, '_plans', (current, plans))
+        try:
+            return plans[index]
+        except KeyError:
+            plan = self._compile_blob_plan(index=index)
+            plans[index] = plan
+            return plan
+
+    def _compile_blob_plan(self, index: str = None) -> BlobPlan:
+        """
+        Compile the blobbing behavior for an index.
+
+        :param index: the name of the index
+        :return: the blobbing plan
+        """
+        idx_blobs: BlobConf or None = (
+            self.indexes[index].blobs if index in self.indexes else None
+        )
+        # If the index has a configured value, use it.  Otherwise use the
+        # global version.
+        enabled = (
+            idx_blobs.enabled
+            if idx_blobs and idx_blobs.enabled is not None
+            else bool(self.blobs.enabled)
+        )
+        key = idx_blobs.key if idx_blobs and idx_blobs.key else None
+        key = key if key else self.blobs.key
+        compression = (
+            idx_blobs.compression
+            if idx_blobs and idx_blobs.compression
+            else self.blobs.compression
+        )
+        return BlobPlan(
+            enabled=enabled,
+            key=key if key else _Defaults.blob_key,
+            exclusions=frozenset(
+                self.blobs.excluded | idx_blobs.excluded
+                if idx_blobs else self.blobs.excluded
+            ),
+            compression=compression
+        )
+
+    def invalidate(self):
+        """
+        Discard compiled :py:func:`blob plans <blob_plan>`.  (Call this if you
+        modify :py:attr:`indexes` or :py:attr:`blobs` directly.)
+        """
+        setattr(self, '_plans', (None, {}))
+
     def blobs_enabled(self, index: str = None) -> bool:
         """
         Determine whether or not blobbing is enabled for an index.
@@ -181,20 +402,9 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
         :param index: the name of the index
         :return: `True` if blobbing is enabled, otherwise `False`
         """
-        try:
-            # Get the value configured for the index.
-            idx_value = self.indexes[index].blobs.enabled
-            # If the index has a configured value, use it.  Otherwise use the
-            # global version.
-            if idx_value is not None:
-                return idx_value
-        except KeyError:
-            pass
-        # If we got to this point, just return the configured value.
-        return False if self.blobs.enabled is None else self.blobs.enabled
+        return self.blob_plan(index=index).enabled
 
-    @lru_cache(maxsize=128)
-    def blob_exclusions(self, index: str = None) -> Set[str]:
+    def blob_exclusions(self, index: str = None) -> FrozenSet[str]:
         """
         Get the full set of top-level document properties that should be
         excluded from blobs for a given index.  If you don't supply the `index`
@@ -203,15 +413,7 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
         :param index: the name of the index
         :return: the set of excluded property names
         """
-        if not index:
-            return self.blobs.excluded
-        try:
-            return (
-                self.blobs.excluded |
-                self.indexes[index].blobs.excluded
-            )
-        except KeyError:
-            return self.blobs.excluded
+        return self.blob_plan(index=index).exclusions
 
     def blob_key(self, index: str = None) -> str:
         """
@@ -223,13 +425,88 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
         :param index: the name of the index
         :return: the blobbed data key
         """
-        key: str = None
-        try:
-            key = self.indexes[index].blobs.key
-        except KeyError:
-            pass
-        key = key if key else self.blobs.key
-        return key if key else _Defaults.blob_key
+        return self.blob_plan(index=index).key
+
+    def blob_compression(self, index: str = None) -> str or None:
+        """
+        Get the compression scheme applied to blobbed data.  (If you don't
+        supply the index, or the index doesn't configure a compression scheme,
+        the method returns the global configuration value.)
+
+        :param index: the name of the index
+        :return: the name of the compression scheme (or `None` if blobbed data
+            isn't compressed)
+        """
+        return self.blob_plan(index=index).compression
+
+    def cache_conf(self, index: str = None) -> CacheConf:
+        """
+        Get the search result caching behavior for an index.  Values the
+        index doesn't configure are taken from the global configuration (or
+        the defaults).
+
+        :param index: the name of the index
+        :return: the caching configuration (with every value set)
+        """
+        idx_cache: CacheConf or None = (
+            self.indexes[index].cache if index in self.indexes else None
+        )
+
+        def _value(name: str, default: Any) -> Any:
+            # If the index has a configured value, use it.  Otherwise use the
+            # global version.
+            for cache in (idx_cache, self.cache):
+                value = getattr(cache, name, None)
+                if value is not None:
+                    return value
+            return default
+
+        return CacheConf(
+            enabled=bool(_value('enabled', False)),
+            size=_value('size', _Defaults.cache_size),
+            ttl=_value('ttl', _Defaults.cache_ttl),
+            stale=_value('stale', 0)
+        )
+
+    def index_body(self, index: str, root: Path = None) -> Dict[str, Any]:
+        """
+        Get the body of the request that creates an index, which includes the
+        index's mappings (if it has a :py:attr:`mappings document
+        <IndexConf.mappings>`) and settings.
+
+        :param index: the name of the index
+        :param root: the root path that contains the mappings document
+        :return: the request body
+        """
+        idxconf: IndexConf or None = self.indexes.get(index)
+        document = idxconf.mappings_document(root=root) if idxconf else None
+        # Start with whatever is in the mappings document...
+        body = dict(document) if document else {}
+        # ...and combine its settings with the ones in the configuration.
+        settings = {
+            'index.mapping.total_fields.limit': self.mapping_field_limit
+        }
+        settings.update(body.get('settings', {}))
+        if idxconf and idxconf.settings:
+            settings.update(idxconf.settings)
+        body['settings'] = settings
+        return body
+
+    def cluster_for(self, index: str, write: bool = False) -> str or None:
+        """
+        Get the name of the cluster that serves reads from (or writes to) an
+        index.
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the name of the cluster (or `None` if the index isn't routed
+            to a particular cluster)
+        """
+        idxconf = self.indexes.get(index) if index else None
+        if idxconf is None:
+            return None
+        routed = idxconf.write_cluster if write else idxconf.read_cluster
+        return routed if routed else idxconf.cluster
 
     def from_object(self, o: str) -> 'ElastalkConf':
         """
@@ -255,7 +532,7 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
 
         # Configure other parameters.
         for t in [
-                ('ES_SNIFF_ON_START', '_sniff_on_start', bool),
+                ('ES_SNIFF_ON_START', 'sniff_on_start', bool),
                 (
                     'ES_SNIFF_ON_CONNECTION_FAIL',
                     'sniff_on_connection_fail',
@@ -263,7 +540,26 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
                 ),
                 ('ES_SNIFFER_TIMEOUT', 'sniffer_timeout', int),
                 ('ES_MAXSIZE', 'maxsize', int),
+                ('ES_TIMEOUT', 'timeout', float),
+                ('ES_MAX_RETRIES', 'max_retries', int),
+                ('ES_RETRY_ON_TIMEOUT', 'retry_on_timeout', bool),
+                ('ES_RETRY_ON_STATUS', 'retry_on_status', list),
+                ('ES_HTTP_COMPRESS', 'http_compress', bool),
+                ('ES_CONNECTION_CLASS', 'connection_class', str),
+                ('ES_KEEP_ALIVE', 'keep_alive', bool),
                 ('ES_MAPPING_FIELD_LIMIT', 'mapping_field_limit', int),
+                ('ES_BULK_CHUNK_SIZE', 'bulk_chunk_size', int),
+                ('ES_BULK_MAX_BYTES', 'bulk_max_bytes', int),
+                ('ES_BULK_THREADS', 'bulk_threads', int),
+                ('ES_BULK_MAX_RETRIES', 'bulk_max_retries', int),
+                ('ES_BULK_INITIAL_BACKOFF', 'bulk_initial_backoff', float),
+                ('ES_SEED_WORKERS', 'seed_workers', int),
+                ('ES_SEED_QUEUE_SIZE', 'seed_queue_size', int),
+                ('ES_SEED_PROCESSES', 'seed_processes', bool),
+                ('ES_SEED_ID_FIELD', 'seed_id_field', str),
+                ('ES_SEED_LOAD_MODE', 'seed_load_mode', bool),
+                ('ES_SEED_FORCEMERGE', 'seed_forcemerge', int),
+                ('ES_SERIALIZER', 'serializer', str),
         ]:
             o_val = getattr(cls, t[0], None)
             if o_val is not None:
@@ -271,18 +567,26 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
                 setattr(self, t[1], self_val)
 
         # Let's see if there are any blobbing directives.
-        blobs = BlobConf.load(getattr(o, 'ES_BLOBS', None))
+        blobs = BlobConf.load(getattr(cls, 'ES_BLOBS', None))
         # If there are...
         if blobs:
             # ...we'll use 'em.
             self.blobs = blobs
 
+        # The same goes for caching directives.
+        cache = CacheConf.load(getattr(cls, 'ES_CACHE', None))
+        if cache:
+            self.cache = cache
+
         # Look for index-specific settings.
-        indexes: dict = getattr(o, 'ES_INDEXES', None)
+        indexes: dict = getattr(cls, 'ES_INDEXES', None)
         if indexes:
             for index in indexes.keys():
                 self.indexes[index] = IndexConf.load(indexes[index])
 
+        # Blob plans compiled from the old configuration are no good anymore.
+        self.invalidate()
+
         # Return this instance to the caller (for more fluidity in the calling
         # code).
         return self
@@ -300,9 +604,19 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
             if isinstance(toml_, Path)
             else toml_
         )
+        return self.from_dict(_toml)
+
+    def from_dict(self, dict_: Dict) -> 'ElastalkConf':
+        """
+        Update the configuration from a dictionary (like a parsed
+        :py:func:`TOML <from_toml>` configuration).
+
+        :param dict_: the configuration dictionary
+        """
+        _toml: dict = dict_
 
         # Retrieve the hosts (if there are any).
-        _seeds = getattr(_toml, 'seeds', self.seeds)
+        _seeds = _toml.get('seeds', self.seeds)
         # The seeds might already be a list (if they're defined in code) or
         # they might be expressed as a comma-separated list.  We'll account
         # for both...
@@ -317,6 +631,11 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
             # ...we'll use 'em.
             self.blobs = blobs
 
+        # The same goes for caching directives.
+        cache = CacheConf.load(_toml.get('cache'))
+        if cache:
+            self.cache = cache
+
         # Look for index-specific settings.
         indexes: dict = _toml.get('indexes')
         if indexes:
@@ -329,12 +648,34 @@ class ElastalkConf:  # pylint: disable=unsubscriptable-object, unsupported-assig
                 'sniff_on_connection_fail',
                 'sniffer_timeout',
                 'maxsize',
-                'mapping_field_limit'
+                'timeout',
+                'max_retries',
+                'retry_on_timeout',
+                'retry_on_status',
+                'http_compress',
+                'connection_class',
+                'keep_alive',
+                'mapping_field_limit',
+                'bulk_chunk_size',
+                'bulk_max_bytes',
+                'bulk_threads',
+                'bulk_max_retries',
+                'bulk_initial_backoff',
+                'seed_workers',
+                'seed_queue_size',
+                'seed_processes',
+                'seed_id_field',
+                'seed_load_mode',
+                'seed_forcemerge',
+                'serializer'
         ]:
             value = _toml.get(att)
             if value is not None:
                 setattr(self, att, value)
 
+        # Blob plans compiled from the old configuration are no good anymore.
+        self.invalidate()
+
         # Return this instance to the caller (for more fluidity in the calling
         # code).
         return self
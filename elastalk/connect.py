@@ -10,15 +10,41 @@ Start a conversation with Elasticsearch!
 """
 import base64
 import binascii
-import json
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 import logging
-from typing import Any, Dict
+import os
+from pathlib import Path
+import threading
+import time
+import zlib
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Tuple
+)
 import elasticsearch
+import toml
+from .cache import CacheStats, ResultCache, cache_key, invalidate
 from .config import ElastalkConf, ElastalkConfigException
+from .serializers import ElasticsearchSerializer, Serializer, get_serializer
 
 
 __logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
 
+#: the HTTP connection classes (by name)
+_CONNECTION_CLASSES: Dict[str, type] = {
+    'urllib3': elasticsearch.Urllib3HttpConnection,
+    'requests': elasticsearch.RequestsHttpConnection
+}
+
 
 class ElastalkConnection(object):
     """
@@ -34,6 +60,37 @@ class ElastalkConnection(object):
         )  #: the configuration
         # The Elasticsearch client will be created on demand.
         self._client: elasticsearch.Elasticsearch or None = None
+        # So will the serializer.
+        self._serializer: Serializer or None = None
+        # This is the process in which the client was created.
+        self._pid: int or None = None
+        # This guards the creation (and disposal) of the client.
+        self._lock: threading.RLock = threading.RLock()
+        #: the time (see :py:func:`time.monotonic`) the client was last used
+        self.last_used: float = time.monotonic()
+        # This is the registry in which the connection is registered (if any).
+        self._registry: 'ConnectionRegistry' or None = None
+        # Search results are cached (by index) if the configuration says so.
+        self._caches: Dict[str, ResultCache] = {}
+        # The worker processes that pack (and unpack) many documents are
+        # created on demand and reused (along with the process that owns them
+        # and the number of workers).
+        self._executor: Tuple[ProcessPoolExecutor, int, int] or None = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Clients, worker processes and locks don't travel to other processes.
+        state = self.__dict__.copy()
+        state['_client'] = None
+        state['_pid'] = None
+        state['_registry'] = None
+        state['_caches'] = {}
+        state['_executor'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
 
     @property
     def config(self) -> ElastalkConf:
@@ -55,6 +112,24 @@ class ElastalkConnection(object):
         self._config = value
         self.reset()
 
+    @property
+    def serializer(self) -> Serializer:
+        """
+        Get the JSON serializer used to pack documents and to encode requests.
+
+        :return: the serializer
+        :raises ElastalkConfigException: if the configured serializer isn't
+            available
+        """
+        # If we haven't picked a serializer yet...
+        if self._serializer is None:
+            # ...do it now.
+            try:
+                self._serializer = get_serializer(self.config.serializer)
+            except ValueError as ex:
+                raise ElastalkConfigException(str(ex))
+        return self._serializer
+
     @property
     def client(self) -> elasticsearch.Elasticsearch:
         """
@@ -64,29 +139,211 @@ class ElastalkConnection(object):
         :raises ElasticsearchConfigurationException: if there is an error in
             the current configuration
         """
-        # If we've already created the client...
-        if self._client:
-            return self._client  # ...just send it back.
+        self.last_used = time.monotonic()
+        # If we've already created the client (in this process)...
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client  # ...just send it back.
+
+        with self._lock:
+            # If the client was inherited from a parent process...
+            if self._client is not None and self._pid != os.getpid():
+                # ...its sockets are shared with the parent, so we leave it
+                # alone (without closing it) and create our own.
+                self._client = None
+            # Another thread may have created the client while we waited.
+            if self._client is None:
+                self._client = self._create_client()
+                self._pid = os.getpid()
+            return self._client
+
+    def _create_client(self) -> elasticsearch.Elasticsearch:
+        """
+        Create a new Elasticsearch client.
+
+        :return: the Elasticsearch client
+        :raises ElasticsearchConfigurationException: if there is an error in
+            the current configuration
+        """
+        return elasticsearch.Elasticsearch(
+            list(self.config.seeds),
+            **self._client_kwargs()
+        )
+
+    @staticmethod
+    def _close_client(client: elasticsearch.Elasticsearch):
+        """
+        Close a client's transport (and its connection pool).
+
+        :param client: the Elasticsearch client
+        """
+        client.transport.close()
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        """
+        Get the keyword arguments used to create an Elasticsearch client from
+        the configuration.
 
+        :return: the keyword arguments
+        :raises ElasticsearchConfigurationException: if there is an error in
+            the current configuration
+        """
         # Create a list of the configured seed hosts.
         if not self.config.seeds:
             raise ElastalkConfigException(
                 'No seed hosts have been defined.'
             )
-
-        # Otherwise we need to create it.
-        self._client = elasticsearch.Elasticsearch(
-            list(self.config.seeds),
-            sniff_on_start=self.config.sniff_on_start,
-            sniff_on_connection_fail=self.config.sniff_on_connection_fail,
-            sniffer_timeout=self.config.sniffer_timeout,
-            maxsize=self.config.maxsize
+        kwargs = {
+            'sniff_on_start': self.config.sniff_on_start,
+            'sniff_on_connection_fail': self.config.sniff_on_connection_fail,
+            'sniffer_timeout': self.config.sniffer_timeout,
+            'maxsize': self.config.maxsize,
+            'timeout': self.config.timeout,
+            'max_retries': self.config.max_retries,
+            'retry_on_timeout': self.config.retry_on_timeout,
+            'retry_on_status': tuple(self.config.retry_on_status),
+            'http_compress': self.config.http_compress,
+            'serializer': ElasticsearchSerializer(self.serializer)
+        }
+        # If we've been asked for a particular connection class...
+        if self.config.connection_class:
+            # ...figure out which one it is.
+            try:
+                kwargs['connection_class'] = _CONNECTION_CLASSES[
+                    self.config.connection_class
+                ]
+            except KeyError:
+                raise ElastalkConfigException(
+                    f"'{self.config.connection_class}' is not a supported "
+                    f"connection class."
+                )
+        # If connections shouldn't be kept alive, we ask the server to close
+        # them after each response.
+        if not self.config.keep_alive:
+            kwargs['headers'] = {'connection': 'close'}
+        return kwargs
+
+    def for_index(
+            self,
+            index: str,
+            write: bool = False
+    ) -> 'ElastalkConnection':
+        """
+        Get the connection to the cluster that serves reads from (or writes
+        to) an index.  If the configuration routes the index to a named
+        cluster, the connection is looked up in the registry in which this
+        connection is registered (or the :py:meth:`default registry
+        <ConnectionRegistry.default>`).  Otherwise, it's this connection.
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the connection
+        :raises ElastalkConfigException: if the index is routed to a cluster
+            that isn't registered
+        """
+        name = self.config.cluster_for(index, write=write)
+        if not name:
+            return self
+        registry = (
+            self._registry if self._registry is not None
+            else ConnectionRegistry.default()
         )
-        return self._client
+        return registry.get(name)
+
+    @property
+    def connected(self) -> bool:
+        """
+        Has this process created a client (that hasn't been closed)?
+
+        :return: `True` if the connection has a client
+        """
+        return self._client is not None and self._pid == os.getpid()
 
     def reset(self):
-        """Reset the connection."""
-        self._client = None
+        """
+        Reset the connection.  (If a client has been created by this process,
+        its connections are closed.)
+        """
+        with self._lock:
+            client, self._client = self._client, None
+            self._serializer = None
+            pid, self._pid = self._pid, None
+            self._caches = {}
+            executor, self._executor = self._executor, None
+        # If there are worker processes (and they're ours), let them go.
+        if executor is not None and executor[1] == os.getpid():
+            executor[0].shutdown(wait=False)
+        # If there was a client (and it's ours to close)...
+        if client is not None and pid == os.getpid():
+            try:
+                self._close_client(client)  # ...close it.
+            except Exception as ex:  # pylint: disable=broad-except
+                __logger__.warning(f"The client could not be closed: {ex}")
+
+    def search(
+            self,
+            index: str,
+            body: Mapping[str, Any] = None,
+            **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Search an index.  If the configuration enables :ref:`caching
+        <configuration_cache>` for the index, identical searches are answered
+        from a local cache until the result expires (or the index is written
+        through Elastalk).
+
+        :param index: the name of the index
+        :param body: the search body
+        :param kwargs: other arguments for
+            :py:meth:`Elasticsearch.search() <elasticsearch.Elasticsearch.search>`
+        :return: the search result (Don't modify it, it may be shared.)
+        """
+        # Send the search to the cluster that serves reads from the index.
+        client = self.for_index(index).client
+        fetch = partial(client.search, index=index, body=body, **kwargs)
+        cache = self._cache(index)
+        if cache is None:
+            return fetch()
+        return cache.get(cache_key(index, body, **kwargs), fetch)
+
+    def _cache(self, index: str) -> ResultCache or None:
+        """
+        Get the search result cache for an index.
+
+        :param index: the name of the index
+        :return: the cache (or `None` if results aren't cached for the index)
+        """
+        try:
+            return self._caches[index]
+        except KeyError:
+            conf = self.config.cache_conf(index)
+            with self._lock:
+                cache = self._caches.setdefault(
+                    index, ResultCache(index, conf) if conf.enabled else None
+                )
+            return cache
+
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        """
+        Get the search result cache statistics for each index.
+
+        :return: the statistics (by index)
+        """
+        return {
+            index: cache.stats
+            for index, cache in self._caches.items()
+            if cache is not None
+        }
+
+    @staticmethod
+    def invalidate_cache(index: str):
+        """
+        Discard the cached search results for an index (in every connection).
+        Call this when you write to the index without going through Elastalk.
+
+        :param index: the name of the index
+        """
+        invalidate(index)
 
     def pack(self, doc: Dict, index: str) -> Dict[str, Any]:
         """
@@ -97,33 +354,68 @@ class ElastalkConnection(object):
             supply it the behavior configured for the index can be used.)*
         :return: the BLOB document
         """
+        # Get the blobbing behavior for the index.
+        plan = self.config.blob_plan(index=index)
         # If blobbing isn't enabled for this index...
-        if not self.config.blobs_enabled(index=index):
+        if not plan.enabled:
             return doc  # ...we don't need to do anything further.
+        return _pack(
+            doc,
+            blob_key=plan.key,
+            blob_exclusions=plan.exclusions,
+            compression=plan.compression,
+            serializer=self.serializer
+        )
 
-        # Get the key used to hold blobbed data.
-        blob_key = self.config.blob_key(index=index)
-
-        # Get the list of document properties that should be excluded from
-        # blobbed data.
-        blob_exclusions = self.config.blob_exclusions(index=index)
-
-        # Create a dictionary to hold...
-        blob_ = {}  # ...the blob-able keys, and another to hold...
-        noblob_ = {}  # ...the excluded keys.
-
-        # Sort out which keys will go in the blob and which are excluded.
-        for k, v in doc.items():
-            if k in blob_exclusions:
-                noblob_[k] = v
-            else:
-                blob_[k] = v
-
-        # Recombine the blobbed data with the un-blobbed data.
-        return {
-            **noblob_,
-            blob_key: _encode(blob_)
-        }
+    def pack_many(
+            self,
+            docs: Iterable[Dict],
+            index: str,
+            workers: int = None,
+            threshold: int = 1000,
+            executor: Executor = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Convert several document objects into BLOB documents.  The blobbing
+        configuration for the index is only looked up once.
+
+        :param docs: the original document objects
+        :param index: the name of the index
+        :param workers: the number of worker processes that may encode
+            documents (If you don't supply this argument, or supply fewer
+            than two, documents are encoded in the calling thread because a
+            single worker would only add the cost of sending documents to
+            it.)  The connection creates the worker processes the first time
+            a batch reaches the `threshold` and reuses them until it's
+            :py:func:`reset`.
+        :param threshold: documents are handed to the worker processes in
+            batches of this size (Batches smaller than this are encoded in the
+            calling thread.)
+        :param executor: an executor that encodes the batches (If you supply
+            one, it's used instead of the connection's worker processes and
+            `workers` only decides how the batches are divided among its
+            workers.)
+        :return: an iteration of BLOB documents
+        """
+        # Get the blobbing behavior for the index.
+        plan = self.config.blob_plan(index=index)
+        # If blobbing isn't enabled for this index...
+        if not plan.enabled:
+            yield from docs  # ...we don't need to do anything further.
+            return
+        yield from _map(
+            partial(
+                _pack,
+                blob_key=plan.key,
+                blob_exclusions=plan.exclusions,
+                compression=plan.compression,
+                serializer=self.serializer
+            ),
+            docs,
+            executor=self._workers(workers, executor=executor),
+            workers=workers,
+            threshold=threshold
+        )
 
     def unpack(self, doc: Dict, index: str = None) -> Dict:
         """
@@ -133,20 +425,92 @@ class ElastalkConnection(object):
         :param index: the name of the index for which the packed document came
         :return: the unpacked document
         """
-        # Get the key we should use to store blobbed data.
-        blob_key = self.config.blob_key(index=index)
+        return _unpack(
+            doc,
+            blob_key=self.config.blob_plan(index=index).key,
+            serializer=self.serializer
+        )
 
-        # Try to get the document.
-        blob = doc.get(blob_key)
-        # If there is no blob in the document...
-        if not blob:
-            return doc  # ...we can simply return the original document.
+    def unpack_many(
+            self,
+            docs: Iterable[Dict],
+            index: str = None,
+            workers: int = None,
+            threshold: int = 1000,
+            executor: Executor = None
+    ) -> Iterator[Dict]:
+        """
+        Convert several :py:func:`packed <pack>` documents to their original
+        forms.  The blobbing configuration for the index is only looked up
+        once.
+
+        :param docs: the packed documents
+        :param index: the name of the index for which the packed documents
+            came
+        :param workers: the number of worker processes that may decode
+            documents (If you don't supply this argument, or supply fewer
+            than two, documents are decoded in the calling thread.)  See
+            :py:func:`pack_many`.
+        :param threshold: documents are handed to the worker processes in
+            batches of this size (Batches smaller than this are decoded in the
+            calling thread.)
+        :param executor: an executor that decodes the batches (See
+            :py:func:`pack_many`.)
+        :return: an iteration of unpacked documents
+        """
+        yield from _map(
+            partial(
+                _unpack,
+                blob_key=self.config.blob_plan(index=index).key,
+                serializer=self.serializer
+            ),
+            docs,
+            executor=self._workers(workers, executor=executor),
+            workers=workers,
+            threshold=threshold
+        )
 
-        # Decode the blob and combine it with the rest of the document.
-        return {
-            **{k: v for k, v in doc.items() if k != blob_key},
-            **_decode(blob)
-        }
+    def _workers(
+            self,
+            workers: int or None,
+            executor: Executor = None
+    ) -> Callable[[], Executor] or None:
+        """
+        Get a function that returns the executor that handles large batches
+        of documents.  (The connection's worker processes aren't started
+        until the function is called.)
+
+        :param workers: the number of worker processes
+        :param executor: an executor supplied by the caller
+        :return: the function (or `None` if there are fewer than two workers
+            and no executor was supplied)
+        """
+        if executor is not None:
+            return lambda: executor
+        # If we don't have workers, there's nothing fancy to do.
+        if not workers or workers < 2:
+            return None
+        return partial(self._pool, workers)
+
+    def _pool(self, workers: int) -> ProcessPoolExecutor:
+        """
+        Get the connection's worker processes (creating them if they haven't
+        been created yet).
+
+        :param workers: the number of worker processes
+        :return: the executor that manages the worker processes
+        """
+        with self._lock:
+            # If we already have (enough of) our own workers, use them.
+            if self._executor is not None:
+                executor, pid, max_workers = self._executor
+                if pid == os.getpid() and max_workers == workers:
+                    return executor
+                if pid == os.getpid():
+                    executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers)
+            self._executor = (executor, os.getpid(), workers)
+            return executor
 
     @staticmethod
     def default(cnx: 'ElastalkConnection' = None) -> 'ElastalkConnection':
@@ -168,41 +532,408 @@ class ElastalkConnection(object):
             return ElastalkConnection.default(cnx=_cnx)
 
 
-def _encode(doc: Dict) -> str:
+class ConnectionRegistry(object):
     """
-    Encode a dictionary (document) as a base64-encoded string.
+    A registry of named connections (one for each cluster).  Each connection
+    holds a single (pooled) client that is shared by everything that talks to
+    its cluster.
+    """
+    #: the name of the default cluster
+    DEFAULT: str = 'default'
 
-    :param doc: the dictionary (document) object
-    :return: the base64-encoded string
+    def __init__(self, config: ElastalkConf = None):
+        """
+
+        :param config: the configuration used to route indexes to clusters
+            (If you don't supply one, the default cluster's configuration is
+            used.)
+        """
+        self._config: ElastalkConf or None = config
+        self._connections: Dict[str, ElastalkConnection] = {}
+        # This guards changes to the registry.
+        self._lock: threading.RLock = threading.RLock()
+
+    @property
+    def config(self) -> ElastalkConf:
+        """
+        Get the configuration used to route indexes to clusters.
+
+        :return: the configuration
+        """
+        if self._config is not None:
+            return self._config
+        return self.get().config
+
+    @property
+    def names(self) -> List[str]:
+        """
+        Get the names of the registered clusters.
+
+        :return: the names of the clusters
+        """
+        return list(self._connections.keys())
+
+    def register(
+            self,
+            name: str,
+            cnx: ElastalkConnection or ElastalkConf
+    ) -> ElastalkConnection:
+        """
+        Register a cluster.  (If a cluster is already registered under the
+        name, its connection is reset and replaced.)
+
+        :param name: the name of the cluster
+        :param cnx: the connection (or a configuration from which a connection
+            can be created)
+        :return: the registered connection
+        """
+        _cnx = (
+            cnx if isinstance(cnx, ElastalkConnection)
+            else ElastalkConnection(cnx)
+        )
+        with self._lock:
+            replaced = self._connections.get(name)
+            self._connections[name] = _cnx
+            _cnx._registry = self  # pylint: disable=protected-access
+        # If we replaced another connection...
+        if replaced is not None and replaced is not _cnx:
+            replaced.reset()  # ...its client is no longer needed.
+        return _cnx
+
+    def get(self, name: str = None) -> ElastalkConnection:
+        """
+        Get the connection to a cluster.
+
+        :param name: the name of the cluster (If you don't supply a name, the
+            default cluster's connection is returned.)
+        :return: the connection
+        :raises ElastalkConfigException: if no cluster is registered under the
+            name
+        """
+        _name = name if name else self.DEFAULT
+        try:
+            return self._connections[_name]
+        except KeyError:
+            # If nobody registered a default cluster, we fall back to the
+            # default connection.
+            if _name == self.DEFAULT:
+                return ElastalkConnection.default()
+            raise ElastalkConfigException(
+                f"No cluster is registered as '{_name}'."
+            )
+
+    def for_index(
+            self,
+            index: str,
+            write: bool = False
+    ) -> ElastalkConnection:
+        """
+        Get the connection to the cluster that serves reads from (or writes
+        to) an index.
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the connection
+        :raises ElastalkConfigException: if the index is configured to use a
+            cluster that isn't registered
+        """
+        return self.get(self.config.cluster_for(index, write=write))
+
+    def close(self, name: str = None):
+        """
+        Close the clients of registered clusters.  (Connections stay in the
+        registry and will create new clients when they're needed again.)
+
+        :param name: the name of the cluster (If you don't supply a name, all
+            the registered clusters are closed.)
+        """
+        with self._lock:
+            cnxs = (
+                [self.get(name)] if name
+                else list(self._connections.values())
+            )
+        for cnx in cnxs:
+            cnx.reset()
+
+    def close_idle(self, seconds: float) -> List[str]:
+        """
+        Close the clients of registered clusters that haven't been used for a
+        while.
+
+        :param seconds: the number of seconds a client may sit idle
+        :return: the names of the clusters that were closed
+        """
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            idle = [
+                (name, cnx) for name, cnx in self._connections.items()
+                if cnx.connected and cnx.last_used < cutoff
+            ]
+        for _, cnx in idle:
+            cnx.reset()
+        return [name for name, _ in idle]
+
+    @classmethod
+    def from_toml(cls, toml_: Path or str) -> 'ConnectionRegistry':
+        """
+        Create a registry from a TOML configuration.  The top-level options
+        configure the `default` cluster and each `[clusters.<name>]` section
+        configures another cluster.  (Options that aren't set in a cluster's
+        section are taken from the top level.)
+
+        :param toml_: the TOML configuration (or the path to it)
+        :return: the registry
+        """
+        _toml: dict = toml.loads(
+            toml_.read_text()
+            if isinstance(toml_, Path)
+            else toml_
+        )
+        base = {k: v for k, v in _toml.items() if k != 'clusters'}
+        config = ElastalkConf().from_dict(base)
+        registry = cls(config=config)
+        registry.register(cls.DEFAULT, config)
+        for name, section in _toml.get('clusters', {}).items():
+            registry.register(
+                name,
+                ElastalkConf().from_dict({**base, **section})
+            )
+        return registry
+
+    @staticmethod
+    def default(registry: 'ConnectionRegistry' = None) -> 'ConnectionRegistry':
+        """
+        Set and/or retrieve the default registry.
+
+        :param registry: Provide a new registry if you want to change the
+            default.  Otherwise, leave this argument out to retrieve the
+            current object.
+        :return: the default registry
+        """
+        if registry:
+            setattr(ConnectionRegistry, '__default__', registry)
+            return registry
+        try:
+            return getattr(ConnectionRegistry, '__default__')
+        except AttributeError:
+            _registry = ConnectionRegistry()
+            return ConnectionRegistry.default(registry=_registry)
+
+
+#: the bytes that mark the start of a versioned blob (A legacy blob decodes to
+#: base64 text, which never contains a NUL byte.)
+_BLOB_MAGIC = b'\x00ET'
+
+#: the version of the blob format written by :py:func:`_encode`
+_BLOB_VERSION = 1
+
+#: the compression schemes (The position of each is its code in the header.)
+_BLOB_COMPRESSIONS = (None, 'zlib', 'lz4')
+
+
+def _compressor(compression: str or None):
+    """
+    Get the module that implements a blob compression scheme.
+
+    :param compression: the name of the compression scheme (`zlib` or `lz4`)
+    :return: a module with `compress` and `decompress` functions (or `None`
+        if no compression was requested)
+    :raises ElastalkConfigException: if the compression scheme isn't supported
+    """
+    if not compression:
+        return None
+    if compression == 'zlib':
+        return zlib
+    if compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ElastalkConfigException(
+                "The 'lz4' package is required for lz4 blob compression."
+            )
+        return lz4.frame
+    raise ElastalkConfigException(
+        f"'{compression}' is not a supported blob compression scheme."
+    )
+
+
+def _encode(
+        doc: Dict,
+        compression: str = None,
+        serializer: Serializer = None
+) -> str:
     """
-    # Convert the object to a string.
-    as_str: str = json.dumps(doc)
-    # Encode the string using base64.
-    enc_bytes: bytes = base64.b64encode(bytes(as_str, 'utf-8'))
-    # Get the ASCII representation of the base64-encoded bytes.
-    enc_ascii: bytes = binascii.b2a_base64(enc_bytes, newline=False)
-    # Return the string form of the ASCII representation of the base-64
-    # encoded bytes.
-    return enc_ascii.decode('utf-8')
+    Encode a dictionary (document) as a blob string.
 
+    The blob is the base64 encoding of a binary header (a magic number, the
+    version of the blob format and the compression scheme) followed by the
+    (optionally compressed) JSON representation of the document, so it's
+    valid base64 from start to finish.
 
-def _decode(encoded: bytes) -> Dict:
+    :param doc: the dictionary (document) object
+    :param compression: the name of the compression scheme to apply (`zlib`
+        or `lz4`)
+    :param serializer: the JSON serializer (If you don't supply one, the
+        standard library's `json` serializer is used.)
+    :return: the blob string
+    """
+    _serializer = serializer if serializer else get_serializer()
+    # Convert the object to JSON bytes.
+    data: bytes = _serializer.dumps(doc)
+    # Compress the bytes (if we've been asked to).
+    compressor = _compressor(compression)
+    if compressor:
+        data = compressor.compress(data)
+    # Put the header in front and base64-encode the bytes (once).
+    header = _BLOB_MAGIC + bytes((
+        _BLOB_VERSION, _BLOB_COMPRESSIONS.index(compression or None)
+    ))
+    return base64.b64encode(header + data).decode('ascii')
+
+
+def _decode(encoded: str or bytes, serializer: Serializer = None) -> Dict:
     """
-    Decode an dictionary (document) encoded as a base64-encoded string.
+    Decode a dictionary (document) encoded as a blob string.  (Blobs written
+    before the format was versioned, which were base64-encoded twice, are
+    also supported.)
 
-    :param encoded: the base64-encoded string
+    :param encoded: the blob string
+    :param serializer: the JSON serializer (If you don't supply one, the
+        standard library's `json` serializer is used.)
     :return: the dictionary (document) object
+    :raises ValueError: if the blob's version (or compression) isn't supported
+    """
+    _serializer = serializer if serializer else get_serializer()
+    data: bytes = base64.b64decode(encoded)
+    # If there's no header, this must be a legacy blob (which was encoded
+    # twice).
+    if not data.startswith(_BLOB_MAGIC):
+        return _serializer.loads(binascii.a2b_base64(data))
+    # Otherwise, read the header.
+    start = len(_BLOB_MAGIC)
+    version, code = data[start], data[start + 1]
+    if version != _BLOB_VERSION:
+        raise ValueError(f"Blob version {version} is not supported.")
+    if code >= len(_BLOB_COMPRESSIONS):
+        raise ValueError(f"Blob compression {code} is not supported.")
+    data = data[start + 2:]
+    # Decompress the data (if it was compressed).
+    compressor = _compressor(_BLOB_COMPRESSIONS[code])
+    if compressor:
+        data = compressor.decompress(data)
+    return _serializer.loads(data)
+
+
+def _pack(
+        doc: Dict,
+        blob_key: str,
+        blob_exclusions: AbstractSet[str],
+        compression: str or None,
+        serializer: Serializer
+) -> Dict[str, Any]:
+    """
+    Convert a document object into a BLOB document.
+
+    :param doc: the original document object
+    :param blob_key: the key that holds the blobbed data
+    :param blob_exclusions: the keys that are excluded from the blob
+    :param compression: the compression applied to the blob
+    :param serializer: the JSON serializer
+    :return: the BLOB document
+    """
+    # Figure out which of the document's keys are excluded from the blob.
+    excluded = blob_exclusions & doc.keys() if blob_exclusions else None
+    # If none of them are, the whole document goes in the blob...
+    if not excluded:
+        return {
+            blob_key: _encode(doc, compression=compression, serializer=serializer)
+        }
+    # ...otherwise the excluded keys stay where they are and the rest go in
+    # the blob.
+    packed = {k: doc[k] for k in excluded}
+    packed[blob_key] = _encode(
+        {k: v for k, v in doc.items() if k not in excluded},
+        compression=compression,
+        serializer=serializer
+    )
+    return packed
+
+
+def _unpack(doc: Dict, blob_key: str, serializer: Serializer) -> Dict:
+    """
+    Convert a packed document to its original form.
+
+    :param doc: the packed document
+    :param blob_key: the key that holds the blobbed data
+    :param serializer: the JSON serializer
+    :return: the unpacked document
+    """
+    # Try to get the blob.
+    blob = doc.get(blob_key)
+    # If there is no blob in the document...
+    if not blob:
+        return doc  # ...we can simply return the original document.
+    # Decode the blob and combine it with the rest of the document.
+    unpacked = {k: v for k, v in doc.items() if k != blob_key}
+    unpacked.update(_decode(blob, serializer=serializer))
+    return unpacked
+
+
+def _map(
+        fn: Callable[[Dict], Dict],
+        docs: Iterable[Dict],
+        executor: Callable[[], Executor] or None,
+        workers: int or None,
+        threshold: int
+) -> Iterator[Dict]:
     """
-    dec_ascii: bytes = encoded
-    dec_ascii_bytes: bytes = binascii.a2b_base64(dec_ascii)
-    dec_bytes: bytes = base64.b64decode(dec_ascii_bytes)
-    return json.loads(dec_bytes.decode('utf-8'))
+    Apply a function to documents, using an executor for large batches.  One
+    batch is being processed by the executor while the next is read (so no
+    more than two batches are held at a time).
+
+    :param fn: the function (which must be picklable)
+    :param docs: the documents
+    :param executor: a function that returns the executor (or `None` to apply
+        the function in the calling thread) which is only called once a
+        batch reaches the threshold
+    :param workers: the number of workers the executor has (If you don't
+        know, the number of CPUs is assumed.)
+    :param threshold: the number of documents in a batch
+    :return: an iteration of the function's results
+    """
+    # If we don't have an executor, there's nothing fancy to do.
+    if executor is None:
+        yield from map(fn, docs)
+        return
+    _docs = iter(docs)
+    _executor: Executor or None = None
+    chunksize = max(1, threshold // ((workers or os.cpu_count() or 1) * 4))
+    in_flight: Iterator[Dict] or None = None
+    while True:
+        batch = list(islice(_docs, threshold))
+        submitted = None
+        # Hand full batches to the executor (which we get the first time we
+        # need it) before we wait on the one that's already in flight.
+        if len(batch) == threshold:
+            if _executor is None:
+                _executor = executor()
+            submitted = _executor.map(fn, batch, chunksize=chunksize)
+        if in_flight is not None:
+            yield from in_flight
+        if submitted is None:
+            # This is the final (small) batch.
+            yield from map(fn, batch)
+            return
+        in_flight = submitted
 
 
 class ElastalkMixin:
     """
     Mix this into your class to get easy access to the Elasticsearch client.
     """
+    #: the name of the cluster (in the :py:meth:`default registry
+    #: <ConnectionRegistry.default>`) the class talks to
+    elastalk_cluster: str = None
 
     @property
     def es_cnx(self) -> ElastalkConnection:
@@ -214,6 +945,11 @@ class ElastalkMixin:
         try:
             return getattr(self, '__elastalk_connection__')
         except AttributeError:
+            # If the class names a cluster...
+            if self.elastalk_cluster:
+                # ...share the registered connection (and don't hang on to
+                # it, in case the registry changes).
+                return ConnectionRegistry.default().get(self.elastalk_cluster)
             _cnx = ElastalkConnection.default()
             setattr(self, '__elastalk_connection__', _cnx)
             return _cnx
@@ -231,3 +967,36 @@ class ElastalkMixin:
     def es(self) -> elasticsearch.Elasticsearch:
         """Get the Elasticsearch client."""
         return self.es_cnx.client
+
+    def es_cnx_for(
+            self,
+            index: str,
+            write: bool = False
+    ) -> ElastalkConnection:
+        """
+        Get the Elastalk connection object for the cluster that serves reads
+        from (or writes to) an index.  (If the index isn't configured to use a
+        particular cluster, this is the mixin's :py:attr:`es_cnx`.)
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the Elastalk connection object
+        """
+        registry = ConnectionRegistry.default()
+        name = registry.config.cluster_for(index, write=write)
+        return registry.get(name) if name else self.es_cnx
+
+    def es_for(
+            self,
+            index: str,
+            write: bool = False
+    ) -> elasticsearch.Elasticsearch:
+        """
+        Get the Elasticsearch client for the cluster that serves reads from
+        (or writes to) an index.
+
+        :param index: the name of the index
+        :param write: `True` for the cluster that serves writes
+        :return: the Elasticsearch client
+        """
+        return self.es_cnx_for(index, write=write).client
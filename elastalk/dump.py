@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.dump
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Export Elasticsearch indexes as seed data (so you can :py:func:`seed
+<elastalk.seed.seed>` them somewhere else).
+"""
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor
+)
+from functools import partial
+import gzip
+import io
+from itertools import islice
+import logging
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Set
+)
+from .config import ElastalkConfigException
+from .connect import ElastalkConnection, _unpack
+from .search import ID_FIELD, _run_slices, _slice_count
+from .serializers import Serializer
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
+
+TYPE_FIELD = '_type'  #: the name of the document type field
+
+#: the document type used when a hit doesn't have one
+DEFAULT_DOCTYPE = '_doc'
+
+#: the output layouts (one file per document, or newline-delimited JSON)
+LAYOUTS = ('files', 'ndjson')
+
+#: the compression formats for newline-delimited JSON output
+COMPRESSIONS = ('gz', 'zst')
+
+#: the size (in bytes) of the buffer in front of each output file
+_BUFFER_SIZE = 1 << 20
+
+#: the number of unpacked batches a slice may have waiting
+_BATCHES_IN_FLIGHT = 2
+
+
+def dump(
+        cnx: ElastalkConnection,
+        indexes: Iterable[str],
+        path: str or Path,
+        layout: str = 'ndjson',
+        compression: str = None,
+        slices: int = None,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        scroll: str = '5m',
+        unpack: bool = True,
+        workers: int = None,
+        processes: bool = False
+) -> Dict[str, int]:
+    """
+    Export indexes into the :ref:`seed data <seed_data>` directory structure
+    (`indexes/<index>/<doctype>/`).
+
+    Each index is read with a `sliced scroll <https://bit.ly/2Ljb5Ce>`_.
+    Each slice is read on its own thread and written by its own (buffered)
+    writer.  With the `ndjson` layout, each slice writes one
+    :ref:`NDJSON <seed_data_ndjson>` file (`<index>.<slice>.ndjson`) per
+    document type, which may be compressed.  With the `files` layout, each
+    document is written to its own file (named for the document's ID).
+
+    :param cnx: the connection (If the configuration routes reads from an
+        index to another cluster, that cluster's :py:meth:`connection
+        <elastalk.connect.ElastalkConnection.for_index>` is used instead.)
+    :param indexes: the names of the indexes
+    :param path: the root directory of the seed data
+    :param layout: `ndjson` or `files`
+    :param compression: `gz` or `zst` to compress NDJSON files (Zstandard
+        compression requires the `zstandard` package.)
+    :param slices: the number of slices (This is limited to the size of the
+        connection pool, which is also the default.)
+    :param query: the query (If you don't supply a query, all documents are
+        exported.)
+    :param size: the number of documents in a page
+    :param scroll: how long Elasticsearch should keep the scroll contexts
+    :param unpack: `True` to :py:func:`unpack
+        <elastalk.connect.ElastalkConnection.unpack>` the documents
+    :param workers: the number of workers that unpack documents (If you don't
+        supply this argument, documents are unpacked on the threads that read
+        the slices.)
+    :param processes: `True` to unpack documents in worker processes rather
+        than threads
+    :return: the number of documents written for each index
+    :raises ValueError: if the layout or compression isn't supported
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"The layout must be one of {LAYOUTS}.")
+    if compression is not None and (
+            compression not in COMPRESSIONS or layout != 'ndjson'
+    ):
+        raise ValueError(
+            f"NDJSON files may be compressed with one of {COMPRESSIONS}."
+        )
+    root = Path(path) / 'indexes'
+    executor: Executor or None = (
+        (ProcessPoolExecutor if processes else ThreadPoolExecutor)(
+            max_workers=workers
+        )
+        if unpack and workers else None
+    )
+    try:
+        return {
+            index: _dump_index(
+                cnx,
+                index=index,
+                root=root,
+                layout=layout,
+                compression=compression,
+                slices=slices,
+                query=query,
+                size=size,
+                scroll=scroll,
+                unpack=unpack,
+                executor=executor
+            )
+            for index in indexes
+        }
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def _dump_index(
+        cnx: ElastalkConnection,
+        index: str,
+        root: Path,
+        layout: str,
+        compression: str or None,
+        slices: int or None,
+        query: Mapping[str, Any] or None,
+        size: int,
+        scroll: str,
+        unpack: bool,
+        executor: Executor or None
+) -> int:
+    """
+    Export a single index.
+
+    :param cnx: the connection
+    :param index: the name of the index
+    :param root: the directory that contains the indexes
+    :param layout: `ndjson` or `files`
+    :param compression: `gz`, `zst` or `None`
+    :param slices: the number of slices
+    :param query: the query
+    :param size: the number of documents in a page
+    :param scroll: how long Elasticsearch should keep the scroll contexts
+    :param unpack: `True` to unpack the documents
+    :param executor: the workers that unpack documents (if there are any)
+    :return: the number of documents written
+    """
+    # Read from the cluster that serves the index.
+    cnx = cnx.for_index(index)
+    fn: Callable[[Dict], Dict] or None = (
+        partial(
+            _unpack,
+            blob_key=cnx.config.blob_plan(index=index).key,
+            serializer=cnx.serializer
+        )
+        if unpack else None
+    )
+    counts: Dict[int, int] = {}
+
+    def _consume(slice_id: int, docs: Iterator[Mapping[str, Any]]):
+        with _SliceWriter(
+                root / index,
+                name=f'{index}.{slice_id}',
+                layout=layout,
+                compression=compression,
+                serializer=cnx.serializer,
+                id_field=cnx.config.seed_id_field
+        ) as writer:
+            for doc in _unpacked(docs, fn=fn, executor=executor, size=size):
+                writer.write(doc)
+        counts[slice_id] = writer.count
+
+    executor_, futures = _run_slices(
+        cnx=cnx,
+        index=index,
+        slices=_slice_count(cnx, slices),
+        consume=_consume,
+        query=query,
+        size=size,
+        scroll=scroll,
+        includes=(ID_FIELD, TYPE_FIELD),
+        source='_source',
+        unpack=False,
+        # The IDs are written as strings anyway.
+        uuids=False
+    )
+    with executor_:
+        # Wait for the slices (and raise the first error any of them ran into).
+        for future in futures:
+            future.result()
+    return sum(counts.values())
+
+
+def _apply(fn: Callable[[Dict], Dict], docs: List[Dict]) -> List[Dict]:
+    """
+    Apply a function to a batch of documents.
+
+    :param fn: the function
+    :param docs: the documents
+    :return: the function's results
+    """
+    return [fn(doc) for doc in docs]
+
+
+def _unpacked(
+        docs: Iterable[Dict],
+        fn: Callable[[Dict], Dict] or None,
+        executor: Executor or None,
+        size: int
+) -> Iterator[Dict]:
+    """
+    Unpack documents (in order), handing them to the workers in batches.
+
+    :param docs: the packed documents
+    :param fn: the unpacking function (or `None` to leave the documents as
+        they are)
+    :param executor: the workers (or `None` to unpack the documents on the
+        calling thread)
+    :param size: the number of documents in a batch
+    :return: an iteration of unpacked documents
+    """
+    if fn is None:
+        yield from docs
+        return
+    if executor is None:
+        yield from map(fn, docs)
+        return
+    _docs = iter(docs)
+    pending: Deque[Future] = deque()
+    while True:
+        batch = list(islice(_docs, size))
+        if batch:
+            pending.append(executor.submit(_apply, fn, batch))
+        # Hand over the oldest batch once we have enough in the works (or
+        # once there's nothing left to read).
+        if pending and (not batch or len(pending) > _BATCHES_IN_FLIGHT):
+            yield from pending.popleft().result()
+        if not batch and not pending:
+            return
+
+
+def _open(path: Path, compression: str or None) -> BinaryIO:
+    """
+    Open a (buffered and possibly compressed) output file.
+
+    :param path: the path to the file
+    :param compression: `gz`, `zst` or `None`
+    :return: the file
+    """
+    if compression == 'gz':
+        return io.BufferedWriter(
+            gzip.GzipFile(str(path), 'wb', compresslevel=6),
+            buffer_size=_BUFFER_SIZE
+        )
+    if compression == 'zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ElastalkConfigException(
+                "The 'zstandard' package is required to write .zst files."
+            )
+        return io.BufferedWriter(
+            zstandard.ZstdCompressor().stream_writer(open(str(path), 'wb')),
+            buffer_size=_BUFFER_SIZE
+        )
+    return open(str(path), 'wb', buffering=_BUFFER_SIZE)
+
+
+def _safe_name(id_: Any) -> bool:
+    """
+    Can a document ID be used as a file name?
+
+    :param id_: the document ID
+    :return: `True` if the ID can be used as a file name
+    """
+    return (
+        isinstance(id_, str)
+        and id_ not in ('', '.', '..')
+        and '/' not in id_
+        and '\\' not in id_
+        and '\0' not in id_
+    )
+
+
+class _SliceWriter:
+    """
+    Write the documents from a single slice.
+    """
+    def __init__(
+            self,
+            idxdir: Path,
+            name: str,
+            layout: str,
+            compression: str or None,
+            serializer: Serializer,
+            id_field: str
+    ):
+        """
+
+        :param idxdir: the index directory
+        :param name: the name of the NDJSON files (without the extension)
+        :param layout: `ndjson` or `files`
+        :param compression: `gz`, `zst` or `None`
+        :param serializer: the serializer used to write the documents
+        :param id_field: the field that holds the ID in NDJSON files
+        """
+        self.idxdir: Path = idxdir  #: the index directory
+        self.count: int = 0  #: the number of documents written
+        self._name: str = name
+        self._layout: str = layout
+        self._compression: str or None = compression
+        self._dumps = serializer.dumps
+        self._id_field: str = id_field
+        # These are the NDJSON files (by document type)...
+        self._files: Dict[str, BinaryIO] = {}
+        # ...and the document type directories we know are there.
+        self._dirs: Set[str] = set()
+
+    def __enter__(self) -> '_SliceWriter':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _docdir(self, doctype: str) -> Path:
+        """
+        Get (and create, if necessary) a document type directory.
+
+        :param doctype: the document type
+        :return: the document type directory
+        """
+        docdir = self.idxdir / doctype
+        if doctype not in self._dirs:
+            docdir.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(doctype)
+        return docdir
+
+    def write(self, doc: Mapping[str, Any]):
+        """
+        Write a document.
+
+        :param doc: the document (including its ID and document type)
+        """
+        doc = dict(doc)
+        id_ = doc.pop(ID_FIELD, None)
+        doctype = doc.pop(TYPE_FIELD, None) or DEFAULT_DOCTYPE
+        if self._layout == 'files':
+            # If the ID won't work as a file name, we can't write the file.
+            if not _safe_name(id_):
+                __logger__.warning(
+                    f"Document '{id_}' can't be written to its own file."
+                )
+                return
+            with open(str(self._docdir(doctype) / id_), 'wb') as out:
+                out.write(self._dumps(doc))
+        else:
+            out = self._files.get(doctype)
+            if out is None:
+                extension = (
+                    f'.ndjson.{self._compression}' if self._compression
+                    else '.ndjson'
+                )
+                out = _open(
+                    self._docdir(doctype) / f'{self._name}{extension}',
+                    compression=self._compression
+                )
+                self._files[doctype] = out
+            out.write(self._dumps({self._id_field: id_, **doc}))
+            out.write(b'\n')
+        self.count += 1
+
+    def close(self):
+        """
+        Close the NDJSON files.
+        """
+        for out in self._files.values():
+            out.close()
+        self._files.clear()
@@ -0,0 +1,1149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.fake
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+A stand-in Elasticsearch HTTP server that runs in-process (so you can
+load-test seeding, searching and the retry paths without a cluster).
+"""
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import random
+import socketserver
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import uuid
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
+
+#: the version the server claims to be
+VERSION = '6.8.0'
+
+#: the name of the (fake) cluster
+CLUSTER_NAME = 'elastalk-fake'
+
+#: the number of seconds between checks for the signal to stop
+_POLL_INTERVAL = 0.05
+
+#: the shard information in responses (There's only ever one shard.)
+_SHARDS: Dict[str, int] = {'total': 1, 'successful': 1, 'failed': 0}
+
+#: the settings every new index starts with
+DEFAULT_SETTINGS: Dict[str, str] = {
+    'index.number_of_shards': '5',
+    'index.number_of_replicas': '1'
+}
+
+
+class FakeError(Exception):
+    """
+    Raised to send an Elasticsearch-style error response.
+    """
+    def __init__(self, status: int, type_: str, reason: str):
+        """
+
+        :param status: the HTTP status
+        :param type_: the error type
+        :param reason: the reason
+        """
+        super().__init__(reason)
+        self.status: int = status  #: the HTTP status
+        self.type: str = type_  #: the error type
+        self.reason: str = reason  #: the reason
+
+    def body(self) -> Dict[str, Any]:
+        """
+        Get the body of the error response.
+
+        :return: the response body
+        """
+        cause = {'type': self.type, 'reason': self.reason}
+        return {
+            'error': {'root_cause': [cause], **cause},
+            'status': self.status
+        }
+
+
+@dataclass
+class FakeStats:
+    """
+    Count what the server has been asked to do.
+    """
+    requests: int = 0  #: the number of requests
+    written: int = 0  #: the number of documents written (or deleted)
+    read: int = 0  #: the number of search hits returned
+    rejected: int = 0  #: the number of bulk items rejected with a `429`
+    errors: int = 0  #: the number of injected error responses
+
+
+class _Index:
+    """
+    An index (in memory).
+    """
+    def __init__(self, settings: Mapping[str, Any], mappings: Mapping):
+        """
+
+        :param settings: the (flat) index settings
+        :param mappings: the mappings
+        """
+        self.settings: Dict[str, str] = {**DEFAULT_SETTINGS, **settings}
+        self.mappings: Dict = dict(mappings)
+        #: the documents (by ID) and their document types
+        self.docs: Dict[str, Tuple[str, Dict]] = {}
+
+
+class _Throttle:
+    """
+    Make callers wait their turn so that, together, they never go faster than
+    a given number of documents per second.
+    """
+    def __init__(self, rate: float):
+        """
+
+        :param rate: the maximum number of documents per second
+        """
+        self.rate: float = rate  #: the maximum number of documents per second
+        self._next: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    def wait(self, count: int):
+        """
+        Wait until a number of documents can be handled.
+
+        :param count: the number of documents
+        """
+        if not count:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # The documents are handled after everything that's already
+            # waiting...
+            self._next = max(now, self._next) + count / self.rate
+            delay = self._next - now
+        time.sleep(delay)  # ...so we wait (without holding up anybody else).
+
+
+def _flatten(settings: Mapping[str, Any], prefix: str = '') -> Dict[str, str]:
+    """
+    Flatten (nested) index settings into `index.`-prefixed keys.
+
+    :param settings: the settings
+    :param prefix: the prefix of the keys at this level
+    :return: the flat settings (`None` means the setting should be reset)
+    """
+    flat: Dict[str, str] = {}
+    for key, value in settings.items():
+        if isinstance(value, Mapping):
+            flat.update(_flatten(value, prefix=f'{prefix}{key}.'))
+            continue
+        key = f'{prefix}{key}'
+        if not key.startswith('index.'):
+            key = f'index.{key}'
+        flat[key] = None if value is None else str(value)
+    return flat
+
+
+def _nest(flat: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Turn flat index settings back into nested settings.
+
+    :param flat: the flat settings
+    :return: the nested settings
+    """
+    nested: Dict[str, Any] = {}
+    for key, value in flat.items():
+        *parents, name = key.split('.')
+        node = nested
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = value
+    return nested
+
+
+def _sort_value(hit: Mapping[str, Any], field: str) -> Any:
+    """
+    Get a hit's value for a sort field.
+
+    :param hit: the hit
+    :param field: the sort field
+    :return: the sort value
+    """
+    if field == '_id':
+        return hit['_id']
+    if field == '_doc':
+        return hit['_seq']
+    if field == '_score':
+        return hit['_score']
+    return hit['_source'].get(field)
+
+
+def _sorts(sort: Any) -> List[Tuple[str, bool]]:
+    """
+    Read the sort in a search request.
+
+    :param sort: the sort (a field, a `{field: order}` object or a list of
+        them)
+    :return: the sort fields and whether or not each is descending
+    """
+    sorts: List[Tuple[str, bool]] = []
+    for spec in sort if isinstance(sort, list) else [sort]:
+        if isinstance(spec, str):
+            sorts.append((spec, spec == '_score'))
+            continue
+        for field, order in spec.items():
+            if isinstance(order, Mapping):
+                order = order.get('order', 'asc')
+            sorts.append((field, order == 'desc'))
+    return sorts
+
+
+def _matches(query: Mapping[str, Any] or None, hit: Mapping[str, Any]) -> bool:
+    """
+    Does a hit match a query?  (Only `match_all`, `ids`, `term`, `terms` and
+    the `must` and `filter` clauses of `bool` queries are understood.)
+
+    :param query: the query
+    :param hit: the hit
+    :return: `True` if the hit matches
+    :raises FakeError: if the query isn't understood
+    """
+    if not query:
+        return True
+    (kind, args), = query.items()
+    if kind == 'match_all':
+        return True
+    if kind == 'ids':
+        return hit['_id'] in args.get('values', [])
+    if kind in ('term', 'terms'):
+        (field, value), = args.items()
+        if isinstance(value, Mapping):
+            value = value.get('value')
+        values = value if kind == 'terms' else [value]
+        actual = hit['_id'] if field == '_id' else hit['_source'].get(field)
+        return actual in values
+    if kind == 'bool':
+        clauses = [
+            clause
+            for occur in ('must', 'filter')
+            for clause in (
+                args.get(occur, []) if isinstance(args.get(occur), list)
+                else [args[occur]] if occur in args else []
+            )
+        ]
+        return all(_matches(clause, hit) for clause in clauses)
+    raise FakeError(
+        400, 'parsing_exception', f"The fake server doesn't support '{kind}'."
+    )
+
+
+def _source(
+        source: Mapping[str, Any],
+        includes: Any
+) -> Dict[str, Any] or None:
+    """
+    Filter a document's source.
+
+    :param source: the document source
+    :param includes: the `_source` option from the search request
+    :return: the filtered source (or `None` if no source should be returned)
+    """
+    if includes is None or includes is True:
+        return dict(source)
+    if includes is False:
+        return None
+    if isinstance(includes, Mapping):
+        includes = includes.get('includes', includes.get('include'))
+        if includes is None:
+            return dict(source)
+    if isinstance(includes, str):
+        includes = [includes]
+    return {key: value for key, value in source.items() if key in includes}
+
+
+class FakeElasticsearch:
+    """
+    A stand-in Elasticsearch server that keeps its indexes in memory.
+
+    It understands enough of the API for the clients in this package: the
+    bulk API, indexing and getting single documents, searches (with
+    `search_after`, scrolls and slices), creating, deleting and checking for
+    indexes, index settings, refreshes, force-merges, cluster health and the
+    node information clients use to sniff.  Queries are limited to
+    `match_all`, `ids`, `term`, `terms` and simple `bool` queries.
+
+    To see how the clients cope with a busy cluster, the server can add
+    `latency` to every request, handle no more than `max_docs_per_second`
+    documents (written or returned) and inject errors.  A fraction of bulk,
+    document and search requests (`error_rate`) fail with one of the
+    `error_statuses`, and a fraction of bulk items (`rejection_rate`) are
+    rejected with a `429`.
+
+    .. code-block:: python
+
+        with FakeElasticsearch(latency=0.01, rejection_rate=0.05) as fake:
+            config = ElastalkConf(seeds=fake.seeds)
+    """
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            latency: float = 0.0,
+            max_docs_per_second: float = None,
+            error_rate: float = 0.0,
+            error_statuses: Sequence[int] = (429, 503),
+            rejection_rate: float = 0.0,
+            seed: int = None
+    ):
+        """
+
+        :param host: the address to which the server binds
+        :param port: the port (If it's `0`, a free port is picked.)
+        :param latency: the number of seconds added to every request
+        :param max_docs_per_second: the maximum number of documents the server
+            writes (or returns) per second
+        :param error_rate: the fraction of bulk, document and search requests
+            that fail
+        :param error_statuses: the HTTP statuses with which they fail
+        :param rejection_rate: the fraction of bulk items rejected with a
+            `429`
+        :param seed: the random seed for injected errors and rejections
+        """
+        self.latency: float = latency  #: the seconds added to every request
+        self.error_rate: float = error_rate  #: the fraction of failed requests
+        #: the HTTP statuses of failed requests
+        self.error_statuses: Tuple[int, ...] = tuple(error_statuses)
+        #: the fraction of rejected bulk items
+        self.rejection_rate: float = rejection_rate
+        self.stats: FakeStats = FakeStats()  #: what the server has done
+        self._throttle: _Throttle or None = (
+            _Throttle(max_docs_per_second) if max_docs_per_second else None
+        )
+        self._random: random.Random = random.Random(seed)
+        self._indexes: Dict[str, _Index] = {}
+        self._scrolls: Dict[str, List] = {}
+        # This guards the indexes, the scrolls and the statistics.
+        self._lock: threading.RLock = threading.RLock()
+        self._server: _Server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread: threading.Thread or None = None
+
+    def __enter__(self) -> 'FakeElasticsearch':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def address(self) -> str:
+        """
+        Get the server's address.
+
+        :return: the address (`host:port`)
+        """
+        host, port = self._server.server_address[:2]
+        return f'{host}:{port}'
+
+    @property
+    def seeds(self) -> List[str]:
+        """
+        Get the :py:attr:`seeds <elastalk.config.ElastalkConf.seeds>` that
+        point a client at the server.
+
+        :return: the seeds
+        """
+        return [self.address]
+
+    def start(self) -> 'FakeElasticsearch':
+        """
+        Start serving requests on a background thread.
+
+        :return: this server
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self.serve_forever, daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serve requests on the calling thread (until the server is stopped).
+        """
+        # Check for the stop signal often, so stopping is quick.
+        self._server.serve_forever(poll_interval=_POLL_INTERVAL)
+
+    def stop(self):
+        """
+        Stop the server.
+        """
+        # If it's running on its own thread, tell it to stop (and wait).
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def documents(self, index: str) -> Dict[str, Dict]:
+        """
+        Get the documents in an index.
+
+        :param index: the name of the index
+        :return: the document sources (by ID)
+        """
+        with self._lock:
+            idx = self._indexes.get(index)
+            return (
+                {id_: dict(source) for id_, (_, source) in idx.docs.items()}
+                if idx else {}
+            )
+
+    def _count(self, **counts: int):
+        """
+        Add to the statistics.
+
+        :param counts: the amounts to add (by statistic)
+        """
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + count)
+
+    def _wait(self, count: int):
+        """
+        Wait for the throughput cap (if there is one).
+
+        :param count: the number of documents being handled
+        """
+        if self._throttle is not None:
+            self._throttle.wait(count)
+
+    def _chance(self, rate: float) -> bool:
+        """
+        Decide whether or not something bad should happen.
+
+        :param rate: the chance that it does
+        :return: `True` if it does
+        """
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _fail(self):
+        """
+        Fail the current request (if luck says so).
+
+        :raises FakeError: if the request fails
+        """
+        if not self._chance(self.error_rate):
+            return
+        self._count(errors=1)
+        with self._lock:
+            status = self._random.choice(self.error_statuses)
+        raise FakeError(
+            status,
+            'es_rejected_execution_exception' if status == 429
+            else 'unavailable_shards_exception',
+            'This request was failed on purpose.'
+        )
+
+    def _index(self, index: str, create: bool = False) -> _Index:
+        """
+        Get an index.
+
+        :param index: the name of the index
+        :param create: `True` to create the index if it doesn't exist
+        :return: the index
+        :raises FakeError: if the index doesn't exist
+        """
+        idx = self._indexes.get(index)
+        if idx is None:
+            if not create:
+                raise FakeError(
+                    404, 'index_not_found_exception', f'no such index [{index}]'
+                )
+            idx = self._indexes[index] = _Index({}, {})
+        return idx
+
+    def _names(self, index: str or None) -> List[str]:
+        """
+        Expand the index part of a path.
+
+        :param index: the index part (a name, a comma-separated list of names,
+            `_all` or `None`)
+        :return: the names of the indexes
+        """
+        with self._lock:
+            if index in (None, '', '_all', '*'):
+                return list(self._indexes)
+            return index.split(',')
+
+    def exists(self, index: str) -> bool:
+        """
+        Does an index exist?
+
+        :param index: the name of the index
+        :return: `True` if it does
+        """
+        with self._lock:
+            return all(name in self._indexes for name in self._names(index))
+
+    def create(self, index: str, body: Mapping[str, Any] or None):
+        """
+        Create an index.
+
+        :param index: the name of the index
+        :param body: the settings and mappings
+        :raises FakeError: if the index already exists
+        """
+        body = body or {}
+        with self._lock:
+            if index in self._indexes:
+                raise FakeError(
+                    400,
+                    'resource_already_exists_exception',
+                    f'index [{index}] already exists'
+                )
+            self._indexes[index] = _Index(
+                {
+                    key: value
+                    for key, value in _flatten(body.get('settings', {})).items()
+                    if value is not None
+                },
+                body.get('mappings', {})
+            )
+
+    def delete(self, index: str):
+        """
+        Delete indexes.
+
+        :param index: the name of the index (or a comma-separated list of
+            names, or `_all`)
+        :raises FakeError: if an index doesn't exist
+        """
+        with self._lock:
+            names = self._names(index)
+            for name in names:
+                self._index(name)
+            for name in names:
+                del self._indexes[name]
+
+    def get_index(self, index: str) -> Dict[str, Any]:
+        """
+        Get the mappings and settings of indexes.
+
+        :param index: the index part of the path
+        :return: the response
+        """
+        with self._lock:
+            return {
+                name: {
+                    'aliases': {},
+                    'mappings': self._index(name).mappings,
+                    'settings': _nest(self._index(name).settings)
+                }
+                for name in self._names(index)
+            }
+
+    def get_settings(self, index: str, flat: bool) -> Dict[str, Any]:
+        """
+        Get the settings of indexes.
+
+        :param index: the index part of the path
+        :param flat: `True` for flat settings
+        :return: the response
+        """
+        with self._lock:
+            return {
+                name: {
+                    'settings': (
+                        dict(self._index(name).settings) if flat
+                        else _nest(self._index(name).settings)
+                    )
+                }
+                for name in self._names(index)
+            }
+
+    def put_settings(self, index: str, body: Mapping[str, Any]):
+        """
+        Update the settings of indexes.
+
+        :param index: the index part of the path
+        :param body: the new settings (`None` resets a setting)
+        """
+        updates = _flatten(body.get('settings', body))
+        with self._lock:
+            for name in self._names(index):
+                settings = self._index(name).settings
+                for key, value in updates.items():
+                    if value is None:
+                        if key in DEFAULT_SETTINGS:
+                            settings[key] = DEFAULT_SETTINGS[key]
+                        else:
+                            settings.pop(key, None)
+                    else:
+                        settings[key] = value
+
+    def write(
+            self,
+            op: str,
+            index: str,
+            doctype: str or None,
+            id_: str or None,
+            source: Mapping[str, Any] or None
+    ) -> Dict[str, Any]:
+        """
+        Write (or delete) a single document.
+
+        :param op: `index`, `create`, `update` or `delete`
+        :param index: the name of the index
+        :param doctype: the document type
+        :param id_: the document ID (If it's `None`, one is generated.)
+        :param source: the document source (or, for `update`, the request
+            body)
+        :return: the outcome
+        """
+        id_ = str(id_) if id_ is not None else uuid.uuid4().hex
+        doctype = doctype or '_doc'
+        outcome = {'_index': index, '_type': doctype, '_id': id_}
+        with self._lock:
+            idx = self._index(index, create=op != 'delete')
+            previous = idx.docs.get(id_)
+            if op == 'delete':
+                if previous is None:
+                    return {**outcome, 'result': 'not_found', 'status': 404}
+                del idx.docs[id_]
+                self.stats.written += 1
+                return {**outcome, 'result': 'deleted', 'status': 200}
+            if op == 'create' and previous is not None:
+                return {
+                    **outcome,
+                    'status': 409,
+                    'error': FakeError(
+                        409,
+                        'version_conflict_engine_exception',
+                        f'[{doctype}][{id_}]: document already exists'
+                    ).body()['error']
+                }
+            if op == 'update':
+                update = source or {}
+                if previous is None and not (
+                        update.get('doc_as_upsert') or 'upsert' in update
+                ):
+                    return {
+                        **outcome,
+                        'status': 404,
+                        'error': FakeError(
+                            404,
+                            'document_missing_exception',
+                            f'[{doctype}][{id_}]: document missing'
+                        ).body()['error']
+                    }
+                base = (
+                    previous[1] if previous is not None
+                    else update.get('upsert', {})
+                )
+                source = {**base, **update.get('doc', {})}
+            idx.docs[id_] = (doctype, dict(source or {}))
+            self.stats.written += 1
+        return {
+            **outcome,
+            'result': 'created' if previous is None else 'updated',
+            'status': 201 if previous is None else 200
+        }
+
+    def bulk(
+            self,
+            body: bytes,
+            index: str = None,
+            doctype: str = None
+    ) -> Dict[str, Any]:
+        """
+        Handle a bulk request.
+
+        :param body: the request body
+        :param index: the default index
+        :param doctype: the default document type
+        :return: the response
+        """
+        lines = iter(line for line in body.splitlines() if line.strip())
+        requests: List[Tuple[str, Dict, Dict or None]] = []
+        for line in lines:
+            (op, meta), = json.loads(line).items()
+            source = None
+            if op != 'delete':
+                line = next(lines, None)
+                if line is None:
+                    raise ValueError('The bulk request must end with a newline.')
+                source = json.loads(line)
+            requests.append((op, meta, source))
+        self._wait(len(requests))
+        started = time.perf_counter()
+        items = []
+        for op, meta, source in requests:
+            _index = meta.get('_index', index)
+            try:
+                if self._chance(self.rejection_rate):
+                    self._count(rejected=1)
+                    raise FakeError(
+                        429,
+                        'es_rejected_execution_exception',
+                        'This item was rejected on purpose.'
+                    )
+                items.append({op: self.write(
+                    op,
+                    index=_index,
+                    doctype=meta.get('_type', doctype),
+                    id_=meta.get('_id'),
+                    source=source
+                )})
+            except FakeError as ex:
+                items.append({op: {
+                    '_index': _index,
+                    '_id': meta.get('_id'),
+                    'status': ex.status,
+                    'error': ex.body()['error']
+                }})
+        return {
+            'took': int((time.perf_counter() - started) * 1000),
+            'errors': any(
+                'error' in next(iter(item.values())) for item in items
+            ),
+            'items': items
+        }
+
+    def get(self, index: str, doctype: str, id_: str) -> Dict[str, Any]:
+        """
+        Get a single document.
+
+        :param index: the name of the index
+        :param doctype: the document type
+        :param id_: the document ID
+        :return: the response
+        :raises FakeError: if the index doesn't exist
+        """
+        with self._lock:
+            found = self._index(index).docs.get(id_)
+        if found is None:
+            return {'_index': index, '_type': doctype, '_id': id_, 'found': False}
+        self._wait(1)
+        self._count(read=1)
+        return {
+            '_index': index,
+            '_type': found[0],
+            '_id': id_,
+            'found': True,
+            '_source': dict(found[1])
+        }
+
+    def _hits(
+            self,
+            index: str or None,
+            body: Mapping[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Find (and sort) the hits for a search request.
+
+        :param index: the index part of the path
+        :param body: the request body
+        :return: the hits
+        """
+        query = body.get('query')
+        slice_ = body.get('slice')
+        with self._lock:
+            hits = [
+                {
+                    '_index': name,
+                    '_type': doctype,
+                    '_id': id_,
+                    '_score': 1.0,
+                    '_source': source
+                }
+                for name in self._names(index)
+                for id_, (doctype, source) in self._index(name).docs.items()
+            ]
+        # Remember the order in which the hits were found (for `_doc` sorts).
+        for seq, hit in enumerate(hits):
+            hit['_seq'] = seq
+        hits = [hit for hit in hits if _matches(query, hit)]
+        if slice_:
+            hits = [
+                hit for hit in hits
+                if uuid.uuid5(uuid.NAMESPACE_URL, hit['_id']).int
+                % slice_['max'] == slice_['id']
+            ]
+        sorts = _sorts(body['sort']) if body.get('sort') else []
+        # Sort by each field in turn, starting with the last one.  (Documents
+        # without a value go last, whatever the order.)
+        for field, desc in reversed(sorts):
+            if field == '_score':
+                continue  # Every hit has the same score.
+            present = [h for h in hits if _sort_value(h, field) is not None]
+            present.sort(
+                key=lambda hit, field=field: _sort_value(hit, field),
+                reverse=desc
+            )
+            hits = present + [
+                h for h in hits if _sort_value(h, field) is None
+            ]
+        if sorts:
+            for hit in hits:
+                hit['sort'] = [_sort_value(hit, field) for field, _ in sorts]
+        after = body.get('search_after')
+        if after:
+            hits = [hit for hit in hits if _after(hit['sort'], after, sorts)]
+        for hit in hits:
+            del hit['_seq']
+            source = _source(hit.pop('_source'), body.get('_source'))
+            if source is not None:
+                hit['_source'] = source
+        return hits
+
+    def _page(
+            self,
+            hits: List[Dict[str, Any]],
+            total: int,
+            scroll_id: str = None
+    ) -> Dict[str, Any]:
+        """
+        Create a search response.
+
+        :param hits: the hits on the page
+        :param total: the total number of hits
+        :param scroll_id: the scroll ID (if this is a scroll)
+        :return: the response
+        """
+        self._wait(len(hits))
+        self._count(read=len(hits))
+        resp = {
+            'took': 1,
+            'timed_out': False,
+            '_shards': {**_SHARDS, 'skipped': 0},
+            'hits': {'total': total, 'max_score': None, 'hits': hits}
+        }
+        if scroll_id is not None:
+            resp['_scroll_id'] = scroll_id
+        return resp
+
+    def search(
+            self,
+            index: str or None,
+            body: Mapping[str, Any] or None,
+            scroll: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Handle a search request.
+
+        :param index: the index part of the path
+        :param body: the request body
+        :param scroll: `True` to start a scroll
+        :return: the response
+        """
+        body = body or {}
+        hits = self._hits(index, body)
+        size = body.get('size', 10)
+        start = body.get('from', 0)
+        if not scroll:
+            return self._page(hits[start:start + size], total=len(hits))
+        scroll_id = uuid.uuid4().hex
+        with self._lock:
+            self._scrolls[scroll_id] = [hits[size:], size, len(hits)]
+        return self._page(hits[:size], total=len(hits), scroll_id=scroll_id)
+
+    def msearch(self, body: bytes, index: str = None) -> Dict[str, Any]:
+        """
+        Handle a multi-search request.
+
+        :param body: the request body (a header line and a body line for each
+            search)
+        :param index: the default index
+        :return: the response
+        """
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        responses = []
+        for header, search in zip(lines[::2], lines[1::2]):
+            try:
+                responses.append({
+                    **self.search(header.get('index', index), body=search),
+                    'status': 200
+                })
+            except FakeError as ex:
+                responses.append({**ex.body(), 'status': ex.status})
+        return {'responses': responses}
+
+    def scroll(self, scroll_id: str) -> Dict[str, Any]:
+        """
+        Get the next page of a scroll.
+
+        :param scroll_id: the scroll ID
+        :return: the response
+        :raises FakeError: if the scroll doesn't exist
+        """
+        with self._lock:
+            context = self._scrolls.get(scroll_id)
+            if context is None:
+                raise FakeError(
+                    404,
+                    'search_context_missing_exception',
+                    f'No search context found for id [{scroll_id}]'
+                )
+            remaining, size, total = context
+            context[0] = remaining[size:]
+        return self._page(remaining[:size], total=total, scroll_id=scroll_id)
+
+    def clear_scroll(self, scroll_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Clear scrolls.
+
+        :param scroll_ids: the scroll IDs (or `_all`)
+        :return: the response
+        """
+        with self._lock:
+            ids = list(self._scrolls) if '_all' in scroll_ids else scroll_ids
+            freed = [id_ for id_ in ids if self._scrolls.pop(id_, None)]
+        if not freed:
+            raise FakeError(404, 'search_context_missing_exception', 'Not found')
+        return {'succeeded': True, 'num_freed': len(freed)}
+
+    def handle(
+            self,
+            method: str,
+            path: str,
+            data: bytes = b''
+    ) -> Tuple[int, Any]:
+        """
+        Handle a request (without the HTTP).
+
+        :param method: the HTTP method
+        :param path: the path (including the query string)
+        :param data: the request body
+        :return: the HTTP status and the response body
+        """
+        url = urlsplit(path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        params = {
+            key: values[-1] for key, values in parse_qs(url.query).items()
+        }
+        self._count(requests=1)
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            return self._route(method, parts=parts, params=params, data=data)
+        except FakeError as ex:
+            return ex.status, ex.body()
+        except (ValueError, KeyError, TypeError) as ex:
+            error = FakeError(400, 'illegal_argument_exception', str(ex))
+            return error.status, error.body()
+
+    def _route(
+            self,
+            method: str,
+            parts: List[str],
+            params: Mapping[str, str],
+            data: bytes
+    ) -> Tuple[int, Any]:
+        """
+        Work out what a request is asking for (and do it).
+
+        :param method: the HTTP method
+        :param parts: the parts of the path
+        :param params: the query parameters
+        :param data: the request body
+        :return: the HTTP status and the response body
+        :raises FakeError: if the request fails
+        """
+        # pylint: disable=too-many-return-statements,too-many-branches
+        body: Dict[str, Any] = (
+            json.loads(data)
+            if data.strip() and parts[-1:] not in (['_bulk'], ['_msearch'])
+            else {}
+        )
+        if not parts:
+            return 200, {
+                'name': 'fake',
+                'cluster_name': CLUSTER_NAME,
+                'version': {'number': VERSION},
+                'tagline': 'You Know, for Search'
+            }
+        if parts[:2] == ['_cluster', 'health']:
+            return 200, self.health()
+        if parts[0] == '_nodes':
+            # This is what clients ask for when they sniff.
+            return 200, {
+                'cluster_name': CLUSTER_NAME,
+                'nodes': {
+                    'fake': {
+                        'name': 'fake',
+                        'http': {'publish_address': self.address}
+                    }
+                }
+            }
+        if parts[-1] == '_bulk':
+            self._fail()
+            return 200, self.bulk(
+                data,
+                index=parts[0] if len(parts) > 1 else None,
+                doctype=parts[1] if len(parts) > 2 else None
+            )
+        if parts[-1] == '_msearch':
+            self._fail()
+            return 200, self.msearch(
+                data, index=parts[0] if len(parts) > 1 else None
+            )
+        if parts[:2] == ['_search', 'scroll']:
+            scroll_id = params.get('scroll_id', body.get('scroll_id'))
+            if method == 'DELETE':
+                return 200, self.clear_scroll(
+                    [scroll_id] if isinstance(scroll_id, str)
+                    else scroll_id or []
+                )
+            self._fail()
+            return 200, self.scroll(scroll_id)
+        if parts[-1] == '_search':
+            self._fail()
+            return 200, self.search(
+                parts[0] if len(parts) > 1 else None,
+                body=body,
+                scroll='scroll' in params
+            )
+        index = parts[0]
+        if len(parts) == 1:
+            if method == 'HEAD':
+                return (200 if self.exists(index) else 404), None
+            if method == 'PUT':
+                self.create(index, body=body)
+                return 200, {
+                    'acknowledged': True,
+                    'shards_acknowledged': True,
+                    'index': index
+                }
+            if method == 'DELETE':
+                self.delete(index)
+                return 200, {'acknowledged': True}
+            return 200, self.get_index(index)
+        if parts[1] == '_settings':
+            if method == 'PUT':
+                self.put_settings(index, body=body)
+                return 200, {'acknowledged': True}
+            return 200, self.get_settings(
+                index, flat=params.get('flat_settings') == 'true'
+            )
+        if parts[1] in ('_refresh', '_forcemerge', '_flush'):
+            self.get_settings(index, flat=True)  # (The indexes must exist.)
+            return 200, {'_shards': _SHARDS}
+        # Everything else is about a single document.
+        if len(parts) == 2 and method == 'POST':
+            op, id_ = 'index', None
+        elif len(parts) == 3 and method in ('GET', 'HEAD'):
+            self._fail()
+            resp = self.get(index, doctype=parts[1], id_=parts[2])
+            return (200 if resp['found'] else 404), resp
+        elif len(parts) == 3 and method in ('PUT', 'POST', 'DELETE'):
+            op, id_ = ('delete' if method == 'DELETE' else 'index'), parts[2]
+        elif len(parts) == 4 and parts[3] in ('_create', '_update'):
+            op, id_ = parts[3][1:], parts[2]
+        else:
+            raise FakeError(
+                400,
+                'invalid_request',
+                f"The fake server doesn't support "
+                f"{method} /{'/'.join(parts)}."
+            )
+        self._fail()
+        self._wait(1)
+        outcome = self.write(
+            op,
+            index=index,
+            doctype=parts[1],
+            id_=id_,
+            source=body if op != 'delete' else None
+        )
+        status = outcome.pop('status')
+        if 'error' in outcome:
+            return status, {'error': outcome['error'], 'status': status}
+        return status, {**outcome, '_shards': _SHARDS}
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Get the cluster health.  (It's always green.)
+
+        :return: the response
+        """
+        with self._lock:
+            indexes = len(self._indexes)
+        return {
+            'cluster_name': CLUSTER_NAME,
+            'status': 'green',
+            'timed_out': False,
+            'number_of_nodes': 1,
+            'number_of_data_nodes': 1,
+            'active_primary_shards': indexes,
+            'active_shards': indexes,
+            'relocating_shards': 0,
+            'initializing_shards': 0,
+            'unassigned_shards': 0
+        }
+
+
+def _after(sort: List[Any], after: List[Any], sorts: List[Tuple[str, bool]]):
+    """
+    Does a hit come after the `search_after` values?
+
+    :param sort: the hit's sort values
+    :param after: the `search_after` values
+    :param sorts: the sort fields and whether or not each is descending
+    :return: `True` if the hit comes after
+    """
+    for value, mark, (_, desc) in zip(sort, after, sorts):
+        if value == mark:
+            continue
+        # Documents without a value go last.
+        if value is None or mark is None:
+            return value is None
+        return value < mark if desc else value > mark
+    return False
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Handle each connection on its own thread.
+    """
+    daemon_threads = True
+    fake: FakeElasticsearch = None  #: the server that handles the requests
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Hand HTTP requests to the :py:class:`FakeElasticsearch` server.
+    """
+    protocol_version = 'HTTP/1.1'  # Keep connections alive...
+    disable_nagle_algorithm = True  # ...and don't sit on small responses.
+    server: _Server
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        __logger__.debug(format, *args)
+
+    def _handle(self):
+        """
+        Handle a request.
+        """
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, body = self.server.fake.handle(
+            self.command, path=self.path, data=data
+        )
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
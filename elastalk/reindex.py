@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.reindex
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Copy documents from one index to another (changing them along the way).
+"""
+from collections import deque
+from dataclasses import asdict, dataclass
+import logging
+import os
+from pathlib import Path
+import time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Set,
+    Tuple
+)
+from .cache import invalidate
+from .connect import ElastalkConnection
+from .dump import DEFAULT_DOCTYPE, TYPE_FIELD
+from .search import ID_FIELD, _prefetch, _search_after_pages
+from .seed import _bulk
+from .serializers import Serializer
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
+
+#: the default sort used to page through the source index (Any sort will do,
+#: as long as it identifies each document uniquely.)
+DEFAULT_SORT: List[Any] = [{'_id': 'asc'}]
+
+#: the number of seconds between checkpoints
+_CHECKPOINT_INTERVAL = 5
+
+
+@dataclass
+class ReindexStats:
+    """
+    Summarize the outcome of a :py:func:`reindex`.
+    """
+    read: int = 0  #: the number of documents read from the source index
+    indexed: int = 0  #: the number of documents written to the target index
+    dropped: int = 0  #: the number of documents the transform dropped
+    failed: int = 0  #: the number of documents Elasticsearch didn't accept
+
+
+def reindex(
+        cnx: ElastalkConnection,
+        source: str,
+        target: str,
+        transform: Callable[[Dict], Dict or None] = None,
+        target_cnx: ElastalkConnection = None,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        sort: List[Any] = None,
+        rate: float = None,
+        checkpoint: str or Path = None
+) -> ReindexStats:
+    """
+    Copy the documents in one index to another.  Each document is
+    :py:meth:`unpacked <elastalk.connect.ElastalkConnection.unpack>` with the
+    source index's blobbing configuration, handed to the `transform` and
+    :py:meth:`packed <elastalk.connect.ElastalkConnection.pack>` with the
+    target index's blobbing configuration before it's written.  (So you can
+    use this to change the way an index is blobbed.)
+
+    The source index is read a page at a time with `search_after
+    <https://bit.ly/2Nyf6f4>`_ (the next page is requested while the current
+    one is being written) and the documents are written with the bulk API
+    (see the `bulk_*` settings in the target's :py:class:`configuration
+    <elastalk.config.ElastalkConf>`), so only a few pages are held in memory
+    at a time.
+
+    If you supply a `checkpoint`, the sort values of the last document
+    before which every document has been written are saved to it every few
+    seconds (and if the reindex fails).  If the checkpoint exists when you
+    start, the reindex resumes where it left off.  The checkpoint is removed
+    when the reindex finishes.
+
+    :param cnx: the connection (If the configuration routes reads from the
+        source index or writes to the target index to other clusters, their
+        :py:meth:`connections <elastalk.connect.ElastalkConnection.for_index>`
+        are used instead.)
+    :param source: the name of the source index
+    :param target: the name of the target index
+    :param transform: a function that changes each (unpacked) document (If it
+        returns `None`, the document isn't written.)
+    :param target_cnx: the connection to the cluster to which documents are
+        written (if it isn't the cluster that serves writes to the target
+        index)
+    :param query: the query (If you don't supply a query, all documents are
+        copied.)
+    :param size: the number of documents in a page
+    :param sort: the sort used to page through the source index (The default
+        is :py:data:`DEFAULT_SORT`.)
+    :param rate: the maximum number of documents read per second
+    :param checkpoint: the path to the checkpoint
+    :return: a summary of the outcome
+    :raises ValueError: if the checkpoint belongs to another reindex
+    """
+    _source = cnx.for_index(source)
+    _target = (
+        target_cnx if target_cnx is not None
+        else cnx.for_index(target, write=True)
+    )
+    _checkpoint = (
+        _Checkpoint.load(
+            Path(checkpoint),
+            source=source,
+            target=target,
+            serializer=_target.serializer
+        )
+        if checkpoint else None
+    )
+    stats = _checkpoint.stats if _checkpoint else ReindexStats()
+    watermark = _Watermark(_checkpoint.after if _checkpoint else None)
+
+    pages = _search_after_pages(
+        es=_source.client,
+        index=source,
+        query=query,
+        size=size,
+        sort=sort if sort else DEFAULT_SORT,
+        search_after=watermark.after
+    )
+    prefetched = _prefetch(pages)
+
+    def _documents() -> Iterator[Tuple[str, str, str, Dict]]:
+        """
+        Generate the documents that should be written to the target index.
+        """
+        hits = (hit for page in prefetched for hit in page)
+        for hit in _throttled(hits, rate=rate):
+            stats.read += 1
+            doc = _source.unpack(dict(hit['_source']), index=source)
+            if transform is not None:
+                doc = transform(doc)
+            # If the transform dropped the document...
+            if doc is None:
+                stats.dropped += 1
+                # ...there's nothing to wait for.
+                watermark.add(hit['_id'], hit.get('sort'), pending=False)
+                continue
+            watermark.add(hit['_id'], hit.get('sort'))
+            yield (
+                target,
+                hit.get(TYPE_FIELD) or DEFAULT_DOCTYPE,
+                hit['_id'],
+                _target.pack(doc=doc, index=target)
+            )
+
+    documents = _documents()
+    finished = False
+    try:
+        for _, _id, ok in _bulk(
+                clients=lambda _: _target.client,
+                documents=documents,
+                config=_target.config,
+                serializer=_target.serializer
+        ):
+            if ok:
+                stats.indexed += 1
+            else:
+                stats.failed += 1
+            watermark.done(_id)
+            # Save our progress (every so often) in case we crash.
+            if _checkpoint is not None:
+                _checkpoint.save(watermark.after, stats=stats)
+        finished = True
+    finally:
+        documents.close()
+        # Stop prefetching before we close the pages.
+        prefetched.close()
+        pages.close()
+        if _checkpoint is not None:
+            if finished:
+                _checkpoint.remove()
+            else:
+                _checkpoint.save(watermark.after, stats=stats, force=True)
+        # Cached search results for the target index are no good anymore.
+        invalidate(target)
+    return stats
+
+
+def _throttled(items: Iterable, rate: float or None) -> Iterator:
+    """
+    Generate items no faster than a given rate.
+
+    :param items: the items
+    :param rate: the maximum number of items per second (or `None` to go as
+        fast as we can)
+    :return: an iteration of the items
+    """
+    if not rate:
+        yield from items
+        return
+    started = time.monotonic()
+    for count, item in enumerate(items):
+        # If we're ahead of schedule...
+        ahead = started + count / rate - time.monotonic()
+        if ahead > 0:
+            time.sleep(ahead)  # ...wait for the schedule to catch up.
+        yield item
+
+
+class _Watermark:
+    """
+    Keep track of the sort values of the last document before which every
+    document has been written.  (Bulk requests come back in no particular
+    order, so that isn't necessarily the last document written.)
+    """
+    def __init__(self, after: List[Any] or None):
+        """
+
+        :param after: the sort values of the document after which we start
+        """
+        self.after: List[Any] or None = after  #: the sort values
+        self._next: int = 0  # the sequence number of the next document
+        self._low: int = 0  # the sequence number of the first unwritten one
+        self._sorts: Dict[int, List[Any]] = {}
+        self._pending: Dict[str, Deque[int]] = {}
+        self._done: Set[int] = set()
+
+    def add(self, id_: str, sort: List[Any], pending: bool = True):
+        """
+        Note the next document.
+
+        :param id_: the document ID
+        :param sort: the document's sort values
+        :param pending: `False` if there's no need to wait for the document
+        """
+        seq = self._next
+        self._next += 1
+        self._sorts[seq] = sort
+        if pending:
+            self._pending.setdefault(id_, deque()).append(seq)
+        else:
+            self._done.add(seq)
+            self._advance()
+
+    def done(self, id_: str):
+        """
+        Note that a document has been written (or has failed).
+
+        :param id_: the document ID
+        """
+        seqs = self._pending.get(id_)
+        if not seqs:
+            return
+        self._done.add(seqs.popleft())
+        if not seqs:
+            del self._pending[id_]
+        self._advance()
+
+    def _advance(self):
+        """
+        Move the watermark past the documents that are done.
+        """
+        while self._low in self._done:
+            self._done.remove(self._low)
+            self.after = self._sorts.pop(self._low)
+            self._low += 1
+
+
+class _Checkpoint:
+    """
+    Remember how far a reindex has come.
+    """
+    def __init__(
+            self,
+            path: Path,
+            source: str,
+            target: str,
+            serializer: Serializer,
+            after: List[Any] = None,
+            stats: ReindexStats = None
+    ):
+        """
+
+        :param path: the path to the checkpoint
+        :param source: the name of the source index
+        :param target: the name of the target index
+        :param serializer: the serializer used to read and write the
+            checkpoint
+        :param after: the sort values of the last document written
+        :param stats: the statistics so far
+        """
+        self.path: Path = path  #: the path to the checkpoint
+        self.source: str = source  #: the name of the source index
+        self.target: str = target  #: the name of the target index
+        self.serializer: Serializer = serializer
+        self.after: List[Any] or None = after  #: the sort values
+        self.stats: ReindexStats = stats if stats else ReindexStats()
+        self._saved: float = time.monotonic()
+
+    @classmethod
+    def load(
+            cls,
+            path: Path,
+            source: str,
+            target: str,
+            serializer: Serializer
+    ) -> '_Checkpoint':
+        """
+        Load a checkpoint (if there is one).
+
+        :param path: the path to the checkpoint
+        :param source: the name of the source index
+        :param target: the name of the target index
+        :param serializer: the serializer used to read and write the
+            checkpoint
+        :return: the checkpoint
+        :raises ValueError: if the checkpoint belongs to another reindex
+        """
+        if not path.exists():
+            return cls(path, source=source, target=target, serializer=serializer)
+        saved = serializer.loads(path.read_bytes())
+        if (saved.get('source'), saved.get('target')) != (source, target):
+            raise ValueError(
+                f"{path} is the checkpoint for reindexing '{saved.get('source')}' "
+                f"into '{saved.get('target')}'."
+            )
+        return cls(
+            path,
+            source=source,
+            target=target,
+            serializer=serializer,
+            after=saved.get('after'),
+            stats=ReindexStats(**saved.get('stats', {}))
+        )
+
+    def save(
+            self,
+            after: List[Any] or None,
+            stats: ReindexStats,
+            force: bool = False
+    ):
+        """
+        Save the checkpoint (if it's been a while since it was last saved).
+
+        :param after: the sort values of the last document written
+        :param stats: the statistics so far
+        :param force: `True` to save the checkpoint now
+        """
+        if not force and (
+                time.monotonic() - self._saved < _CHECKPOINT_INTERVAL
+        ):
+            return
+        self.after = after
+        data = self.serializer.dumps({
+            'source': self.source,
+            'target': self.target,
+            'after': after,
+            'stats': asdict(stats)
+        })
+        # Replace the checkpoint in one step, so a crash can't leave half of
+        # it behind.
+        tmp = self.path.with_name(f'{self.path.name}.tmp')
+        tmp.write_bytes(data)
+        os.replace(str(tmp), str(self.path))
+        self._saved = time.monotonic()
+
+    def remove(self):
+        """
+        Remove the checkpoint.
+        """
+        if self.path.exists():
+            self.path.unlink()
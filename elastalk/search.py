@@ -9,16 +9,98 @@
 This module contains functions you can use when dealing with
 `Elasticsearch documents <https://bit.ly/2YcMds5>`_ returned by searches.
 """
-from typing import Any, Iterable, Mapping, Tuple
+import collections.abc
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import logging
+from pathlib import Path
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Tuple
 import uuid
+from .connect import ElastalkConnection
+
+__logger__: logging.Logger = logging.getLogger(__name__)  #: the module logger
 
 ID_FIELD = '_id'  #: the standard name of the ID field
 
 
+class HitView(collections.abc.Mapping):
+    """
+    A read-only view of the document in a search result hit.  Values are
+    looked up in the hit when they're accessed, so nothing is copied (and
+    the document ID is only converted to a UUID if you ask for it).
+
+    .. seealso::
+
+        :py:func:`materialize`
+    """
+    __slots__ = ('_hit', '_source', '_includes', '_uuids', '_id')
+
+    def __init__(
+            self,
+            hit: Mapping[str, Any],
+            includes: Tuple[str] = (ID_FIELD,),
+            source: str = '_source',
+            uuids: bool = True
+    ):
+        """
+
+        :param hit: the search hit document
+        :param includes: the metadata keys to include in the document
+        :param source: the key that contains the source document
+        :param uuids: `True` to convert the document ID to a UUID
+        """
+        self._hit: Mapping[str, Any] = hit
+        self._source: Mapping[str, Any] = hit.get(source)
+        self._includes: Tuple[str] = includes
+        self._uuids: bool = uuids
+        self._id: uuid.UUID or None = None  #: the converted document ID
+
+    def __getitem__(self, key: str) -> Any:
+        # Values in the source document take precedence over metadata.
+        if key in self._source:
+            value = self._source[key]
+        elif key in self._includes:
+            value = self._hit.get(key)
+        else:
+            raise KeyError(key)
+        # If this is the document ID and we're converting IDs...
+        if key == ID_FIELD and self._uuids:
+            # ...convert it (once).
+            if self._id is None:
+                self._id = uuid.UUID(value)
+            return self._id
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._includes:
+            if key not in self._source:
+                yield key
+        yield from self._source
+
+    def __len__(self) -> int:
+        return len(self._source) + sum(
+            1 for key in self._includes if key not in self._source
+        )
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.materialize()!r})'
+
+    def materialize(self) -> Dict[str, Any]:
+        """
+        Copy the document into a new dictionary.
+
+        :return: the document
+        """
+        return dict(self.items())
+
+
 def extract_hit(
         hit: Mapping[str, Any],
         includes: Tuple[str] = (ID_FIELD,),
-        source: str = '_source'
+        source: str = '_source',
+        uuids: bool = True
 ) -> Mapping[str, Any]:
     """
     Extract a document from a single search result hit.
@@ -26,16 +108,13 @@ def extract_hit(
     :param hit: the search hit document
     :param includes: the metadata keys to include in the return document
     :param source: the key that contains the source document
-    :return:
-    """
-    doc = {
-        **{
-            k: hit.get(k) for k in includes
-        },
-        **hit.get(source)
-    }
-    # If the document ID is included...
-    if ID_FIELD in doc:
+    :param uuids: `True` to convert the document ID to a UUID
+    :return: the document
+    """
+    doc = {k: hit.get(k) for k in includes}
+    doc.update(hit.get(source))
+    # If the document ID is included (and we're converting IDs)...
+    if uuids and ID_FIELD in doc:
         # ...convert it to a UUID.
         doc[ID_FIELD] = uuid.UUID(doc.get(ID_FIELD))
     return doc
@@ -44,7 +123,9 @@ def extract_hit(
 def extract_hits(
         result: Mapping[str, Any],
         includes: Tuple[str] = (ID_FIELD,),
-        source: str = '_source'
+        source: str = '_source',
+        uuids: bool = True,
+        lazy: bool = False
 ) -> Iterable[Mapping[str, Any]]:
     """
     Extract documents from a search result.
@@ -52,8 +133,434 @@ def extract_hits(
     :param result: the search result document
     :param includes: the metadata keys to include in the return document
     :param source: the key that contains the source document
+    :param uuids: `True` to convert the document IDs to UUIDs
+    :param lazy: `True` to return :py:class:`HitView` objects rather than
+        copying each document into a new dictionary
     :return: an iteration of search result documents
     """
     hits = result.get('hits', {}).get('hits', [])
+    extract = HitView if lazy else extract_hit
     for hit in hits:
-        yield extract_hit(hit, includes=includes, source=source)
+        yield extract(hit, includes=includes, source=source, uuids=uuids)
+
+
+def iter_documents(
+        cnx: ElastalkConnection,
+        index: str,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        sort: List[Any] = None,
+        scroll: str = '5m',
+        slice_: Tuple[int, int] = None,
+        includes: Tuple[str] = (ID_FIELD,),
+        source: str = '_source',
+        unpack: bool = False,
+        uuids: bool = True,
+        search_after: List[Any] = None
+) -> Iterator[Mapping[str, Any]]:
+    """
+    Page through all the documents in an index that match a query.  The next
+    page is requested while the current one is being consumed, and no more
+    than two pages are held in memory at a time.
+
+    If you supply a `sort` the pages are retrieved with
+    `search_after <https://bit.ly/2Nyf6f4>`_ (so the sort should include a
+    field that uniquely identifies each document).  Otherwise the documents
+    are retrieved with a `scroll <https://bit.ly/2Ljb5Ce>`_ which is cleared
+    when the iteration finishes (or is closed early).
+
+    :param cnx: the connection (If the configuration routes reads from the
+        index to another cluster, that cluster's :py:meth:`connection
+        <elastalk.connect.ElastalkConnection.for_index>` is used instead.)
+    :param index: the name of the index
+    :param query: the query (If you don't supply a query, all documents are
+        returned.)
+    :param size: the number of documents in a page
+    :param sort: the search_after sort
+    :param scroll: how long Elasticsearch should keep the scroll context
+    :param slice_: the slice ID and the number of slices (for a
+        `sliced scroll <https://bit.ly/2Ljb5Ce>`_)
+    :param includes: the metadata keys to include in the return document
+        (Include `sort` to get the sort values of each hit.)
+    :param source: the key that contains the source document
+    :param unpack: `True` to :py:func:`unpack
+        <elastalk.connect.ElastalkConnection.unpack>` the documents
+    :param uuids: `True` to convert the document IDs to UUIDs
+    :param search_after: the sort values of the hit after which the first
+        page starts (if you supply a `sort`)
+    :return: an iteration of search result documents
+    """
+    # Read from the cluster that serves the index.
+    cnx = cnx.for_index(index)
+    pages = (
+        _search_after_pages(
+            es=cnx.client,
+            index=index,
+            query=query,
+            size=size,
+            sort=sort,
+            search_after=search_after
+        )
+        if sort
+        else _scroll_pages(
+            es=cnx.client,
+            index=index,
+            query=query,
+            size=size,
+            scroll=scroll,
+            slice_=slice_
+        )
+    )
+    prefetched = _prefetch(pages)
+    try:
+        for hits in prefetched:
+            for hit in hits:
+                doc = extract_hit(
+                    hit, includes=includes, source=source, uuids=uuids
+                )
+                yield cnx.unpack(doc, index=index) if unpack else doc
+    finally:
+        # Stop prefetching before we close the pages (which clears the
+        # scroll).
+        prefetched.close()
+        pages.close()
+
+
+def iter_sliced_documents(
+        cnx: ElastalkConnection,
+        index: str,
+        slices: int = None,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        scroll: str = '5m',
+        includes: Tuple[str] = (ID_FIELD,),
+        source: str = '_source',
+        unpack: bool = False,
+        uuids: bool = True,
+        queue_size: int = None
+) -> Iterator[Mapping[str, Any]]:
+    """
+    Page through all the documents in an index that match a query using a
+    `sliced scroll <https://bit.ly/2Ljb5Ce>`_.  Each slice is read on its own
+    thread and the documents from all the slices are merged (in no particular
+    order) into a single iteration.
+
+    :param cnx: the connection (If the configuration routes reads from the
+        index to another cluster, that cluster's :py:meth:`connection
+        <elastalk.connect.ElastalkConnection.for_index>` is used instead.)
+    :param index: the name of the index
+    :param slices: the number of slices (This is limited to the size of the
+        connection pool, which is also the default.)
+    :param query: the query (If you don't supply a query, all documents are
+        returned.)
+    :param size: the number of documents in a page
+    :param scroll: how long Elasticsearch should keep the scroll contexts
+    :param includes: the metadata keys to include in the return document
+    :param source: the key that contains the source document
+    :param unpack: `True` to :py:func:`unpack
+        <elastalk.connect.ElastalkConnection.unpack>` the documents
+    :param uuids: `True` to convert the document IDs to UUIDs
+    :param queue_size: the maximum number of documents waiting to be consumed
+        (The default is one page per slice.)
+    :return: an iteration of search result documents
+    """
+    # Read from the cluster that serves the index.
+    cnx = cnx.for_index(index)
+    _slices = _slice_count(cnx, slices)
+    merged: queue.Queue = queue.Queue(
+        maxsize=queue_size if queue_size else size * _slices
+    )
+    stop = threading.Event()  # This is set if the consumer goes away.
+    done = object()  # Each slice puts one of these at the end.
+
+    def _put(item):
+        # Wait for room in the queue (unless the consumer is gone).
+        while not stop.is_set():
+            try:
+                merged.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _consume(_: int, docs: Iterator[Mapping[str, Any]]):
+        try:
+            for doc in docs:
+                if not _put(doc):
+                    return
+        except Exception as ex:  # pylint: disable=broad-except
+            _put(ex)  # Let the consumer know what went wrong.
+        finally:
+            docs.close()
+            _put(done)
+
+    executor, _ = _run_slices(
+        cnx=cnx,
+        index=index,
+        slices=_slices,
+        consume=_consume,
+        query=query,
+        size=size,
+        scroll=scroll,
+        includes=includes,
+        source=source,
+        unpack=unpack,
+        uuids=uuids
+    )
+    try:
+        remaining = _slices
+        while remaining:
+            item = merged.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def export_slices(
+        cnx: ElastalkConnection,
+        index: str,
+        path: str or Path,
+        slices: int = None,
+        query: Mapping[str, Any] = None,
+        size: int = 1000,
+        scroll: str = '5m',
+        unpack: bool = False
+) -> Dict[Path, int]:
+    """
+    Export all the documents in an index that match a query using a
+    `sliced scroll <https://bit.ly/2Ljb5Ce>`_.  Each slice is read on its own
+    thread and written to its own
+    `newline-delimited JSON <http://ndjson.org/>`_ file
+    (`<index>.<slice>.ndjson`) in the target directory.
+
+    :param cnx: the connection (If the configuration routes reads from the
+        index to another cluster, that cluster's :py:meth:`connection
+        <elastalk.connect.ElastalkConnection.for_index>` is used instead.)
+    :param index: the name of the index
+    :param path: the directory in which the files are written
+    :param slices: the number of slices (This is limited to the size of the
+        connection pool, which is also the default.)
+    :param query: the query (If you don't supply a query, all documents are
+        exported.)
+    :param size: the number of documents in a page
+    :param scroll: how long Elasticsearch should keep the scroll contexts
+    :param unpack: `True` to :py:func:`unpack
+        <elastalk.connect.ElastalkConnection.unpack>` the documents
+    :return: the number of documents written to each file
+    """
+    # Read from the cluster that serves the index.
+    cnx = cnx.for_index(index)
+    _path = Path(path)
+    _path.mkdir(parents=True, exist_ok=True)
+    dumps = cnx.serializer.dumps
+    counts: Dict[Path, int] = {}
+
+    def _consume(slice_id: int, docs: Iterator[Mapping[str, Any]]):
+        file = _path / f'{index}.{slice_id}.ndjson'
+        count = 0
+        with open(file, 'wb') as out:
+            for doc in docs:
+                out.write(dumps(doc))
+                out.write(b'\n')
+                count += 1
+        counts[file] = count
+
+    executor, futures = _run_slices(
+        cnx=cnx,
+        index=index,
+        slices=_slice_count(cnx, slices),
+        consume=_consume,
+        query=query,
+        size=size,
+        scroll=scroll,
+        includes=(ID_FIELD,),
+        source='_source',
+        unpack=unpack,
+        # The IDs are written as strings anyway.
+        uuids=False
+    )
+    with executor:
+        # Wait for the slices (and raise the first error any of them ran into).
+        for future in futures:
+            future.result()
+    return counts
+
+
+def _slice_count(cnx: ElastalkConnection, slices: int or None) -> int:
+    """
+    Determine how many slices to use for a sliced scroll.
+
+    :param cnx: the connection
+    :param slices: the requested number of slices
+    :return: the number of slices
+    """
+    if not slices:
+        return max(1, cnx.config.maxsize)
+    if slices > cnx.config.maxsize:
+        __logger__.warning(
+            f"{slices} slices were requested but the connection pool only "
+            f"allows {cnx.config.maxsize} connections."
+        )
+        return max(1, cnx.config.maxsize)
+    return slices
+
+
+def _run_slices(
+        cnx: ElastalkConnection,
+        index: str,
+        slices: int,
+        consume: Callable[[int, Iterator[Mapping[str, Any]]], None],
+        **kwargs
+) -> Tuple[ThreadPoolExecutor, List[Future]]:
+    """
+    Start reading each slice of a sliced scroll on its own thread.
+
+    :param cnx: the connection
+    :param index: the name of the index
+    :param slices: the number of slices
+    :param consume: a function that consumes the documents in a slice
+    :param kwargs: additional arguments for :py:func:`iter_documents`
+    :return: the executor running the slices (Shut it down to wait for the
+        slices to finish.) and the futures for each slice
+    """
+    # Make sure the client exists before the threads go looking for it.
+    _ = cnx.client
+    executor = ThreadPoolExecutor(max_workers=slices)
+    futures = [
+        executor.submit(
+            consume,
+            slice_id,
+            iter_documents(
+                cnx,
+                index=index,
+                # A single slice is just a regular scroll.
+                slice_=(slice_id, slices) if slices > 1 else None,
+                **kwargs
+            )
+        )
+        for slice_id in range(slices)
+    ]
+    return executor, futures
+
+
+def _body(
+        query: Mapping[str, Any] or None,
+        size: int,
+        sort: List[Any]
+) -> Dict[str, Any]:
+    """
+    Create a search request body.
+
+    :param query: the query
+    :param size: the number of documents in a page
+    :param sort: the sort
+    :return: the request body
+    """
+    body = {'size': size, 'sort': sort}
+    if query:
+        body['query'] = query
+    return body
+
+
+def _scroll_pages(
+        es,
+        index: str,
+        query: Mapping[str, Any] or None,
+        size: int,
+        scroll: str,
+        slice_: Tuple[int, int] = None
+) -> Iterator[List[Mapping[str, Any]]]:
+    """
+    Retrieve pages of search hits with a scroll.
+
+    :param es: the Elasticsearch client
+    :param index: the name of the index
+    :param query: the query
+    :param size: the number of documents in a page
+    :param scroll: how long Elasticsearch should keep the scroll context
+    :param slice_: the slice ID and the number of slices
+    :return: an iteration of pages of search hits
+    """
+    body = _body(query=query, size=size, sort=['_doc'])
+    if slice_:
+        body['slice'] = {'id': slice_[0], 'max': slice_[1]}
+    resp = es.search(index=index, body=body, scroll=scroll)
+    scroll_id = resp.get('_scroll_id')
+    try:
+        while True:
+            hits = resp['hits']['hits']
+            if not hits:
+                break
+            yield hits
+            resp = es.scroll(scroll_id=scroll_id, scroll=scroll)
+            scroll_id = resp.get('_scroll_id', scroll_id)
+    finally:
+        # Don't leave the scroll context lying around on the server.
+        if scroll_id:
+            es.clear_scroll(body={'scroll_id': [scroll_id]}, ignore=(404,))
+
+
+def _search_after_pages(
+        es,
+        index: str,
+        query: Mapping[str, Any] or None,
+        size: int,
+        sort: List[Any],
+        search_after: List[Any] = None
+) -> Iterator[List[Mapping[str, Any]]]:
+    """
+    Retrieve pages of search hits with `search_after`.
+
+    :param es: the Elasticsearch client
+    :param index: the name of the index
+    :param query: the query
+    :param size: the number of documents in a page
+    :param sort: the sort
+    :param search_after: the sort values of the hit after which the first
+        page starts
+    :return: an iteration of pages of search hits
+    """
+    body = _body(query=query, size=size, sort=sort)
+    if search_after:
+        body['search_after'] = search_after
+    while True:
+        hits = es.search(index=index, body=body)['hits']['hits']
+        if not hits:
+            break
+        yield hits
+        if len(hits) < size:
+            break
+        # The next page starts after the last hit on this page.
+        body['search_after'] = hits[-1]['sort']
+
+
+def _prefetch(pages: Iterator[Any]) -> Iterator[Any]:
+    """
+    Iterate over pages, retrieving each page in the background while the
+    previous page is being consumed.
+
+    :param pages: the pages
+    :return: an iteration of pages
+    """
+    _next: Callable[[], Any] = partial(next, pages, None)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future: Future = executor.submit(_next)
+        while True:
+            page = future.result()
+            if page is None:
+                return
+            # Start fetching the next page before handing over this one.
+            future = executor.submit(_next)
+            try:
+                yield page
+            except GeneratorExit:
+                # Let the request that's in flight finish so the caller can
+                # clean up.
+                future.result()
+                raise
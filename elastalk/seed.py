@@ -8,28 +8,926 @@
 
 Prepare your Elasticsearch store with seed data!
 """
-import json
+from concurrent.futures import (
+    Executor,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait
+)
+from dataclasses import dataclass
+from functools import partial
+import gzip
+import hashlib
+import io
+from itertools import islice
 import logging
+import mmap
+import os
 from pathlib import Path
+import queue
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Set,
+    Tuple
+)
 import uuid
-from .connect import ElastalkConnection
-from .config import ElastalkConf
+import elasticsearch
+from .cache import invalidate
+from .connect import ConnectionRegistry, ElastalkConnection
+from .config import ElastalkConf, ElastalkConfigException
+from .serializers import Serializer, get_serializer
 
 _logger: logging.Logger = logging.Logger(__file__)  #: the module logger
 
 
+@dataclass
+class SeedStats:
+    """
+    Summarize the outcome of seeding a single index.
+    """
+    indexed: int = 0  #: the number of documents that were indexed
+    skipped: int = 0  #: the number of documents that were not sent
+    failed: int = 0  #: the number of documents Elasticsearch didn't accept
+    deleted: int = 0  #: the number of documents deleted (incremental seeding)
+
+
+#: a serialized bulk item (the index name, the document ID, the action line and
+#: the source line, which is `None` for deletions)
+_BulkItem = Tuple[str, str, bytes, bytes or None]
+
+#: the default name of the incremental seeding manifest
+_MANIFEST = '.seed-manifest.json'
+
+#: the number of seconds between incremental seeding checkpoints
+_CHECKPOINT_INTERVAL = 5
+
+#: the number of lines of an NDJSON seed file handed to a worker at once
+_LINES_PER_TASK = 100
+
+#: the suffixes of seed files that contain one document per line
+LINES_SUFFIXES: Tuple[str, ...] = (
+    '.ndjson',
+    '.jsonl',
+    '.ndjson.gz',
+    '.jsonl.gz',
+    '.ndjson.zst',
+    '.jsonl.zst'
+)
+
+#: the index settings applied while an index is loaded in "load mode"
+LOAD_MODE_SETTINGS: Dict[str, Any] = {
+    'index.refresh_interval': '-1',
+    'index.number_of_replicas': 0,
+    'index.translog.durability': 'async'
+}
+
+
+@dataclass
+class SeedTimings:
+    """
+    Break down where the time goes while seeding.  (The work is spread over
+    several threads or processes, so each figure is the total number of
+    seconds spent by all of them.)
+    """
+    scan: float = 0  #: seconds spent walking the seed data (and checking the manifest)
+    read: float = 0  #: seconds spent reading seed files
+    parse: float = 0  #: seconds spent parsing seed documents
+    pack: float = 0  #: seconds spent packing documents
+    network: float = 0  #: seconds spent waiting on Elasticsearch
+
+    def add(self, other: 'SeedTimings'):
+        """
+        Add another breakdown to this one.
+
+        :param other: the other breakdown
+        """
+        self.scan += other.scan
+        self.read += other.read
+        self.parse += other.parse
+        self.pack += other.pack
+        self.network += other.network
+
+
+class SeedProgress:
+    """
+    Report on the progress of a :py:func:`seed` run.
+    """
+    def __init__(self, stats: Dict[str, SeedStats]):
+        """
+
+        :param stats: the statistics (by index)
+        """
+        self.stats: Dict[str, SeedStats] = stats  #: the statistics (by index)
+        self.timings: SeedTimings = SeedTimings()  #: the timing breakdown
+        self.documents: int = 0  #: the number of documents that have been handled
+        self.bytes: int = 0  #: the number of bytes sent to Elasticsearch
+        self.queue_depth: int = 0  #: the number of loads waiting to be sent
+        self._started: float = time.perf_counter()
+        self._finished: float or None = None
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Get the number of seconds since seeding started.
+
+        :return: the number of seconds
+        """
+        return (
+            self._finished if self._finished is not None
+            else time.perf_counter()
+        ) - self._started
+
+    @property
+    def finished(self) -> bool:
+        """
+        Is seeding finished?
+
+        :return: `True` if seeding is finished
+        """
+        return self._finished is not None
+
+    def finish(self):
+        """
+        Note that seeding is finished (and stop the clock).
+        """
+        self._finished = time.perf_counter()
+
+    @property
+    def docs_per_second(self) -> float:
+        """
+        Get the number of documents handled per second.
+
+        :return: the number of documents per second
+        """
+        return self.documents / max(self.elapsed, 1e-9)
+
+    @property
+    def bytes_per_second(self) -> float:
+        """
+        Get the number of bytes sent per second.
+
+        :return: the number of bytes per second
+        """
+        return self.bytes / max(self.elapsed, 1e-9)
+
+    def eta(self, index: str, total: int) -> float or None:
+        """
+        Estimate the number of seconds until an index is seeded.
+
+        :param index: the name of the index
+        :param total: the number of documents expected in the index
+        :return: the estimated number of seconds (or `None` if there's no
+            telling yet)
+        """
+        stats = self.stats.get(index)
+        if stats is None:
+            return None
+        done = stats.indexed + stats.skipped + stats.failed + stats.deleted
+        rate = self.docs_per_second
+        if done >= total:
+            return 0.0
+        return (total - done) / rate if rate else None
+
+    def record(self, timings: SeedTimings = None, **seconds: float):
+        """
+        Add to the timing breakdown.
+
+        :param timings: a breakdown to add
+        :param seconds: the seconds to add (by the name of the
+            :py:class:`SeedTimings` field)
+        """
+        with self._lock:
+            if timings is not None:
+                self.timings.add(timings)
+            for name, value in seconds.items():
+                setattr(self.timings, name, getattr(self.timings, name) + value)
+
+
 def seed(root: str or Path,
          config: str or Path = 'config.toml',
-         force: bool = False):
+         force: bool = False,
+         incremental: bool = False,
+         manifest: str or Path = None,
+         dry_run: bool = False,
+         options: Mapping[str, Any] = None,
+         progress: Callable[[SeedProgress], None] = None,
+         interval: float = 1) -> Dict[str, SeedStats]:
     """
     Populate an Elasticsearch instance with seed data.
 
+    Documents are sent to Elasticsearch in batches using the
+    `bulk API <https://bit.ly/2M5ZuGx>`_.  The size of each batch, the number
+    of requests that may be in flight at once and the retry behavior for
+    rejected documents are controlled by the `bulk_*` settings in the
+    :py:class:`ElastalkConf <elastalk.config.ElastalkConf>`.  Seed files are
+    read, parsed and packed by a pool of workers (see the `seed_*` settings)
+    while earlier documents are being sent.  Each index is created with its
+    configured :ref:`mappings <seed_data_mappings>` and settings before any
+    documents are sent to it.  If the configuration routes
+    writes to an index to another :ref:`cluster <configuration_clusters>`,
+    the index is seeded there.
+
+    If :py:attr:`seed_load_mode <elastalk.config.ElastalkConf.seed_load_mode>`
+    is set, each index is switched into a "load mode" (see
+    :py:data:`LOAD_MODE_SETTINGS`) while it's seeded.  When seeding finishes
+    (or fails) the original settings are restored and the index is refreshed
+    (and, if :py:attr:`seed_forcemerge
+    <elastalk.config.ElastalkConf.seed_forcemerge>` is set, force-merged).
+
+    In :ref:`incremental <seed_data_incremental>` mode existing indexes
+    aren't skipped.  Instead, a manifest of the seed files that have been
+    indexed is kept so that only new and changed files are sent, and the
+    documents of files that have disappeared are deleted.
+
+    A dry run reads, parses, packs and serializes the documents, but doesn't
+    talk to Elasticsearch at all.  (Every index is treated as though it
+    doesn't exist yet, the documents are counted as skipped and the manifest
+    isn't updated.)
+
     :param root: the root directory that contains the seed data
     :param config: the path to the configuration
     :param force: delete existing indexes and replace them with seed data
+    :param incremental: only send new and changed seed files (and delete the
+        documents of seed files that have been removed)
+    :param manifest: the path to the incremental seeding manifest (The
+        default is `.seed-manifest.json` in the root directory.)
+    :param dry_run: `True` to do everything but send the documents
+    :param options: configuration options that override the ones in the
+        configuration file (like `bulk_threads` or `seed_workers`)
+    :param progress: a function that is called with the :py:class:`progress
+        <SeedProgress>` every so often (and once more when seeding finishes)
+    :param interval: the minimum number of seconds between progress reports
+    :return: a summary of the outcome for each index
     :raises FileNotFoundError: if the path does not exist
     :raises NotADirectoryError: if the path is not a directory
     """
+    # Figure out where the indexes are and how they're configured.
+    _indexes, registry = _prepare(root=root, config=config)
+    etconf = registry.config
+    if options:
+        etconf.from_dict(options)
+    # Get the Elastalk connection to the default cluster.
+    etconn = registry.get()
+
+    def _client(index: str) -> elasticsearch.Elasticsearch:
+        """
+        Get the client for the cluster that serves writes to an index.
+        """
+        return etconn.for_index(index, write=True).client
+
+    # We'll keep track of what happens to each index (and how long it
+    # takes)...
+    stats: Dict[str, SeedStats] = {}
+    _progress = SeedProgress(stats)
+    # ...and the original settings of the indexes in load mode.
+    loading: Dict[str, Dict[str, Any]] = {}
+    # In incremental mode, we'll also keep track of the files we've seen.
+    _manifest: _Manifest or None = (
+        _Manifest.load(
+            Path(manifest) if manifest else Path(root) / _MANIFEST,
+            serializer=etconn.serializer
+        )
+        if incremental else None
+    )
+
+    def _prepare_index(_index: str) -> bool:
+        """
+        Get an index ready for seeding.  (Indexes that are created, and
+        existing indexes that are brought up to date in incremental mode, are
+        switched into load mode if the configuration says so.)
+
+        :return: `True` if the index was created (or `False` if it exists)
+        """
+        # If this is just a dry run, we'll pretend the index is new.
+        if dry_run:
+            return True
+        started = time.perf_counter()
+        try:
+            es = _client(_index)
+            # If we've been instructed to *force* the seed data into the
+            # database...
+            if force:  # ...drop the index.
+                es.indices.delete(index=_index, ignore=[400, 404])
+            created = force or not es.indices.exists(index=_index)
+            if created:
+                # Create the index (with its mappings and settings) before we
+                # send any documents, so Elasticsearch doesn't have to guess.
+                es.indices.create(
+                    index=_index, body=etconf.index_body(_index, root=_indexes)
+                )
+            # Existing indexes are left alone (unless we're seeding
+            # incrementally).
+            elif _manifest is None:
+                return False
+            if etconf.seed_load_mode:
+                loading[_index] = _originals(
+                    es.indices.get_settings(index=_index, flat_settings=True),
+                    index=_index
+                )
+                es.indices.put_settings(index=_index, body=_LOAD_MODE_BODY)
+            return created
+        finally:
+            _progress.record(network=time.perf_counter() - started)
+
+    def _files(idxdirs: List[Path]) -> Iterator[Tuple[str, str, Path]]:
+        """
+        Generate the index, document type and path of each seed file that
+        should be sent to Elasticsearch.
+        """
+        for idxdir in idxdirs:
+            # In incremental mode, we'll bring the index up to date.
+            yield from _scanned(
+                _manifest.changes(
+                    idxdir, root=_indexes, stats=stats[idxdir.stem]
+                )
+                if _manifest is not None else _seed_files(idxdir),
+                progress=_progress
+            )
+
+    loaded: Iterator[Tuple] or None = None
+    documents: Iterator[Tuple] or None = None
+    reported = time.perf_counter()
+    try:
+        # Get the indexes ready before we start reading the files (so the
+        # workers only have to read them).
+        idxdirs: List[Path] = []
+        for idxdir in _scanned(_index_dirs(_indexes), progress=_progress):
+            # The name of the index directory is the name of the
+            # Elasticsearch index.
+            _index: str = idxdir.stem
+            stats[_index] = SeedStats()
+            if _prepare_index(_index):
+                # If we're keeping track of what's in the index, we know it's
+                # empty (unless this is a dry run).
+                if _manifest is not None and not dry_run:
+                    _manifest.forget(_index)
+            # Existing indexes are skipped (unless we're seeding
+            # incrementally).
+            elif _manifest is None:
+                _logger.warning(
+                    f"Index '{_index}' already exists. Skipping."
+                )
+                stats[_index].skipped = _document_count(idxdir)
+                continue
+            idxdirs.append(idxdir)
+
+        # Read, parse and pack the files on a pool of workers while the
+        # documents they produce are sent to Elasticsearch.
+        loaded = _pipeline(
+            files=_files(idxdirs),
+            packer=ElastalkConnection(etconf),
+            workers=etconf.seed_workers,
+            queue_size=etconf.seed_queue_size,
+            processes=etconf.seed_processes,
+            digest=_manifest is not None,
+            progress=_progress
+        )
+        # In incremental mode, files that haven't really changed are dropped
+        # and the documents of files that have disappeared are deleted.
+        documents = (
+            _manifest.documents(loaded, stats=stats)
+            if _manifest is not None else loaded
+        )
+
+        # Send everything to Elasticsearch and tally up the results.
+        for _index, _id, ok in _bulk(
+                clients=_client,
+                documents=documents,
+                config=etconf,
+                serializer=etconn.serializer,
+                dry_run=dry_run,
+                progress=_progress
+        ):
+            _progress.documents += 1
+            deleted = (
+                _manifest.confirm(_index, _id, ok=ok)
+                if _manifest is not None and not dry_run else False
+            )
+            if dry_run:
+                stats[_index].skipped += 1
+            elif not ok:
+                stats[_index].failed += 1
+            elif deleted:
+                stats[_index].deleted += 1
+            else:
+                stats[_index].indexed += 1
+            # Save our progress (every so often) in case we crash.
+            if _manifest is not None and not dry_run:
+                _manifest.checkpoint()
+            # Let somebody know how we're doing (every so often).
+            if progress is not None and (
+                    time.perf_counter() - reported >= interval
+            ):
+                progress(_progress)
+                reported = time.perf_counter()
+    finally:
+        # Make sure nobody is reading files anymore...
+        if documents is not None:
+            documents.close()
+        if loaded is not None:
+            loaded.close()
+        # ...then take the indexes out of load mode.
+        for _index, originals in loading.items():
+            _restore(
+                _client(_index),
+                index=_index,
+                originals=originals,
+                forcemerge=etconf.seed_forcemerge
+            )
+        # Remember what made it into the indexes.
+        if _manifest is not None and not dry_run:
+            _manifest.save()
+        # Cached search results for the indexes we've written are no good
+        # anymore.
+        if not dry_run:
+            for _index in stats:
+                invalidate(_index)
+        registry.close()
+    _progress.finish()
+    if progress is not None:
+        progress(_progress)
+    return stats
+
+
+def _scanned(items: Iterable, progress: SeedProgress) -> Iterator:
+    """
+    Generate items while recording the time it takes to produce them as
+    scanning time.
+
+    :param items: the items
+    :param progress: the progress on which the time is recorded
+    :return: an iteration of the items
+    """
+    items = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            progress.record(scan=time.perf_counter() - started)
+        yield item
+
+
+@dataclass
+class _PendingFile:
+    """
+    Keep track of a seed file whose documents are being indexed (or deleted).
+    """
+    entry: Dict[str, Any] or None  #: the new manifest entry (`None` if it's gone)
+    outstanding: int = 0  #: the number of bulk items that haven't come back
+    loaded: bool = False  #: Have all the file's documents been loaded?
+    ok: bool = True  #: Has every bulk item succeeded?
+
+
+def _entry_ids(entry: Mapping[str, Any]) -> List[str]:
+    """
+    Get the IDs of the documents in a manifest entry.
+
+    :param entry: the manifest entry
+    :return: the document IDs
+    """
+    # Entries written before seed files could hold many documents have a
+    # single ID.
+    return entry['ids'] if 'ids' in entry else [entry['id']]
+
+
+class _Manifest:
+    """
+    Keep track of the seed files that have been indexed (for incremental
+    seeding).  The manifest is a JSON document that records the index,
+    document type, document IDs, size, modification time and SHA-256 digest
+    of each seed file (by its path relative to the indexes directory).
+    Progress is appended to a journal between checkpoints, so an interrupted
+    run can pick up where it left off.
+    """
+    def __init__(
+            self,
+            path: Path,
+            files: Dict[str, Dict[str, Any]],
+            serializer: Serializer
+    ):
+        """
+
+        :param path: the path to the manifest
+        :param files: the manifest entries (by relative path)
+        :param serializer: the serializer used to read and write the manifest
+        """
+        self.path: Path = path  #: the path to the manifest
+        self.files: Dict[str, Dict[str, Any]] = files  #: the manifest entries
+        self.serializer: Serializer = serializer
+        # These are the files that are being indexed (or deleted)...
+        self._pending: Dict[str, _PendingFile] = {}
+        self._rels: Dict[Path, str] = {}
+        # ...and the files to which the bulk items belong (by index and ID).
+        self._items: Dict[Tuple[str, str], List[Tuple[str, bool]]] = {}
+        # These are the indexes (and files) we've looked at.
+        self._indexes: Set[str] = set()
+        self._seen: Set[str] = set()
+        # These are the changes since the last checkpoint.
+        self._journal: List[bytes] = []
+        self._checkpoint: float = time.monotonic()
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def journal_path(self) -> Path:
+        """
+        Get the path to the journal of changes since the manifest was saved.
+
+        :return: the path to the journal
+        """
+        return self.path.with_name(f'{self.path.name}.journal')
+
+    @classmethod
+    def load(cls, path: Path, serializer: Serializer) -> '_Manifest':
+        """
+        Load a manifest (and replay its journal).
+
+        :param path: the path to the manifest
+        :param serializer: the serializer used to read and write the manifest
+        :return: the manifest
+        """
+        files: Dict[str, Dict[str, Any]] = (
+            serializer.loads(path.read_bytes()).get('files', {})
+            if path.exists() else {}
+        )
+        manifest = cls(path, files=files, serializer=serializer)
+        # If the last run didn't finish, there may be a journal to replay.
+        if manifest.journal_path.exists():
+            for line in manifest.journal_path.read_bytes().splitlines():
+                try:
+                    rel, entry = serializer.loads(line)
+                except ValueError:
+                    break  # The last line may not have been finished.
+                if entry is None:
+                    files.pop(rel, None)
+                else:
+                    files[rel] = entry
+        return manifest
+
+    def forget(self, index: str):
+        """
+        Forget the files in an index.  (Call this when the index is created.)
+
+        :param index: the name of the index
+        """
+        with self._lock:
+            self.files = {
+                rel: entry for rel, entry in self.files.items()
+                if entry['index'] != index
+            }
+
+    def changes(
+            self,
+            idxdir: Path,
+            root: Path,
+            stats: SeedStats
+    ) -> Iterator[Tuple[str, str, Path]]:
+        """
+        Generate the seed files in an index directory that are new (or whose
+        size or modification time has changed).
+
+        :param idxdir: the index directory
+        :param root: the directory that contains the indexes
+        :param stats: the statistics for the index (Unchanged files are
+            counted as skipped.)
+        :return: an iteration of index names, document types and paths
+        """
+        self._indexes.add(idxdir.stem)
+        for index, doctype, path in _seed_files(idxdir):
+            rel = path.relative_to(root).as_posix()
+            self._seen.add(rel)
+            stat = path.stat()
+            entry = self.files.get(rel)
+            # If the size and modification time haven't changed...
+            if (
+                    entry is not None
+                    and entry['size'] == stat.st_size
+                    and entry['mtime'] == stat.st_mtime_ns
+            ):
+                # ...we'll assume the file hasn't either.
+                stats.skipped += len(_entry_ids(entry))
+                continue
+            with self._lock:
+                self._rels[path] = rel
+                self._pending[rel] = _PendingFile(
+                    entry={
+                        'index': index,
+                        'doctype': doctype,
+                        'ids': [],
+                        'size': stat.st_size,
+                        'mtime': stat.st_mtime_ns,
+                        'hash': None
+                    }
+                )
+            yield index, doctype, path
+
+    def documents(
+            self,
+            documents: Iterable[Tuple[str, str, str, Dict, Tuple[Path, str]]],
+            stats: Dict[str, SeedStats]
+    ) -> Iterator[Tuple[str, str, str, Dict or None]]:
+        """
+        Drop the loaded documents whose contents haven't really changed, then
+        generate deletions for the documents that are no longer in the seed
+        files (and for the files that have disappeared).
+
+        :param documents: an iteration of index names, document types,
+            document IDs, document bodies and the path and digest of the
+            file each document came from (The digest is `None` for files
+            that contain many documents.)
+        :param stats: the statistics (by index)
+        :return: an iteration of index names, document types, document IDs
+            and document bodies (`None` for deletions)
+        """
+        current: str or None = None
+        for index, doctype, id_, body, (path, digest) in documents:
+            with self._lock:
+                rel = self._rels[path]
+                # If we've moved on to the next file, the last one is loaded.
+                stale = (
+                    self._loaded(current)
+                    if current is not None and rel != current else []
+                )
+                current = rel
+                pending = self._pending[rel]
+                pending.entry['hash'] = digest
+                previous = self.files.get(rel)
+                # If a single-document file was only touched...
+                touched = (
+                    digest is not None
+                    and previous is not None
+                    and previous.get('hash') == digest
+                )
+                if touched:
+                    # ...we just need to remember its new modification time.
+                    del self._pending[rel]
+                    current = None
+                    self._record(rel, dict(pending.entry, ids=[id_]))
+                    stats[index].skipped += 1
+                else:
+                    # Documents without IDs get IDs that depend on where they
+                    # are (so we can find them again).
+                    if id_ is None:
+                        id_ = str(uuid.uuid5(
+                            uuid.NAMESPACE_URL,
+                            f'{rel}#{len(pending.entry["ids"])}'
+                        ))
+                    pending.entry['ids'].append(id_)
+                    self._expect(index, id_, rel=rel, delete=False)
+            yield from stale
+            if not touched:
+                yield index, doctype, id_, body
+        with self._lock:
+            # Files that changed but didn't produce any documents are loaded,
+            # too.
+            stale = [
+                deletion
+                for rel in [
+                    rel for rel, pending in self._pending.items()
+                    if not pending.loaded
+                ]
+                for deletion in self._loaded(rel)
+            ]
+        yield from stale
+        # Now that we've seen every file, the ones we didn't see are gone.
+        with self._lock:
+            gone = [
+                (rel, entry) for rel, entry in self.files.items()
+                if entry['index'] in self._indexes and rel not in self._seen
+            ]
+            for rel, entry in gone:
+                self._pending[rel] = _PendingFile(entry=None, loaded=True)
+                for id_ in _entry_ids(entry):
+                    self._expect(entry['index'], id_, rel=rel, delete=True)
+        for _, entry in gone:
+            for id_ in _entry_ids(entry):
+                yield entry['index'], entry['doctype'], id_, None
+
+    def _loaded(self, rel: str) -> List[Tuple[str, str, str, None]]:
+        """
+        Note that all the documents in a changed file have been loaded and
+        list deletions for the documents that are no longer in it.
+
+        :param rel: the relative path to the seed file
+        :return: the index names, document types, document IDs and `None`
+            (for deletions) of the stale documents
+        """
+        pending = self._pending[rel]
+        entry = pending.entry
+        previous = self.files.get(rel)
+        stale = (
+            sorted(set(_entry_ids(previous)) - set(entry['ids']))
+            if previous is not None else []
+        )
+        for id_ in stale:
+            self._expect(entry['index'], id_, rel=rel, delete=True)
+        pending.loaded = True
+        self._settle(rel)
+        return [(entry['index'], entry['doctype'], id_, None) for id_ in stale]
+
+    def _expect(self, index: str, id_: str, rel: str, delete: bool):
+        """
+        Note that a bulk item belongs to a seed file.
+
+        :param index: the name of the index
+        :param id_: the document ID
+        :param rel: the relative path to the seed file
+        :param delete: `True` if the item is a deletion
+        """
+        self._items.setdefault((index, id_), []).append((rel, delete))
+        self._pending[rel].outstanding += 1
+
+    def _settle(self, rel: str):
+        """
+        Record a pending file once all of its bulk items have come back.
+
+        :param rel: the relative path to the seed file
+        """
+        pending = self._pending[rel]
+        if not pending.loaded or pending.outstanding:
+            return
+        del self._pending[rel]
+        # If anything went wrong, we'll try the whole file again next time.
+        if pending.ok:
+            self._record(rel, pending.entry)
+
+    def confirm(self, index: str, id_: str, ok: bool) -> bool:
+        """
+        Record the outcome of a bulk item.
+
+        :param index: the name of the index
+        :param id_: the document ID
+        :param ok: `True` if the item succeeded
+        :return: `True` if the item was a deletion
+        """
+        key = (index, id_)
+        with self._lock:
+            items = self._items.get(key)
+            if not items:
+                return False
+            rel, delete = items.pop(0)
+            if not items:
+                del self._items[key]
+            pending = self._pending[rel]
+            pending.outstanding -= 1
+            pending.ok = pending.ok and ok
+            self._settle(rel)
+            return delete
+
+    def _record(self, rel: str, entry: Dict[str, Any] or None):
+        """
+        Record a change to the manifest (and add it to the journal).
+
+        :param rel: the relative path to the seed file
+        :param entry: the manifest entry (or `None` if the file is gone)
+        """
+        if entry is None:
+            self.files.pop(rel, None)
+        else:
+            self.files[rel] = entry
+        self._journal.append(self.serializer.dumps([rel, entry]))
+
+    def checkpoint(self, force: bool = False):
+        """
+        Append the changes since the last checkpoint to the journal (if it's
+        been a while since the last checkpoint).
+
+        :param force: `True` to write the checkpoint now
+        """
+        if not force and (
+                time.monotonic() - self._checkpoint < _CHECKPOINT_INTERVAL
+        ):
+            return
+        with self._lock:
+            journal, self._journal = self._journal, []
+            self._checkpoint = time.monotonic()
+        if journal:
+            with open(self.journal_path, 'ab') as out:
+                out.write(b''.join(line + b'\n' for line in journal))
+
+    def save(self):
+        """
+        Save the manifest (and discard the journal).
+        """
+        with self._lock:
+            data = self.serializer.dumps({'version': 1, 'files': self.files})
+            self._journal = []
+        # Replace the manifest in one step, so a crash can't leave half of it
+        # behind.
+        tmp = self.path.with_name(f'{self.path.name}.tmp')
+        tmp.write_bytes(data)
+        os.replace(str(tmp), str(self.path))
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+
+def _originals(resp: Mapping[str, Any], index: str) -> Dict[str, Any]:
+    """
+    Pick the settings that load mode changes out of a (flat) index settings
+    response.
+
+    :param resp: the response to a request for the index settings
+    :param index: the name of the index
+    :return: the original values (`None` means the setting wasn't set)
+    """
+    settings = resp.get(index, {}).get('settings', {})
+    return {key: settings.get(key) for key in LOAD_MODE_SETTINGS}
+
+
+def _unflatten(settings: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Remove the `index.` prefix from flat index settings.
+
+    :param settings: the flat index settings
+    :return: the settings (relative to the `index` object)
+    """
+    return {
+        key[len('index.'):] if key.startswith('index.') else key: value
+        for key, value in settings.items()
+    }
+
+
+#: the body of the request that switches an index into load mode
+_LOAD_MODE_BODY: Dict[str, Any] = {'index': _unflatten(LOAD_MODE_SETTINGS)}
+
+
+def _restore_requests(
+        index: str,
+        originals: Mapping[str, Any],
+        forcemerge: int or None
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Get the requests that take an index out of load mode: restore its
+    original settings, refresh it and (optionally) force-merge it.
+
+    :param index: the name of the index
+    :param originals: the original index settings
+    :param forcemerge: the number of segments to force-merge the index into
+        (or `None`)
+    :return: the name of each (`indices`) client method and its arguments
+    """
+    requests = [
+        ('put_settings', {'index': index, 'body': {'index': _unflatten(originals)}}),
+        ('refresh', {'index': index})
+    ]
+    if forcemerge:
+        requests.append(
+            ('forcemerge', {'index': index, 'max_num_segments': forcemerge})
+        )
+    return requests
+
+
+def _restore(
+        es: elasticsearch.Elasticsearch,
+        index: str,
+        originals: Mapping[str, Any],
+        forcemerge: int or None
+):
+    """
+    Take an index out of load mode (see :py:func:`_restore_requests`).
+    Failures are logged (so the other indexes still get their turn).
+
+    :param es: the Elasticsearch client
+    :param index: the name of the index
+    :param originals: the original index settings
+    :param forcemerge: the number of segments to force-merge the index into
+        (or `None`)
+    """
+    try:
+        for method, kwargs in _restore_requests(index, originals, forcemerge):
+            getattr(es.indices, method)(**kwargs)
+    except Exception as ex:  # pylint: disable=broad-except
+        _logger.error(
+            f"The settings for index '{index}' could not be restored: {ex}"
+        )
+
+
+def _prepare(
+        root: str or Path,
+        config: str or Path
+) -> Tuple[Path, ConnectionRegistry]:
+    """
+    Locate the seed indexes and load the seed configuration.
+
+    :param root: the root directory that contains the seed data
+    :param config: the path to the configuration
+    :return: the directory that contains the indexes and a registry of the
+        configured clusters
+    :raises FileNotFoundError: if the path does not exist
+    """
     # Determine the root path.
     _root: Path = Path(root).resolve() if isinstance(root, str) else root
 
@@ -47,46 +945,647 @@ def seed(root: str or Path,
     if not _config.is_file():
         raise FileNotFoundError(f"{_config} is a directory.")
 
-    # Create the Elastalk configuration from the config file.
-    etconf = ElastalkConf().from_toml(toml_=_config)
-    # Create the Elastalk connection.
-    etconn = ElastalkConnection(etconf)
-    # Retrieve the client.
-    es = etconn.client
-
-    for idxdir in [d for d in _root.iterdir() if d.is_dir()]:
-        # The name of the index directory is the name of the Elasticsearch
-        # index.
-        _index: str = idxdir.stem
-        # If we've been instructed to *force* the seed data into the database...
-        if force:  # ...drop the index.
-            es.indices.delete(index=_index, ignore=[400, 404])
-        elif es.indices.exists(index=_index):
-            _logger.warning(
-                f"Index '{_index}' already exists. Skipping."
+    # Find the indexes.
+    _indexes: Path = _indexes_dir(_root)
+    # Create the Elastalk configuration (for each cluster) from the config
+    # file.
+    return _indexes, ConnectionRegistry.from_toml(toml_=_config)
+
+
+def _indexes_dir(root: Path) -> Path:
+    """
+    Get the directory that contains the indexes.
+
+    :param root: the root directory that contains the seed data
+    :return: the directory that contains the indexes
+    """
+    # The indexes are defined in the 'indexes' directory beneath the root.
+    # (If there isn't one, we'll assume the root contains the indexes.)
+    return root / 'indexes' if (root / 'indexes').is_dir() else root
+
+
+def _subdirs(path: Path) -> Iterator[Path]:
+    """
+    Generate the subdirectories of a directory.  (The directory is scanned
+    lazily, and the type of each entry comes from the scan, so we don't need
+    to `stat` every one.)
+
+    :param path: the directory
+    :return: an iteration of subdirectories
+    """
+    with os.scandir(str(path)) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield Path(entry.path)
+
+
+def _index_dirs(indexes: Path) -> Iterator[Path]:
+    """
+    Generate the index directories.
+
+    :param indexes: the directory that contains the indexes
+    :return: an iteration of index directories
+    """
+    return _subdirs(indexes)
+
+
+def _seed_files(idxdir: Path) -> Iterator[Tuple[str, str, Path]]:
+    """
+    Generate the index, document type and path of each seed file in an index
+    directory.
+
+    :param idxdir: the index directory
+    :return: an iteration of index names, document types and paths
+    """
+    # The name of the index directory is the name of the Elasticsearch index.
+    _index: str = idxdir.stem
+    # Each directory within the index directory indicates a "document type"
+    # and contains files that will be converted to Elasticsearch documents.
+    for docdir in _subdirs(idxdir):
+        # The name of the document directory is the name of the Elasticsearch
+        # document type.
+        _doctype: str = docdir.stem
+        # Now let's look at the files...
+        with os.scandir(str(docdir)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield _index, _doctype, Path(entry.path)
+
+
+def iter_seed_files(
+        root: str or Path
+) -> Iterator[Tuple[str, str, Path]]:
+    """
+    Walk a :ref:`seed data <seed_data>` directory (lazily) and generate the
+    index name, document type and path of each seed file.  (A
+    :ref:`NDJSON <seed_data_ndjson>` seed file contains many documents.)
+
+    :param root: the root directory that contains the seed data
+    :return: an iteration of index names, document types and paths
+    :raises FileNotFoundError: if the path does not exist
+    :raises NotADirectoryError: if the path is not a directory
+    """
+    for idxdir in _index_dirs(_indexes_dir(Path(root))):
+        yield from _seed_files(idxdir)
+
+
+def _doc_id(path: Path) -> str:
+    """
+    Get the ID of the document in a seed file.
+
+    :param path: the path to the seed file
+    :return: the document ID
+    """
+    # What do we thing the document ID should be?
+    _id = path.name
+    # If it is convertible to a UUID, it's a UUID...
+    try:
+        return str(uuid.UUID(_id))
+    except ValueError:  # pragma: no cover
+        return _id  # ...but maybe not.  That's all right.
+
+
+def _is_lines(path: Path) -> bool:
+    """
+    Does a seed file contain many documents (one per line)?
+
+    :param path: the path to the seed file
+    :return: `True` if the file is a (possibly compressed) NDJSON file
+    """
+    return path.name.lower().endswith(LINES_SUFFIXES)
+
+
+def _lines(path: Path) -> Iterator[bytes]:
+    """
+    Stream the (non-blank) lines of an NDJSON seed file.  Uncompressed files
+    are memory-mapped, and compressed files are decompressed as they're read.
+
+    :param path: the path to the seed file
+    :return: an iteration of lines
+    """
+    name = path.name.lower()
+    if name.endswith('.gz'):
+        with gzip.open(str(path), 'rb') as gz:
+            lines = (line.strip() for line in gz)
+            yield from (line for line in lines if line)
+        return
+    if name.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ElastalkConfigException(
+                "The 'zstandard' package is required to read .zst seed files."
             )
-            continue
-        # Each directory within the index directory indicates a "document type"
-        # and contains files that will be converted to Elasticsearch documents.
-        for docdir in [d for d in idxdir.iterdir() if d.is_dir()]:
-            # The name of the document directory is the name of the
-            # Elasticsearch document type.
-            _doctype: str = docdir.stem
-            # Now let's look at the files...
-            for docfile in [f for f in docdir.iterdir() if f.is_file()]:
-                # What do we thing the document ID should be?
-                _id = docfile.name
-                # If it is convertible to a UUID, it's a UUID...
-                try:
-                    _id = uuid.UUID(_id)
-                except ValueError:  # pragma: no cover
-                    pass  # ...but maybe not.  That's all right.
-                # Prepare a document to index in Elasticsearch.
-                doc = json.loads(docfile.read_text())
-                # Index the document.
-                es.index(
-                    index=_index,
-                    doc_type=_doctype,
-                    id=_id,
-                    body=etconn.pack(doc=doc, index=_index)
+        with open(str(path), 'rb') as raw:
+            reader = io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(raw)
+            )
+            lines = (line.strip() for line in reader)
+            yield from (line for line in lines if line)
+        return
+    with open(str(path), 'rb') as file:
+        # An empty file can't be mapped (and doesn't have anything in it
+        # anyway).
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            lines = (line.strip() for line in iter(mapped.readline, b''))
+            yield from (line for line in lines if line)
+
+
+def _document_count(idxdir: Path) -> int:
+    """
+    Count the documents in an index's seed files.  (Each line of an NDJSON
+    seed file is a document.)
+
+    :param idxdir: the index directory
+    :return: the number of documents
+    """
+    return sum(
+        sum(1 for _ in _lines(path)) if _is_lines(path) else 1
+        for _, _, path in _seed_files(idxdir)
+    )
+
+
+def _load(
+        index: str,
+        doctype: str,
+        path: Path,
+        packer: ElastalkConnection,
+        digest: bool = False,
+        timings: SeedTimings = None
+) -> Tuple:
+    """
+    Read, parse and pack a single seed file.
+
+    :param index: the name of the index
+    :param doctype: the document type
+    :param path: the path to the seed file
+    :param packer: the connection used to pack the document
+    :param digest: `True` to include the path and the SHA-256 digest of the
+        file's contents
+    :param timings: a breakdown to which the time spent is added
+    :return: the index name, document type, document ID and document body
+        (and the path and digest, if they were requested)
+    """
+    timings = timings if timings is not None else SeedTimings()
+    started = time.perf_counter()
+    data = path.read_bytes()
+    read = time.perf_counter()
+    # Prepare a document to index in Elasticsearch.
+    doc = packer.serializer.loads(data)
+    parsed = time.perf_counter()
+    loaded = index, doctype, _doc_id(path), packer.pack(doc=doc, index=index)
+    timings.read += read - started
+    timings.parse += parsed - read
+    timings.pack += time.perf_counter() - parsed
+    return (
+        loaded + ((path, hashlib.sha256(data).hexdigest()),) if digest
+        else loaded
+    )
+
+
+def _load_lines(
+        index: str,
+        doctype: str,
+        path: Path,
+        lines: List[bytes],
+        packer: ElastalkConnection,
+        digest: bool = False,
+        timings: SeedTimings = None
+) -> List[Tuple]:
+    """
+    Parse and pack a batch of lines from an NDJSON seed file.
+
+    :param index: the name of the index
+    :param doctype: the document type
+    :param path: the path to the seed file
+    :param lines: the lines
+    :param packer: the connection used to pack the documents
+    :param digest: `True` to include the path (The digest is always `None`.)
+    :param timings: a breakdown to which the time spent is added
+    :return: the index name, document type, document ID and document body of
+        each document (and the path, if it was requested)
+    """
+    timings = timings if timings is not None else SeedTimings()
+    id_field = packer.config.seed_id_field
+    loaded = []
+    for line in lines:
+        started = time.perf_counter()
+        doc = packer.serializer.loads(line)
+        parsed = time.perf_counter()
+        # Metadata fields can't be part of the document.
+        _id = (
+            doc.pop(id_field, None) if id_field.startswith('_')
+            else doc.get(id_field)
+        )
+        item = (
+            index,
+            doctype,
+            str(_id) if _id is not None else None,
+            packer.pack(doc=doc, index=index)
+        )
+        timings.parse += parsed - started
+        timings.pack += time.perf_counter() - parsed
+        loaded.append(item + ((path, None),) if digest else item)
+    return loaded
+
+
+def _timed(load: Callable, *args, **kwargs) -> Tuple[Any, SeedTimings]:
+    """
+    Call a loading function and find out where the time went.  (The
+    breakdown is returned, rather than shared, so this works in worker
+    processes, too.)
+
+    :param load: the loading function (:py:func:`_load` or
+        :py:func:`_load_lines`)
+    :param args: the positional arguments
+    :param kwargs: the keyword arguments
+    :return: the result and the timing breakdown
+    """
+    timings = SeedTimings()
+    return load(*args, timings=timings, **kwargs), timings
+
+
+def _pipeline(
+        files: Iterable[Tuple[str, str, Path]],
+        packer: ElastalkConnection,
+        workers: int,
+        queue_size: int,
+        processes: bool = False,
+        digest: bool = False,
+        progress: SeedProgress = None
+) -> Iterator[Tuple]:
+    """
+    Load seed files on a pool of workers.  A producer thread walks the seed
+    files and submits them to the pool, placing the pending results on a
+    bounded queue which this generator drains (in order).  NDJSON seed files
+    are streamed, and their lines are handed to the workers in batches.
+
+    :param files: an iteration of index names, document types and paths
+    :param packer: the connection used to pack documents (This connection's
+        client is never used, so it can be shipped to worker processes.)
+    :param workers: the number of workers
+    :param queue_size: the maximum number of seed files (or batches of lines)
+        waiting to be indexed
+    :param processes: `True` to use worker processes rather than threads
+    :param digest: `True` to include the path and the digest of each file
+        (see :py:func:`_load`)
+    :param progress: the progress on which the queue depth and the time
+        spent reading, parsing and packing are recorded
+    :return: an iteration of index names, document types, document IDs and
+        document bodies
+    """
+    progress = progress if progress is not None else SeedProgress({})
+    executor: Executor = (
+        ProcessPoolExecutor(max_workers=max(1, workers))
+        if processes
+        else ThreadPoolExecutor(max_workers=max(1, workers))
+    )
+    pending: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    done = object()  # This marks the end of the queue.
+    stop = threading.Event()  # This is set if the consumer goes away.
+
+    def _tasks() -> Iterator[Future]:
+        for index, doctype, path in files:
+            if not _is_lines(path):
+                yield executor.submit(
+                    _timed, _load, index, doctype, path, packer, digest=digest
+                )
+                continue
+            _lines_ = _lines(path)
+            while True:
+                started = time.perf_counter()
+                batch = list(islice(_lines_, _LINES_PER_TASK))
+                progress.record(read=time.perf_counter() - started)
+                if not batch:
+                    break
+                yield executor.submit(
+                    _timed,
+                    _load_lines,
+                    index,
+                    doctype,
+                    path,
+                    batch,
+                    packer,
+                    digest=digest
                 )
+
+    def _produce():
+        try:
+            for future in _tasks():
+                # Wait for room in the queue (unless the consumer is gone).
+                while not stop.is_set():
+                    try:
+                        pending.put(future, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as ex:  # pylint: disable=broad-except
+            pending.put(ex)  # Let the consumer know what went wrong.
+        pending.put(done)
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            result, timings = item.result()
+            progress.record(timings)
+            progress.queue_depth = pending.qsize()
+            # Batches of lines produce lists of documents.
+            if isinstance(result, list):
+                yield from result
+            else:
+                yield result
+    finally:
+        stop.set()
+        # Drain the queue so the producer isn't blocked.
+        while producer.is_alive():
+            try:
+                pending.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        executor.shutdown(wait=True)
+
+
+def _bulk(
+        clients: Callable[[str], elasticsearch.Elasticsearch],
+        documents: Iterable[Tuple[str, str, str, Dict]],
+        config: ElastalkConf,
+        serializer: Serializer,
+        dry_run: bool = False,
+        progress: SeedProgress = None
+) -> Iterator[Tuple[str, str, bool]]:
+    """
+    Index documents using the Elasticsearch bulk API, keeping up to
+    :py:attr:`bulk_threads <elastalk.config.ElastalkConf.bulk_threads>`
+    requests in flight at once.
+
+    :param clients: a function that returns the Elasticsearch client for the
+        cluster that serves writes to an index
+    :param documents: an iteration of index names, document types, document
+        IDs and document bodies
+    :param config: the configuration that controls batching, retries and
+        routing
+    :param serializer: the serializer used to encode the documents
+    :param dry_run: `True` to prepare the bulk requests without sending them
+    :param progress: the progress on which the number of bytes sent and the
+        time spent waiting on Elasticsearch are recorded
+    :return: an iteration of index names, document IDs and flags that
+        indicate whether or not each document was indexed
+    """
+    progress = progress if progress is not None else SeedProgress({})
+
+    def _send(**kwargs) -> List[Tuple[str, str, bool]]:
+        started = time.perf_counter()
+        try:
+            return _send_chunk(**kwargs)
+        finally:
+            progress.record(network=time.perf_counter() - started)
+
+    with ThreadPoolExecutor(
+            max_workers=max(1, config.bulk_threads)
+    ) as executor:
+        pending: Set[Future] = set()
+        for chunk in _chunks(
+                documents,
+                chunk_size=config.bulk_chunk_size,
+                max_bytes=config.bulk_max_bytes,
+                serializer=serializer,
+                route=partial(config.cluster_for, write=True)
+        ):
+            progress.bytes += sum(
+                len(action) + (len(source) + 2 if source else 1)
+                for _, _, action, source in chunk
+            )
+            # If this is just a dry run, we're done with the chunk.
+            if dry_run:
+                yield from ((index, id_, True) for index, id_, _, _ in chunk)
+                continue
+            # If we already have as many requests in flight as we're allowed...
+            if len(pending) >= max(1, config.bulk_threads):
+                # ...wait for one of them to come back before sending another.
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(
+                executor.submit(
+                    _send,
+                    es=clients(chunk[0][0]),
+                    chunk=chunk,
+                    max_retries=config.bulk_max_retries,
+                    initial_backoff=config.bulk_initial_backoff
+                )
+            )
+        # Collect whatever is still outstanding.
+        for future in pending:
+            yield from future.result()
+
+
+def _chunks(
+        documents: Iterable[Tuple[str, str, str, Dict]],
+        chunk_size: int,
+        max_bytes: int,
+        serializer: Serializer = None,
+        route: Callable[[str], Any] = None
+) -> Iterator[List[_BulkItem]]:
+    """
+    Serialize documents into bulk items and group them into chunks that
+    respect both the document count and size limits.
+
+    :param documents: an iteration of index names, document types, document
+        IDs and document bodies (A body of `None` deletes the document.)
+    :param chunk_size: the maximum number of documents in a chunk
+    :param max_bytes: the maximum size (in bytes) of a chunk
+    :param serializer: the serializer used to encode the documents
+    :param route: a function that returns the destination (cluster) of an
+        index (Documents bound for different destinations never share a
+        chunk.)
+    :return: an iteration of chunks
+    """
+    dumps = (serializer if serializer else get_serializer()).dumps
+    chunk: List[_BulkItem] = []
+    size = 0
+    destination = None
+    for index, doctype, id_, body in documents:
+        # If this document is headed somewhere else...
+        if route is not None:
+            _destination = route(index)
+            if chunk and _destination != destination:
+                yield chunk  # ...finish the current chunk.
+                chunk, size = [], 0
+            destination = _destination
+        meta = {'_index': index, '_type': doctype, '_id': id_}
+        # If the document doesn't have an ID, Elasticsearch will make one up.
+        if id_ is None:
+            del meta['_id']
+        if body is None:
+            action, source = dumps({'delete': meta}), None
+        else:
+            action, source = dumps({'index': meta}), dumps(body)
+        # Account for the trailing newline after each line.
+        item_size = len(action) + (len(source) + 2 if source else 1)
+        # If this item won't fit in the current chunk...
+        if chunk and (len(chunk) >= chunk_size or size + item_size > max_bytes):
+            yield chunk  # ...send the chunk on its way and start another.
+            chunk, size = [], 0
+        chunk.append((index, id_, action, source))
+        size += item_size
+    if chunk:
+        yield chunk
+
+
+class _BulkAttempts:
+    """
+    Decide what happens to a chunk of bulk items as it's sent (and resent) to
+    Elasticsearch: only the items the server rejected because it was too
+    busy (`429`) are retried, waiting a little longer each time.  (The
+    synchronous and asynchronous senders only do the sending and the
+    waiting.)
+    """
+    def __init__(
+            self,
+            chunk: List[_BulkItem],
+            max_retries: int,
+            initial_backoff: float
+    ):
+        """
+
+        :param chunk: the bulk items
+        :param max_retries: the maximum number of times rejected items are
+            retried
+        :param initial_backoff: the number of seconds to wait before the
+            first retry (The wait doubles with each subsequent retry.)
+        """
+        self.chunk: List[_BulkItem] = chunk  #: the items still to be sent
+        #: the index name, document ID and outcome of each finished item
+        self.results: List[Tuple[str, str, bool]] = []
+        self._max_retries: int = max_retries
+        self._initial_backoff: float = initial_backoff
+        self._attempt: int = 0
+
+    def __iter__(self) -> Iterator[Tuple[float, bytes]]:
+        """
+        Generate the number of seconds to wait before each attempt, and the
+        body of the bulk request to send.
+        """
+        for attempt in range(self._max_retries + 1):
+            if not self.chunk:
+                return
+            self._attempt = attempt
+            yield (
+                self._initial_backoff * 2 ** (attempt - 1) if attempt else 0,
+                _bulk_body(self.chunk)
+            )
+
+    def answered(self, resp: Mapping[str, Any]):
+        """
+        Sort out the outcome of each item in a bulk response.
+
+        :param resp: the bulk response
+        """
+        self.chunk = _outcomes(
+            self.chunk,
+            resp=resp,
+            results=self.results,
+            retry=self._attempt < self._max_retries
+        )
+
+    def failed(self, ex: elasticsearch.TransportError):
+        """
+        Handle a bulk request that failed altogether.
+
+        :param ex: the error
+        """
+        # If the whole request was rejected, and we have retries left, we'll
+        # try the whole thing again.
+        if ex.status_code == 429 and self._attempt < self._max_retries:
+            return
+        _logger.error(f"A bulk request failed: {ex}")
+        self.results.extend(
+            (index, id_, False) for index, id_, _, _ in self.chunk
+        )
+        self.chunk = []
+
+
+def _send_chunk(
+        es: elasticsearch.Elasticsearch,
+        chunk: List[_BulkItem],
+        max_retries: int,
+        initial_backoff: float
+) -> List[Tuple[str, str, bool]]:
+    """
+    Send a chunk of bulk items to Elasticsearch, retrying only the items the
+    server rejected because it was too busy (see :py:class:`_BulkAttempts`).
+
+    :param es: the Elasticsearch client
+    :param chunk: the bulk items
+    :param max_retries: the maximum number of times rejected items are retried
+    :param initial_backoff: the number of seconds to wait before the first
+        retry (The wait doubles with each subsequent retry.)
+    :return: the index name, document ID and outcome for each item
+    """
+    attempts = _BulkAttempts(chunk, max_retries, initial_backoff)
+    for backoff, body in attempts:
+        if backoff:
+            time.sleep(backoff)
+        try:
+            resp = es.bulk(body=body)
+        except elasticsearch.TransportError as ex:
+            attempts.failed(ex)
+            continue
+        attempts.answered(resp)
+    return attempts.results
+
+
+def _bulk_body(chunk: List[_BulkItem]) -> bytes:
+    """
+    Create the body of a bulk request.
+
+    :param chunk: the bulk items
+    :return: the request body
+    """
+    return b''.join(
+        b'%b\n%b\n' % (action, source) if source is not None
+        else b'%b\n' % action
+        for _, _, action, source in chunk
+    )
+
+
+def _outcomes(
+        chunk: List[_BulkItem],
+        resp: Mapping[str, Any],
+        results: List[Tuple[str, str, bool]],
+        retry: bool
+) -> List[_BulkItem]:
+    """
+    Sort out the outcome of each item in a bulk response.  (Deleting a
+    document that doesn't exist is considered a success.)
+
+    :param chunk: the bulk items that were sent
+    :param resp: the bulk response
+    :param results: the list to which the index name, document ID and outcome
+        of each finished item is added
+    :param retry: `True` if items rejected with a `429` may be retried
+    :return: the items that should be retried
+    """
+    retries: List[_BulkItem] = []
+    for item, outcome in zip(chunk, resp['items']):
+        op, result = next(iter(outcome.items()))
+        status = result.get('status', 500)
+        if status == 429 and retry:
+            retries.append(item)
+        else:
+            results.append((
+                item[0],
+                item[1],
+                200 <= status < 300 or (op == 'delete' and status == 404)
+            ))
+    return retries
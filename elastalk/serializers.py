@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Created on 10/18/26 by Pat Daburu
+"""
+.. currentmodule:: elastalk.serializers
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Turn documents into JSON (and back again).  The standard library's
+:py:mod:`json` module is used unless you name a faster library
+(`orjson <https://pypi.org/project/orjson/>`_,
+`ujson <https://pypi.org/project/ujson/>`_ or
+`python-rapidjson <https://pypi.org/project/python-rapidjson/>`_) in the
+configuration.  The faster libraries fall back to :py:mod:`json` for documents
+they can't encode the same way (like those with integers that don't fit in 64
+bits), so the output doesn't depend on which library does the work.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+import json
+from typing import Any, Callable, Dict, Type
+import uuid
+from elasticsearch.serializer import JSONSerializer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+try:
+    import rapidjson
+except ImportError:  # pragma: no cover
+    rapidjson = None
+
+
+def default(obj: Any) -> Any:
+    """
+    Convert objects the JSON libraries don't understand into objects they do.
+
+    :param obj: the object
+    :return: a JSON-serializable representation of the object
+    :raises TypeError: if the object can't be represented
+    """
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        # A float is what the Elasticsearch client has always sent, but not
+        # every decimal survives the trip so those that wouldn't are sent as
+        # strings (which Elasticsearch coerces into numeric fields).
+        as_float = float(obj)
+        return as_float if Decimal(repr(as_float)) == obj else str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Unable to serialize {obj!r} (type: {type(obj)})")
+
+
+class Serializer:
+    """
+    Serialize documents using the standard library's :py:mod:`json` module.
+    (Subclasses use faster libraries.)
+    """
+    name: str = 'json'  #: the name of the serializer
+
+    @classmethod
+    def available(cls) -> bool:
+        """
+        Is the library behind this serializer installed?
+
+        :return: `True` if the serializer can be used
+        """
+        return True
+
+    def dumps(self, obj: Any) -> bytes:
+        """
+        Serialize an object to UTF-8 encoded JSON.
+
+        :param obj: the object
+        :return: the JSON bytes
+        """
+        return json.dumps(
+            obj, default=default, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def loads(self, data: bytes or str) -> Any:
+        """
+        Deserialize a JSON document.
+
+        :param data: the JSON bytes (or string)
+        :return: the object
+        """
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    """
+    Serialize documents using `orjson <https://pypi.org/project/orjson/>`_.
+    """
+    name: str = 'orjson'
+
+    @classmethod
+    def available(cls) -> bool:
+        return orjson is not None
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(
+                obj, default=default, option=orjson.OPT_NON_STR_KEYS
+            )
+        except TypeError:
+            # orjson can't encode integers that don't fit in 64 bits.
+            return super().dumps(obj)
+
+    def loads(self, data: bytes or str) -> Any:
+        return orjson.loads(data)
+
+
+class UjsonSerializer(Serializer):
+    """
+    Serialize documents using `ujson <https://pypi.org/project/ujson/>`_.
+    """
+    name: str = 'ujson'
+
+    @classmethod
+    def available(cls) -> bool:
+        return ujson is not None
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return ujson.dumps(
+                obj, ensure_ascii=False, default=default
+            ).encode('utf-8')
+        except (TypeError, OverflowError):
+            return super().dumps(obj)
+
+    def loads(self, data: bytes or str) -> Any:
+        return ujson.loads(data)
+
+
+class RapidjsonSerializer(Serializer):
+    """
+    Serialize documents using
+    `python-rapidjson <https://pypi.org/project/python-rapidjson/>`_.
+    """
+    name: str = 'rapidjson'
+
+    @classmethod
+    def available(cls) -> bool:
+        return rapidjson is not None
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return rapidjson.dumps(
+                obj, ensure_ascii=False, default=default
+            ).encode('utf-8')
+        except (TypeError, OverflowError):
+            # rapidjson won't encode dictionaries with keys that aren't
+            # strings.
+            return super().dumps(obj)
+
+    def loads(self, data: bytes or str) -> Any:
+        return rapidjson.loads(data)
+
+
+#: the known serializers
+SERIALIZERS: Dict[str, Type[Serializer]] = {
+    cls.name: cls
+    for cls in [
+        OrjsonSerializer,
+        UjsonSerializer,
+        RapidjsonSerializer,
+        Serializer
+    ]
+}
+
+
+def get_serializer(name: str = None) -> Serializer:
+    """
+    Get a serializer.
+
+    :param name: the name of the serializer (If you don't supply a name, the
+        standard library's :py:mod:`json` serializer is returned.)
+    :return: the serializer
+    :raises ValueError: if the named serializer is unknown or its library
+        isn't installed
+    """
+    if not name:
+        return Serializer()
+    try:
+        cls = SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(f"'{name}' is not a known serializer.")
+    if not cls.available():
+        raise ValueError(f"The '{name}' serializer is not installed.")
+    return cls()
+
+
+class ElasticsearchSerializer(JSONSerializer):
+    """
+    Adapt a :py:class:`Serializer` so the Elasticsearch client can use it to
+    encode request bodies and decode responses.  (The client expects strings,
+    so that's what it gets.)
+    """
+    def __init__(self, serializer: Serializer):
+        """
+
+        :param serializer: the serializer that does the work
+        """
+        self.serializer: Serializer = serializer
+        self._dumps: Callable[[Any], bytes] = serializer.dumps
+        self._loads: Callable[[bytes or str], Any] = serializer.loads
+
+    def dumps(self, data):
+        # Bodies that have already been serialized are passed along.
+        if isinstance(data, (str, bytes)):
+            return data
+        return self._dumps(data).decode('utf-8')
+
+    def loads(self, s):
+        return self._loads(s)
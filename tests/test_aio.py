@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from pathlib import Path
+from unittest import mock
+import uuid
+import elasticsearch
+import pytest
+from elastalk.aio import (
+    AsyncElastalkConnection,
+    AsyncElastalkMixin,
+    _send_chunk,
+    iter_documents,
+    seed
+)
+from elastalk.cache import CacheStats
+from elastalk.config import CacheConf, ElastalkConf, ElastalkConfigException
+from elastalk.connect import ConnectionRegistry
+from elastalk.seed import SeedStats
+
+
+def run(coro):
+    """
+    Run a coroutine on a new event loop.
+
+    :param coro: the coroutine
+    :return: the coroutine's result
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class _AsyncClient:
+    """
+    A stand-in asynchronous Elasticsearch client.
+    """
+    def __init__(self, *args, **kwargs):
+        self.hits = [
+            {'_id': str(uuid.UUID(int=i)), '_source': {'n': i}, 'sort': [i]}
+            for i in range(25)
+        ]
+        self.positions = {}
+        self.cleared = []
+        self.bulk_bodies = []
+        self.closed = False
+        self.indices = mock.MagicMock()
+        self.indices.delete = mock.AsyncMock()
+        self.indices.create = mock.AsyncMock()
+        self.indices.exists = mock.AsyncMock(return_value=False)
+        self.transport = mock.MagicMock(close=mock.AsyncMock())
+
+    async def search(self, index, body, scroll=None):
+        size = body['size']
+        if scroll:
+            scroll_id = f'scroll-{len(self.positions)}'
+            self.positions[scroll_id] = (size, size)
+            return {'_scroll_id': scroll_id, 'hits': {'hits': self.hits[:size]}}
+        start = body.get('search_after', [-1])[0] + 1
+        return {'hits': {'hits': self.hits[start:start + size]}}
+
+    async def scroll(self, scroll_id, scroll):
+        start, size = self.positions[scroll_id]
+        self.positions[scroll_id] = (start + size, size)
+        return {
+            '_scroll_id': scroll_id,
+            'hits': {'hits': self.hits[start:start + size]}
+        }
+
+    async def clear_scroll(self, body, ignore=()):
+        self.cleared.extend(body['scroll_id'])
+
+    async def bulk(self, body):
+        self.bulk_bodies.append(body)
+        return {
+            'items': [
+                {'index': {'_id': json.loads(a)['index']['_id'], 'status': 201}}
+                for a in body.splitlines()[::2]
+            ]
+        }
+
+
+@pytest.fixture(name='client')
+def client_fixture():
+    """
+    This fixture patches the asynchronous Elasticsearch client with a
+    stand-in.
+
+    :return: the stand-in client
+    """
+    client = _AsyncClient()
+    with mock.patch('elastalk.aio.AsyncElasticsearch', lambda *a, **kw: client):
+        yield client
+
+
+def test_async_client(client):
+    """
+    Arrange: Create an `AsyncElastalkConnection`.
+    Act: Retrieve the client twice, then close the connection.
+    Assert: The same client is returned both times and is closed.
+
+    :param client: the stand-in client
+    """
+    cnx = AsyncElastalkConnection(ElastalkConf())
+    assert cnx.client is client
+    assert cnx.client is cnx.client
+    run(cnx.close())
+    client.transport.close.assert_awaited_once()
+
+
+def test_async_client_not_installed():
+    """
+    Arrange: Simulate an environment without an asynchronous client.
+    Act: Retrieve the client.
+    Assert: An `ElastalkConfigException` is raised.
+    """
+    with mock.patch('elastalk.aio.AsyncElasticsearch', None):
+        with pytest.raises(ElastalkConfigException):
+            _ = AsyncElastalkConnection(ElastalkConf()).client
+
+
+def test_async_mixin(client):
+    """
+    Arrange/Act: Construct an `AsyncElastalkMixin` and retrieve the values of
+        the `es_cnx` and `es` properties.
+    Assert: The properties return expected values.
+
+    :param client: the stand-in client
+    """
+    mixin = AsyncElastalkMixin()
+    assert isinstance(mixin.es_cnx, AsyncElastalkConnection)
+    assert mixin.es_cnx is AsyncElastalkConnection.default()
+    cnx = AsyncElastalkConnection()
+    mixin.es_cnx = cnx
+    assert mixin.es_cnx is cnx
+    assert mixin.es is client
+
+
+def test_async_search_cached(client):
+    """
+    Arrange: Create an asynchronous connection that caches search results.
+    Act: Run the same search twice (and the search again after it goes
+        stale).
+    Assert: The second search is answered from the cache, and the stale
+        result is refreshed in the background.
+
+    :param client: the stand-in client
+    """
+    cnx = AsyncElastalkConnection(
+        config=ElastalkConf(cache=CacheConf(enabled=True, ttl=60, stale=60))
+    )
+    searches = []
+    search = client.search
+
+    async def _search(index, body, **kwargs):
+        searches.append(body)
+        return await search(index=index, body=body, **kwargs)
+
+    client.search = _search
+    body = {'size': 3}
+
+    async def _search_twice():
+        first = await cnx.search('cats', body=body)
+        second = await cnx.search('cats', body=body)
+        # Let's pretend the result has gone stale.
+        cache = cnx._cache('cats')  # pylint: disable=protected-access
+        for key, (stored, gen, result) in list(cache._entries.items()):
+            cache._entries[key] = (stored - 90, gen, result)
+        third = await cnx.search('cats', body=body)
+        await asyncio.sleep(0.01)
+        return first, second, third
+
+    first, second, third = run(_search_twice())
+    assert first is second is third, 'The results should come from the cache.'
+    assert len(first['hits']['hits']) == 3
+    assert len(searches) == 2, 'The stale result should have been refreshed.'
+    assert cnx.cache_stats()['cats'] == CacheStats(
+        hits=1, stale_hits=1, misses=1, refreshes=1
+    )
+
+
+@pytest.mark.parametrize('sort', [None, [{'n': 'asc'}]])
+def test_async_iter_documents(client, sort):
+    """
+    Arrange: Create a connection to a client that holds 25 documents.
+    Act: Iterate over all the documents, ten at a time.
+    Assert: Every document is returned (in order) and scrolls are cleared.
+
+    :param client: the stand-in client
+    :param sort: the search_after sort (or `None` to scroll)
+    """
+    async def _collect():
+        cnx = AsyncElastalkConnection(ElastalkConf())
+        return [
+            doc async for doc in
+            iter_documents(cnx, index='test', size=10, sort=sort)
+        ]
+
+    docs = run(_collect())
+    assert [d['n'] for d in docs] == list(range(25))
+    if not sort:
+        assert client.cleared == ['scroll-0']
+
+
+def test_async_iter_documents_read_cluster():
+    """
+    Arrange: Make a registry that routes reads from an index to a replica
+        cluster (and make it the default registry).
+    Act: Iterate over the documents in the index.
+    Assert: The search is sent to the replica cluster.
+    """
+    clients = {}
+
+    def _client(seeds, **kwargs):
+        return clients.setdefault(seeds[0], _AsyncClient())
+
+    previous = ConnectionRegistry.default()
+    registry = ConnectionRegistry.default(
+        ConnectionRegistry.from_toml(
+            "seeds = ['primary01']\n"
+            "[clusters.replica]\n"
+            "seeds = ['replica01']\n"
+            "[indexes.cats]\n"
+            "read_cluster = 'replica'\n"
+        )
+    )
+
+    async def _collect():
+        cnx = AsyncElastalkConnection(registry.config)
+        try:
+            return [
+                doc async for doc in
+                iter_documents(cnx, index='cats', size=10, uuids=False)
+            ]
+        finally:
+            await cnx.close()
+
+    try:
+        with mock.patch('elastalk.aio.AsyncElasticsearch', _client):
+            docs = run(_collect())
+    finally:
+        ConnectionRegistry.default(previous)
+    assert len(docs) == 25
+    assert list(clients) == ['replica01'], \
+        'Reads should go to the read cluster.'
+    assert clients['replica01'].cleared == ['scroll-0']
+    clients['replica01'].transport.close.assert_awaited_once()
+
+
+def test_async_iter_documents_closed_early(client):
+    """
+    Arrange: Start iterating over the documents with a scroll.
+    Act: Close the iteration after the first document.
+    Assert: The scroll is cleared.
+
+    :param client: the stand-in client
+    """
+    async def _first():
+        cnx = AsyncElastalkConnection(ElastalkConf())
+        docs = iter_documents(cnx, index='test', size=10)
+        first = await docs.__anext__()
+        await docs.aclose()
+        return first
+
+    assert run(_first())['n'] == 0
+    assert client.cleared == ['scroll-0']
+
+
+def test_async_seed(client):
+    """
+    Arrange: Mock an asynchronous client.
+    Act: Call the asynchronous `seed` function.
+    Assert: All of the seed documents are indexed.
+
+    :param client: the stand-in client
+    """
+    tests = Path(__file__).resolve().parent
+    stats = run(
+        seed(
+            root=tests / 'data' / 'seed',
+            config=tests / 'configs' / '001' / 'config.toml',
+            force=True
+        )
+    )
+    assert stats == {
+        'cats': SeedStats(indexed=3),
+        'dogs': SeedStats(indexed=2)
+    }
+    assert client.bulk_bodies, 'Documents should be sent in bulk.'
+    assert client.indices.create.await_count == 2, \
+        'Each index should be created before it is seeded.'
+    client.transport.close.assert_awaited_once()
+
+
+def test_async_seed_in_flight(tmp_path: Path):
+    """
+    Arrange: Mock an asynchronous client that keeps track of the number of
+        bulk requests in flight, and configure one document per request and
+        two requests at a time.
+    Act: Call the asynchronous `seed` function.
+    Assert: No more than two requests are in flight at once, and every
+        result is counted.
+
+    :param tmp_path: a temporary directory
+    """
+    client = _AsyncClient()
+    peak = [0, 0]  # [in flight, most in flight]
+    bulk = client.bulk
+
+    async def _bulk(body):
+        peak[0] += 1
+        peak[1] = max(peak)
+        await asyncio.sleep(0.01)
+        peak[0] -= 1
+        return await bulk(body)
+
+    client.bulk = _bulk
+    config = tmp_path / 'config.toml'
+    config.write_text('bulk_chunk_size = 1\nbulk_threads = 2\n')
+    tests = Path(__file__).resolve().parent
+    with mock.patch('elastalk.aio.AsyncElasticsearch', lambda *a, **kw: client):
+        stats = run(
+            seed(root=tests / 'data' / 'seed', config=config, force=True)
+        )
+    assert stats['cats'] == SeedStats(indexed=3)
+    assert stats['dogs'] == SeedStats(indexed=2)
+    assert len(client.bulk_bodies) == 5, 'Each document should be sent alone.'
+    assert peak[1] == 2, 'Two requests should be in flight at once.'
+
+
+def test_async_seed_prepare_fails(tmp_path: Path):
+    """
+    Arrange: Mock an asynchronous client that can't switch the second index
+        into load mode, and enable load mode.
+    Act: Call the asynchronous `seed` function.
+    Assert: The error is raised, the indexes are taken out of load mode and
+        the client is closed.
+
+    :param tmp_path: a temporary directory
+    """
+    client = _AsyncClient()
+    client.indices.get_settings = mock.AsyncMock(
+        side_effect=lambda index, **_: {
+            index: {'settings': {'index.number_of_replicas': '1'}}
+        }
+    )
+    client.indices.refresh = mock.AsyncMock()
+
+    async def _put_settings(index, body):
+        if index == 'dogs' and body['index'].get('refresh_interval') == '-1':
+            raise RuntimeError('Oops.')
+
+    client.indices.put_settings = mock.AsyncMock(side_effect=_put_settings)
+    config = tmp_path / 'config.toml'
+    config.write_text('seed_load_mode = true\n')
+    tests = Path(__file__).resolve().parent
+    with mock.patch('elastalk.aio.AsyncElasticsearch', lambda *a, **kw: client):
+        with pytest.raises(RuntimeError):
+            run(seed(root=tests / 'data' / 'seed', config=config, force=True))
+    restored = [
+        call[1]['index'] for call in client.indices.put_settings.call_args_list
+        if call[1]['body']['index'].get('refresh_interval') is None
+    ]
+    assert restored == ['cats', 'dogs'], \
+        'The indexes should be taken out of load mode.'
+    assert not client.bulk_bodies, 'No documents should be sent.'
+    client.transport.close.assert_awaited_once()
+
+
+@pytest.mark.parametrize('max_retries, expected', [(2, True), (1, False)])
+def test_async_send_chunk_retries(max_retries: int, expected: bool):
+    """
+    Arrange: Mock an asynchronous client that rejects the first bulk request
+        altogether, then rejects each document once, with a `429`.
+    Act: Send a chunk of bulk items.
+    Assert: The rejections are retried (as long as there are retries left).
+
+    :param max_retries: the maximum number of retries
+    :param expected: the expected outcome of each item
+    """
+    client = _AsyncClient()
+    seen = set()
+    requests = []
+
+    async def _bulk(body):
+        requests.append(body)
+        if len(requests) == 1:
+            raise elasticsearch.TransportError(429, 'busy')
+        items = []
+        for action in body.splitlines()[::2]:
+            _id = json.loads(action)['index']['_id']
+            items.append({'index': {'status': 201 if _id in seen else 429}})
+            seen.add(_id)
+        return {'items': items}
+
+    client.bulk = _bulk
+    chunk = [
+        ('cats', str(i), json.dumps({'index': {'_id': str(i)}}).encode(), b'{}')
+        for i in range(3)
+    ]
+    results = run(
+        _send_chunk(client, chunk=chunk, max_retries=max_retries, initial_backoff=0)
+    )
+    assert sorted(results) == [('cats', str(i), expected) for i in range(3)]
+    assert len(requests) == max_retries + 1
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+from unittest import mock
+import pytest
+from elastalk.cache import CacheStats, ResultCache, cache_key, invalidate
+from elastalk.config import CacheConf, ElastalkConf
+from elastalk.connect import ElastalkConnection
+
+
+class _Clock:
+    """
+    A stand-in for the `time` module that only moves when it's told to.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture(name='clock')
+def clock_fixture() -> _Clock:
+    """
+    This fixture replaces the cache's clock.
+
+    :return: the clock
+    """
+    clock = _Clock()
+    with mock.patch('elastalk.cache.time', clock):
+        yield clock
+
+
+def test_cache_key_canonical():
+    """
+    Arrange: Create two search bodies that differ only in key order.
+    Act: Create cache keys for them (and for another index).
+    Assert: The keys for the same index match and the other doesn't.
+    """
+    body1 = {'query': {'term': {'a': 1}}, 'size': 10}
+    body2 = {'size': 10, 'query': {'term': {'a': 1}}}
+    assert cache_key('cats', body1) == cache_key('cats', body2)
+    assert cache_key('cats', body1) != cache_key('dogs', body1)
+    assert cache_key('cats', body1) != cache_key('cats', body1, size=5)
+
+
+def test_result_cache_hit_miss_expire(clock: _Clock):
+    """
+    Arrange: Create a cache with a short time-to-live.
+    Act: Get the same result before and after it expires.
+    Assert: Fresh results come from the cache and expired ones are fetched.
+    """
+    cache = ResultCache('cats', CacheConf(size=10, ttl=5, stale=0))
+    fetch = mock.MagicMock(side_effect=[1, 2])
+    assert cache.get('k', fetch) == 1
+    clock.now += 4
+    assert cache.get('k', fetch) == 1
+    clock.now += 2
+    assert cache.get('k', fetch) == 2
+    assert cache.stats == CacheStats(hits=1, misses=2)
+
+
+def test_result_cache_evicts_lru(clock: _Clock):
+    """
+    Arrange: Create a cache that holds two results.
+    Act: Add three results (using the first one along the way).
+    Assert: The least recently used result is evicted.
+    """
+    cache = ResultCache('cats', CacheConf(size=2, ttl=5, stale=0))
+    cache.get('a', lambda: 'a')
+    cache.get('b', lambda: 'b')
+    cache.get('a', lambda: 'x')
+    cache.get('c', lambda: 'c')
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+    assert cache.get('a', lambda: 'x') == 'a'
+    assert cache.get('b', lambda: 'new') == 'new'
+
+
+def test_result_cache_stale_while_revalidate(clock: _Clock):
+    """
+    Arrange: Create a cache that serves stale results for a while.
+    Act: Get a result after it goes stale.
+    Assert: The stale result is returned and refreshed in the background.
+    """
+    cache = ResultCache('cats', CacheConf(size=10, ttl=5, stale=10))
+    cache.get('k', lambda: 'old')
+    clock.now += 6
+    refreshed = threading.Event()
+
+    def _fetch():
+        refreshed.set()
+        return 'new'
+
+    with mock.patch('threading.Thread') as thread:
+        assert cache.get('k', _fetch) == 'old'
+        # A second stale hit shouldn't start another refresh.
+        assert cache.get('k', _fetch) == 'old'
+    thread.assert_called_once()
+    # Run the refresh (as the thread would have).
+    target = thread.call_args[1]['target']
+    target(*thread.call_args[1]['args'])
+    assert refreshed.is_set()
+    assert cache.get('k', _fetch) == 'new'
+    assert cache.stats.stale_hits == 2
+    assert cache.stats.refreshes == 1
+
+
+def test_result_cache_invalidate(clock: _Clock):
+    """
+    Arrange: Cache a result.
+    Act: Invalidate the index.
+    Assert: The next search is fetched.
+    """
+    cache = ResultCache('invalidated', CacheConf(size=10, ttl=5, stale=0))
+    cache.get('k', lambda: 'old')
+    invalidate('invalidated')
+    assert cache.get('k', lambda: 'new') == 'new'
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_connection_search_cached():
+    """
+    Arrange: Create a connection that caches results for one index.
+    Act: Send the same search to the cached index and another index twice.
+    Assert: Only the uncached index's searches both reach the client.
+    """
+    etconf = ElastalkConf().from_dict({
+        'indexes': {'cats': {'cache': {'enabled': True, 'ttl': 60}}}
+    })
+    es_cnx = ElastalkConnection(etconf)
+    body = {'query': {'match_all': {}}}
+    for _ in range(2):
+        es_cnx.search('cats', body=body)
+        es_cnx.search('dogs', body=body)
+    assert es_cnx.client.search.call_count == 3
+    assert es_cnx.cache_stats()['cats'] == CacheStats(hits=1, misses=1)
+    assert 'dogs' not in es_cnx.cache_stats()
+    es_cnx.invalidate_cache('cats')
+    es_cnx.search('cats', body=body)
+    assert es_cnx.client.search.call_count == 4
@@ -9,6 +9,8 @@ This is the test module for the project's command-line interface (CLI)
 module.
 """
 import logging
+from pathlib import Path
+from unittest import mock
 from click.testing import CliRunner, Result
 import elastalk.cli as cli
 from elastalk import __version__
@@ -37,3 +39,55 @@ def test_verbose_output():
     result: Result = runner.invoke(cli.cli, ['-v', 'version'])
     assert 'Verbose' in result.output.strip(), \
         'Verbose logging should be indicated in output.'
+
+
+SEED_ROOT: Path = Path(__file__).resolve().parent / 'data' / 'seed'
+
+
+def test_seed_dry_run():
+    """
+    Arrange/Act: Run the `seed` subcommand as a dry run.
+    Assert: Every document is counted (and nothing is sent), and the seed
+        data isn't counted up front.
+    """
+    runner: CliRunner = CliRunner()
+    with mock.patch('elasticsearch.Elasticsearch') as es, \
+            mock.patch('elastalk.cli._expected') as expected:
+        result: Result = runner.invoke(
+            cli.cli,
+            ['seed', str(SEED_ROOT), '--dry-run', '--workers', '2']
+        )
+    assert result.exit_code == 0, result.output
+    assert not expected.called, \
+        'The seed data should only be counted up front if we ask for an ETA.'
+    assert 'cats: 0 indexed, 3 skipped' in result.output
+    assert 'dogs: 0 indexed, 2 skipped' in result.output
+    assert 'Prepared 5 documents' in result.output
+    assert 'network 0.00' in result.output
+    es.return_value.bulk.assert_not_called()
+
+
+def test_seed_reports_progress():
+    """
+    Arrange: Create a client that accepts every document.
+    Act: Run the `seed` subcommand, reporting progress as often as possible.
+    Assert: Progress is reported and the documents are indexed.
+    """
+    client = mock.MagicMock()
+    client.indices.get_settings.return_value = {}
+    client.bulk.side_effect = lambda body: {
+        'items': [
+            {'index': {'status': 201}} for _ in body.splitlines()[::2]
+        ]
+    }
+    runner: CliRunner = CliRunner(mix_stderr=False)
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        result: Result = runner.invoke(
+            cli.cli,
+            ['seed', str(SEED_ROOT), '--force', '--interval', '0', '--eta']
+        )
+    assert result.exit_code == 0, result.output
+    assert 'cats: 3 indexed' in result.stdout
+    assert 'dogs: 2 indexed' in result.stdout
+    assert 'docs/s' in result.stderr, 'Progress should be reported.'
+    assert 'ETA' in result.stderr or '100%' in result.stderr
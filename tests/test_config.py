@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, fields, replace
+import os
 from pathlib import Path
 from typing import Tuple, Type
 import pytest
 from unittest import mock
-from elastalk.config import _Defaults, ElastalkConf, IndexConf, BlobConf
+from elastalk.config import (
+    _Defaults, _Revisions, ElastalkConf, IndexConf, BlobConf, BlobPlan, CacheConf
+)
 
 
 def get_config(set_: str, name: str = 'config.toml') -> Tuple[Path, str]:
@@ -50,6 +55,16 @@ def test_elastalk_conf_defaults():
         'The maximum number of connections should be 10 by default.'
     assert esc.mapping_field_limit == 1000, \
         'The mapping field limit should be 1000 by default.'
+    assert esc.bulk_chunk_size == 500, \
+        'Bulk requests should contain 500 documents by default.'
+    assert esc.bulk_threads == 4, \
+        'Four bulk requests should be in flight by default.'
+    assert esc.timeout == 10, \
+        'The request timeout should be 10 seconds by default.'
+    assert esc.http_compress is False, \
+        'HTTP compression should be disabled by default.'
+    assert esc.keep_alive is True, \
+        'Connections should be kept alive by default.'
     assert esc.blobs == BlobConf(), \
         'Blobbing configuration should be default.'
     assert esc.indexes == {}, \
@@ -133,6 +148,9 @@ def test_config_from_toml_001():
             '`sniff_on_start` should match the value in the configuration file.'
         assert config.maxsize == 200, \
             '`maxsize` should match the value in the configuration file.'
+        assert config.bulk_chunk_size == 250, \
+            '`bulk_chunk_size` should match the value in the configuration ' \
+            'file.'
 
         # Assert: global blobbing
         assert config.blobs.enabled is True, \
@@ -296,3 +314,251 @@ def test_elastalk_conf_eq_neq():
     one = ElastalkConf()
     two = ElastalkConf()
     assert one != two, "The objects should not be equal."
+
+
+def test_elastalk_conf_blob_plan():
+    """
+    Arrange: Create an `ElastalkConf` with global and index blob settings.
+    Act: Retrieve the blob plan for the index twice.
+    Assert: The plan reflects the configuration and is only compiled once.
+    """
+    es_cfg = ElastalkConf(blobs=BlobConf(enabled=True, excluded={'a'}))
+    es_cfg.indexes['test'] = IndexConf(
+        blobs=BlobConf(excluded={'b'}, key='_test', compression='zlib')
+    )
+    plan = es_cfg.blob_plan(index='test')
+    assert plan == BlobPlan(
+        enabled=True,
+        key='_test',
+        exclusions=frozenset({'a', 'b'}),
+        compression='zlib'
+    ), 'The plan should combine the global and index configurations.'
+    assert es_cfg.blob_plan(index='test') is plan, \
+        'The plan should be reused.'
+    with pytest.raises(AttributeError):
+        plan.enabled = False
+
+
+def test_elastalk_conf_blob_plan_exclude_invalidates():
+    """
+    Arrange: Create an `ElastalkConf` and compile a blob plan.
+    Act: Exclude another key from the index blob configuration.
+    Assert: The next plan includes the new exclusion.
+    """
+    es_cfg = ElastalkConf(blobs=BlobConf(enabled=True, excluded={'a'}))
+    es_cfg.indexes['test'] = IndexConf(blobs=BlobConf(excluded={'b'}))
+    assert es_cfg.blob_exclusions(index='test') == {'a', 'b'}
+    es_cfg.indexes['test'].blobs.exclude('c')
+    assert es_cfg.blob_exclusions(index='test') == {'a', 'b', 'c'}, \
+        'Exclusions added after the plan was compiled should be honored.'
+
+
+def test_elastalk_conf_blob_plan_not_a_field():
+    """
+    Arrange: Create an `ElastalkConf` and compile a blob plan.
+    Act: Convert the configuration to a dictionary and replace a field.
+    Assert: The compiled plans aren't fields, so they aren't in the
+        dictionary or carried over to the replacement.
+    """
+    es_cfg = ElastalkConf(blobs=BlobConf(enabled=True))
+    assert es_cfg.blobs_enabled()
+    assert not any(f.name.startswith('_') for f in fields(es_cfg))
+    assert not any(key.startswith('_') for key in asdict(es_cfg))
+    replaced = replace(es_cfg, blobs=BlobConf(enabled=False))
+    assert not replaced.blobs_enabled(), \
+        'The replacement should compile its own plans.'
+
+
+def test_elastalk_conf_revisions_threads():
+    """
+    Arrange: Note the current blob configuration revision.
+    Act: Exclude keys from a blob configuration on many threads at once.
+    Assert: Every change is counted.
+    """
+    blobs = BlobConf()
+    revision = _Revisions.current
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(blobs.exclude, (str(n) for n in range(1000))))
+    assert _Revisions.current == revision + 1000
+
+
+def test_elastalk_conf_blob_plan_from_toml_invalidates():
+    """
+    Arrange: Create an `ElastalkConf` and compile a blob plan.
+    Act: Update the configuration from TOML.
+    Assert: The next plan reflects the new configuration.
+    """
+    es_cfg = ElastalkConf()
+    assert not es_cfg.blobs_enabled(index='dogs')
+    es_cfg.from_toml(toml_=get_config('001')[0])
+    assert es_cfg.blobs_enabled(index='dogs'), \
+        'Blob plans should be recompiled after loading a configuration.'
+
+
+def test_elastalk_conf_invalidate():
+    """
+    Arrange: Create an `ElastalkConf` and compile a blob plan.
+    Act: Replace the index configuration directly, then call `invalidate()`.
+    Assert: The next plan reflects the new configuration.
+    """
+    es_cfg = ElastalkConf()
+    assert not es_cfg.blobs_enabled(index='test')
+    es_cfg.indexes['test'] = IndexConf(blobs=BlobConf(enabled=True))
+    es_cfg.invalidate()
+    assert es_cfg.blobs_enabled(index='test')
+
+
+def test_elastalk_conf_from_dict():
+    """
+    Arrange: Create a configuration dictionary with seeds and an index that
+        names a cluster.
+    Act: Load it.
+    Assert: The seeds and the index's cluster are loaded.
+    """
+    etconf = ElastalkConf().from_dict({
+        'seeds': ['es01', 'es02'],
+        'indexes': {'history': {'cluster': 'warm'}}
+    })
+    assert etconf.seeds == ['es01', 'es02']
+    assert etconf.indexes['history'].cluster == 'warm'
+
+
+def test_elastalk_conf_cluster_for():
+    """
+    Arrange: Configure indexes with a cluster, and with separate read and
+        write clusters.
+    Act: Ask which cluster serves reads and writes for each index.
+    Assert: Read and write clusters take precedence over the index's cluster.
+    """
+    etconf = ElastalkConf().from_dict({
+        'indexes': {
+            'history': {'cluster': 'warm'},
+            'events': {
+                'cluster': 'hot',
+                'read_cluster': 'replica'
+            }
+        }
+    })
+    assert etconf.cluster_for('history') == 'warm'
+    assert etconf.cluster_for('history', write=True) == 'warm'
+    assert etconf.cluster_for('events') == 'replica'
+    assert etconf.cluster_for('events', write=True) == 'hot'
+    assert etconf.cluster_for('cats') is None
+
+
+def test_elastalk_conf_transport_from_toml():
+    """
+    Arrange: Create a TOML configuration with transport options.
+    Act: Load it.
+    Assert: The transport options are loaded.
+    """
+    etconf = ElastalkConf().from_toml(
+        "timeout = 30.5\n"
+        "max_retries = 5\n"
+        "retry_on_timeout = true\n"
+        "retry_on_status = [503]\n"
+        "http_compress = true\n"
+        "connection_class = 'requests'\n"
+        "keep_alive = false\n"
+    )
+    assert etconf.timeout == 30.5
+    assert etconf.max_retries == 5
+    assert etconf.retry_on_timeout is True
+    assert etconf.retry_on_status == [503]
+    assert etconf.http_compress is True
+    assert etconf.connection_class == 'requests'
+    assert etconf.keep_alive is False
+
+
+class _TransportConfig:
+    """
+    A configuration object (for `from_object`).
+    """
+    ES_HOSTS = 'es01, es02'
+    ES_SNIFF_ON_START = False
+    ES_TIMEOUT = 20
+    ES_MAX_RETRIES = 1
+    ES_HTTP_COMPRESS = True
+    ES_CONNECTION_CLASS = 'urllib3'
+    ES_INDEXES = {'history': {'cluster': 'warm'}}
+
+
+def test_elastalk_conf_transport_from_object():
+    """
+    Arrange: Define a configuration object with transport options.
+    Act: Load it.
+    Assert: The transport options (and the rest of the object) are loaded.
+    """
+    etconf = ElastalkConf().from_object(f'{__name__}._TransportConfig')
+    assert etconf.seeds == ['es01', 'es02']
+    assert etconf.sniff_on_start is False
+    assert etconf.timeout == 20.0
+    assert etconf.max_retries == 1
+    assert etconf.http_compress is True
+    assert etconf.connection_class == 'urllib3'
+    assert etconf.indexes['history'].cluster == 'warm'
+
+
+def test_elastalk_conf_cache_conf():
+    """
+    Arrange: Configure global caching and override part of it for an index.
+    Act: Get the caching configuration for the index and another index.
+    Assert: Index values take precedence and the rest come from the global
+        configuration (or the defaults).
+    """
+    etconf = ElastalkConf().from_dict({
+        'cache': {'ttl': 30, 'size': 10},
+        'indexes': {'cats': {'cache': {'enabled': True, 'stale': 5}}}
+    })
+    assert etconf.cache_conf('cats') == CacheConf(
+        enabled=True, size=10, ttl=30, stale=5
+    )
+    assert etconf.cache_conf('dogs') == CacheConf(
+        enabled=False, size=10, ttl=30, stale=0
+    )
+
+
+def test_index_conf_mappings_document_cached(tmp_path: Path):
+    """
+    Arrange: Write a mappings document.
+    Act: Read it twice, modify it, then read it again.
+    Assert: The file is only parsed again after it changes.
+    """
+    path = tmp_path / 'mappings.json'
+    path.write_text('{"mappings": {"_doc": {}}}')
+    idxconf = IndexConf(mappings='mappings.json')
+    first = idxconf.mappings_document(root=tmp_path)
+    assert idxconf.mappings_document(root=tmp_path) is first
+    path.write_text('{"mappings": {"cat": {}}}')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert idxconf.mappings_document(root=tmp_path) == {
+        'mappings': {'cat': {}}
+    }
+
+
+def test_elastalk_conf_index_body(tmp_path: Path):
+    """
+    Arrange: Configure an index with a mappings document and settings.
+    Act: Get the body of the request that creates the index.
+    Assert: The body contains the mappings and the combined settings.
+    """
+    (tmp_path / 'mappings.json').write_text(
+        '{"mappings": {"_doc": {}}, "settings": {"number_of_replicas": 2}}'
+    )
+    etconf = ElastalkConf(mapping_field_limit=50).from_dict({
+        'indexes': {
+            'cats': {
+                'mappings': 'mappings.json',
+                'settings': {'number_of_shards': 1}
+            }
+        }
+    })
+    assert etconf.index_body('cats', root=tmp_path) == {
+        'mappings': {'_doc': {}},
+        'settings': {
+            'index.mapping.total_fields.limit': 50,
+            'number_of_replicas': 2,
+            'number_of_shards': 1
+        }
+    }
@@ -1,12 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import base64
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+import json
+import pickle
+import time
 from unittest import mock
 import uuid
+import elasticsearch
 import pytest
 from elastalk.connect import (
+    ConnectionRegistry,
     ElastalkConnection,
-    ElastalkMixin
+    ElastalkMixin,
+    _decode,
+    _encode
 )
 from elastalk.config import (
     BlobConf,
@@ -216,3 +226,413 @@ def test_es_mixin_setters():
     mixin.es_cnx = cnx
     assert isinstance(mixin.es, mock.MagicMock)
     assert mixin.es_cnx is cnx
+
+
+def _legacy_encode(doc: dict) -> str:
+    """
+    Encode a document the way blobs were encoded before the blob format was
+    versioned (base64-encoded twice).
+
+    :param doc: the document
+    :return: the legacy blob string
+    """
+    enc_bytes = base64.b64encode(bytes(json.dumps(doc), 'utf-8'))
+    return binascii.b2a_base64(enc_bytes, newline=False).decode('utf-8')
+
+
+def test_decode_legacy_blob():
+    """
+    Arrange: Encode a document using the legacy (double base64) format.
+    Act: Decode the blob.
+    Assert: The decoded document matches the original.
+    """
+    original = {'a': str(uuid.uuid4()), 'b': [1, 2, 3]}
+    assert _decode(_legacy_encode(original)) == original, \
+        'Legacy blobs should still be readable.'
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib', 'lz4'])
+def test_encode_decode(compression: str):
+    """
+    Arrange: Create a document.
+    Act: Encode, then decode, the document.
+    Assert: The decoded document matches the original and the blob is smaller
+        than a legacy blob.
+
+    :param compression: the compression scheme
+    """
+    if compression == 'lz4':
+        pytest.importorskip('lz4.frame')
+    original = {'a': str(uuid.uuid4()), 'b': 'meow ' * 100}
+    encoded = _encode(original, compression=compression)
+    assert base64.b64decode(encoded, validate=True).startswith(b'\x00ET\x01'), \
+        'The blob should be valid base64 that starts with the version header.'
+    assert len(encoded) < len(_legacy_encode(original)), \
+        'The blob should be smaller than a legacy blob.'
+    assert _decode(encoded) == original, \
+        'The decoded document should match the original.'
+    assert _decode(encoded.encode('ascii')) == original, \
+        'Blobs should also be decoded from bytes.'
+
+
+def test_encode_unsupported_compression():
+    """
+    Arrange/Act: Encode a document with an unknown compression scheme.
+    Assert: An `ElastalkConfigException` is raised.
+    """
+    with pytest.raises(ElastalkConfigException):
+        _encode({'a': 1}, compression='nope')
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_client_pack_unpack_compressed():
+    """
+    Arrange: Configure zlib blob compression for an index.
+    Act: Pack, then unpack, a document.
+    Assert: The blob is compressed and the unpacked document matches the
+        original.
+    """
+    es_cfg = ElastalkConf(blobs=BlobConf(enabled=True))
+    es_cfg.indexes['test'] = IndexConf(blobs=BlobConf(compression='zlib'))
+    es_cnx = ElastalkConnection(config=es_cfg)
+    original = {'a': 'purr ' * 100}
+    packed = es_cnx.pack(doc=original, index='test')
+    assert base64.b64decode(packed['_blob']).startswith(b'\x00ET\x01\x01'), \
+        'The blob should be compressed using the index configuration.'
+    assert es_cnx.unpack(packed, index='test') == original, \
+        'The unpacked document should match the original.'
+
+
+@pytest.mark.parametrize(
+    'blobs_enabled, workers, threshold', [
+        (True, None, 1000),
+        (True, 2, 4),
+        (False, None, 1000)
+    ]
+)
+def test_pack_many_unpack_many(
+        blobs_enabled: bool,
+        workers: int,
+        threshold: int
+):
+    """
+    Arrange: Create a connection and a batch of documents.
+    Act: Pack, then unpack, the documents in bulk.
+    Assert: The results match packing and unpacking each document on its own.
+
+    :param blobs_enabled: whether or not blobbing is enabled
+    :param workers: the number of worker processes
+    :param threshold: the worker batch size
+    """
+    es_cfg = ElastalkConf(blobs=BlobConf(enabled=blobs_enabled, excluded={'a'}))
+    es_cnx = ElastalkConnection(config=es_cfg)
+    originals = [
+        {'a': str(uuid.uuid4()), 'b': i, 'c': str(uuid.uuid4())}
+        for i in range(10)
+    ]
+    packed = list(
+        es_cnx.pack_many(
+            iter(originals), index='test', workers=workers, threshold=threshold
+        )
+    )
+    assert packed == [es_cnx.pack(doc, index='test') for doc in originals], \
+        'Packing in bulk should match packing individually.'
+    unpacked = list(
+        es_cnx.unpack_many(
+            iter(packed), index='test', workers=workers, threshold=threshold
+        )
+    )
+    assert unpacked == originals, \
+        'The unpacked documents should match the originals.'
+
+
+def test_pack_many_reuses_workers():
+    """
+    Arrange: Create a connection that blobs documents.
+    Act: Pack documents with one worker, then a few documents with two
+        workers, then (twice) more documents with two workers, then reset the
+        connection.
+    Assert: One worker runs in the calling thread, the worker processes
+        aren't created until a batch is full, they're created once and
+        reused, and they're shut down when the connection is reset.
+    """
+    es_cnx = ElastalkConnection(
+        config=ElastalkConf(blobs=BlobConf(enabled=True))
+    )
+    docs = [{'n': i} for i in range(10)]
+    executor = mock.MagicMock()
+    with mock.patch(
+            'elastalk.connect.ProcessPoolExecutor', return_value=executor
+    ) as executor_cls:
+        list(es_cnx.pack_many(docs, index='test', workers=1, threshold=4))
+        list(es_cnx.pack_many(docs[:3], index='test', workers=2, threshold=4))
+        executor_cls.assert_not_called()
+        executor.map.side_effect = lambda fn, batch, **kwargs: map(fn, batch)
+        for _ in range(2):
+            list(es_cnx.pack_many(docs, index='test', workers=2, threshold=4))
+        executor_cls.assert_called_once_with(max_workers=2)
+        assert executor.map.call_count == 4, \
+            'Full batches should be handed to the workers.'
+        es_cnx.reset()
+    executor.shutdown.assert_called_once_with(wait=False)
+
+
+def test_pack_many_executor():
+    """
+    Arrange: Create a connection that blobs documents, and an executor.
+    Act: Pack, then unpack, documents using the executor.
+    Assert: The results match packing and unpacking each document on its own.
+    """
+    es_cnx = ElastalkConnection(
+        config=ElastalkConf(blobs=BlobConf(enabled=True, excluded={'n'}))
+    )
+    originals = [{'n': i, 'name': f'cat {i}'} for i in range(10)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        packed = list(
+            es_cnx.pack_many(
+                originals, index='test', threshold=3, executor=executor
+            )
+        )
+        assert packed == [es_cnx.pack(doc, index='test') for doc in originals]
+        assert list(
+            es_cnx.unpack_many(
+                packed, index='test', threshold=3, executor=executor
+            )
+        ) == originals
+
+
+def test_client_created_once_across_threads():
+    """
+    Arrange: Create a connection whose client is slow to create.
+    Act: Retrieve the client from several threads at once.
+    Assert: Only one client is created.
+    """
+    created = []
+
+    def _create(*args, **kwargs):
+        time.sleep(0.05)
+        client = mock.MagicMock()
+        created.append(client)
+        return client
+
+    es_cnx = ElastalkConnection(config=ElastalkConf())
+    with mock.patch('elasticsearch.Elasticsearch', _create):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(
+                executor.map(lambda _: es_cnx.client, range(8))
+            )
+    assert len(created) == 1, 'Only one client should be created.'
+    assert all(c is created[0] for c in clients)
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_client_rebuilt_after_fork():
+    """
+    Arrange: Create a connection and retrieve the client.
+    Act: Simulate a fork by changing the process ID, then retrieve the client
+        again.
+    Assert: A new client is created and the inherited one is not closed.
+    """
+    es_cnx = ElastalkConnection(config=ElastalkConf())
+    es1 = es_cnx.client
+    with mock.patch('os.getpid', lambda: -1):
+        es2 = es_cnx.client
+        assert es_cnx.client is es2
+    assert es2 is not es1, 'A new client should be created after a fork.'
+    es1.transport.close.assert_not_called()
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_reset_closes_transport():
+    """
+    Arrange: Create a connection and retrieve the client.
+    Act: Reset the connection.
+    Assert: The client's transport is closed.
+    """
+    es_cnx = ElastalkConnection(config=ElastalkConf())
+    es = es_cnx.client
+    es_cnx.reset()
+    es.transport.close.assert_called_once()
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_pickle_drops_client():
+    """
+    Arrange: Create a connection and retrieve the client.
+    Act: Pickle, then unpickle, the connection.
+    Assert: The copy keeps the configuration but not the client.
+    """
+    es_cnx = ElastalkConnection(config=ElastalkConf(maxsize=3))
+    _ = es_cnx.client
+    copy = pickle.loads(pickle.dumps(es_cnx))
+    assert copy.config.maxsize == 3
+    assert copy._client is None
+
+
+_CLUSTERS_TOML = """
+seeds = ['hot01']
+maxsize = 7
+
+[clusters.warm]
+seeds = ['warm01']
+
+[indexes.history]
+cluster = 'warm'
+"""
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_registry_from_toml():
+    """
+    Arrange: Create a registry from a TOML configuration with a cluster
+        section.
+    Act: Get the connections for the clusters and indexes.
+    Assert: Cluster sections inherit top-level options, indexes are routed to
+        their clusters and each cluster shares one client.
+    """
+    registry = ConnectionRegistry.from_toml(_CLUSTERS_TOML)
+    assert sorted(registry.names) == ['default', 'warm']
+    assert registry.get().config.seeds == ['hot01']
+    warm = registry.get('warm')
+    assert warm.config.seeds == ['warm01']
+    assert warm.config.maxsize == 7
+    assert registry.for_index('history') is warm
+    assert registry.for_index('cats') is registry.get()
+    assert warm.client is registry.for_index('history').client
+
+
+def test_registry_unknown_cluster():
+    """
+    Arrange: Create an empty registry.
+    Act: Get a cluster that isn't registered, and the default cluster.
+    Assert: The unknown cluster raises an exception and the default cluster
+        falls back to the default connection.
+    """
+    registry = ConnectionRegistry()
+    with pytest.raises(ElastalkConfigException):
+        registry.get('nope')
+    assert registry.get() is ElastalkConnection.default()
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_registry_close_idle():
+    """
+    Arrange: Register two clusters and retrieve both clients.
+    Act: Make one of them look idle, then close idle clients.
+    Assert: Only the idle client is closed.
+    """
+    registry = ConnectionRegistry()
+    busy = registry.register('busy', ElastalkConf())
+    idle = registry.register('idle', ElastalkConf())
+    busy_es, idle_es = busy.client, idle.client
+    idle.last_used -= 60
+    assert registry.close_idle(30) == ['idle']
+    idle_es.transport.close.assert_called_once()
+    busy_es.transport.close.assert_not_called()
+    assert not idle.connected and busy.connected
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_es_mixin_cluster():
+    """
+    Arrange: Make a registry the default and define a mixin class that names
+        a cluster.
+    Act: Get connections from instances of the class.
+    Assert: The instances share the registered connection, and indexes are
+        routed to their clusters.
+    """
+    previous = ConnectionRegistry.default()
+    registry = ConnectionRegistry.default(
+        ConnectionRegistry.from_toml(_CLUSTERS_TOML)
+    )
+    try:
+        class Warm(ElastalkMixin):
+            elastalk_cluster = 'warm'
+
+        assert Warm().es_cnx is registry.get('warm')
+        assert Warm().es is Warm().es
+        mixin = ElastalkMixin()
+        assert mixin.es_cnx_for('history') is registry.get('warm')
+        assert mixin.es_cnx_for('cats') is mixin.es_cnx
+    finally:
+        ConnectionRegistry.default(previous)
+
+
+@mock.patch(
+    'elasticsearch.Elasticsearch',
+    lambda *args, **kwargs: mock.MagicMock()
+)
+def test_connection_for_index_read_write():
+    """
+    Arrange: Create a registry that routes reads from an index to a replica
+        cluster.
+    Act: Ask a registered connection for the index's read and write
+        connections.
+    Assert: Reads go to the replica and writes stay on the default cluster.
+    """
+    registry = ConnectionRegistry.from_toml(
+        _CLUSTERS_TOML + "\n[indexes.events]\nread_cluster = 'warm'\n"
+    )
+    default = registry.get()
+    assert default.for_index('events') is registry.get('warm')
+    assert default.for_index('events', write=True) is default
+    assert registry.for_index('events', write=True) is default
+    assert default.for_index('cats') is default
+
+
+def test_client_kwargs_transport():
+    """
+    Arrange: Create a connection with transport options.
+    Act: Get the keyword arguments for the client.
+    Assert: The transport options are passed along.
+    """
+    es_cnx = ElastalkConnection(
+        config=ElastalkConf(
+            timeout=30,
+            max_retries=5,
+            retry_on_timeout=True,
+            http_compress=True,
+            connection_class='requests',
+            keep_alive=False
+        )
+    )
+    kwargs = es_cnx._client_kwargs()
+    assert kwargs['timeout'] == 30
+    assert kwargs['max_retries'] == 5
+    assert kwargs['retry_on_timeout'] is True
+    assert kwargs['retry_on_status'] == (502, 503, 504)
+    assert kwargs['http_compress'] is True
+    assert kwargs['connection_class'] is elasticsearch.RequestsHttpConnection
+    assert kwargs['headers'] == {'connection': 'close'}
+
+
+def test_client_kwargs_unknown_connection_class():
+    """
+    Arrange: Create a connection with an unknown connection class.
+    Act: Get the keyword arguments for the client.
+    Assert: A configuration exception is raised.
+    """
+    es_cnx = ElastalkConnection(config=ElastalkConf(connection_class='nope'))
+    with pytest.raises(ElastalkConfigException):
+        es_cnx._client_kwargs()
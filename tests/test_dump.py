@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import gzip
+import json
+from pathlib import Path
+from unittest import mock
+from click.testing import CliRunner, Result
+import pytest
+import elastalk.cli as cli
+from elastalk.config import ElastalkConf
+from elastalk.connect import ElastalkConnection
+from elastalk.dump import dump
+from elastalk.seed import _lines, iter_seed_files
+
+_IDS = [f'{i:08d}-0000-0000-0000-000000000000' for i in range(7)]
+
+
+def _client(pages: int = 2) -> mock.MagicMock:
+    """
+    Create a stand-in Elasticsearch client that returns the test documents
+    (a page at a time) for every slice.
+
+    :param pages: the number of pages
+    :return: the client
+    """
+    client = mock.MagicMock()
+    hits = [
+        {
+            '_id': id_,
+            '_type': 'cat',
+            '_source': {'name': f'cat {i}'}
+        }
+        for i, id_ in enumerate(_IDS)
+    ]
+    per_page = -(-len(hits) // pages)
+
+    def _page(number: int):
+        return {
+            '_scroll_id': str(number),
+            'hits': {
+                'hits': hits[number * per_page:(number + 1) * per_page]
+            }
+        }
+
+    client.search.side_effect = lambda **kwargs: _page(0)
+    client.scroll.side_effect = lambda scroll_id, **kwargs: _page(
+        int(scroll_id) + 1
+    )
+    return client
+
+
+@pytest.mark.parametrize('compression', [None, 'gz'])
+def test_dump_ndjson(tmp_path: Path, compression: str):
+    """
+    Arrange: Create a client that returns some documents.
+    Act: Dump the index as (compressed) NDJSON with a pool of unpackers.
+    Assert: Every document is written where the seed function will find it.
+
+    :param tmp_path: a temporary directory
+    :param compression: the compression format
+    """
+    client = _client()
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        counts = dump(
+            ElastalkConnection(ElastalkConf(maxsize=1)),
+            indexes=['cats'],
+            path=tmp_path,
+            compression=compression,
+            size=2,
+            workers=2
+        )
+    assert counts == {'cats': len(_IDS)}
+    files = list(iter_seed_files(tmp_path))
+    assert [(i, d) for i, d, _ in files] == [('cats', 'cat')]
+    assert files[0][2].name == (
+        f'cats.0.ndjson.{compression}' if compression else 'cats.0.ndjson'
+    )
+    docs = [json.loads(line) for line in _lines(files[0][2])]
+    assert [d['_id'] for d in docs] == _IDS, \
+        'Documents should be written in order with their IDs.'
+    assert docs[0] == {'_id': _IDS[0], 'name': 'cat 0'}
+
+
+def test_dump_files(tmp_path: Path):
+    """
+    Arrange: Create a client that returns some documents.
+    Act: Dump the index as one file per document.
+    Assert: Each document is written to a file named for its ID.
+
+    :param tmp_path: a temporary directory
+    """
+    client = _client()
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        counts = dump(
+            ElastalkConnection(ElastalkConf(maxsize=1)),
+            indexes=['cats'],
+            path=tmp_path,
+            layout='files'
+        )
+    assert counts == {'cats': len(_IDS)}
+    catdir = tmp_path / 'indexes' / 'cats' / 'cat'
+    assert sorted(p.name for p in catdir.iterdir()) == _IDS
+    assert json.loads((catdir / _IDS[1]).read_text()) == {'name': 'cat 1'}
+
+
+def test_dump_bad_compression(tmp_path: Path):
+    """
+    Arrange/Act: Dump one file per document with compression.
+    Assert: A `ValueError` is raised.
+
+    :param tmp_path: a temporary directory
+    """
+    with pytest.raises(ValueError):
+        dump(
+            ElastalkConnection(ElastalkConf()),
+            indexes=['cats'],
+            path=tmp_path,
+            layout='files',
+            compression='gz'
+        )
+
+
+def test_dump_cli(tmp_path: Path):
+    """
+    Arrange: Create a client that returns some documents.
+    Act: Run the `dump` subcommand.
+    Assert: The documents are written and counted.
+
+    :param tmp_path: a temporary directory
+    """
+    client = _client()
+    config = tmp_path / 'config.toml'
+    config.write_text('maxsize = 1\n')
+    runner: CliRunner = CliRunner()
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        result: Result = runner.invoke(
+            cli.cli,
+            [
+                'dump', 'cats',
+                '--output', str(tmp_path / 'out'),
+                '--config', str(config),
+                '--compression', 'gz'
+            ]
+        )
+    assert result.exit_code == 0, result.output
+    assert 'cats: 7 documents' in result.output
+    out = tmp_path / 'out' / 'indexes' / 'cats' / 'cat' / 'cats.0.ndjson.gz'
+    assert len(gzip.decompress(out.read_bytes()).splitlines()) == len(_IDS)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+from pathlib import Path
+import time
+from typing import Iterator
+from unittest import mock
+import uuid
+from click.testing import CliRunner, Result
+import elasticsearch
+import pytest
+import elastalk.cli as cli
+from elastalk.config import ElastalkConf
+from elastalk.connect import ElastalkConnection
+from elastalk.fake import FakeElasticsearch
+from elastalk.reindex import reindex
+from elastalk.search import iter_documents
+from elastalk.seed import seed
+
+_IDS = [str(uuid.UUID(int=i)) for i in range(25)]
+
+
+@pytest.fixture(name='fake')
+def fake_fixture() -> Iterator[FakeElasticsearch]:
+    """
+    This fixture runs a fake Elasticsearch server.
+
+    :return: the server
+    """
+    with FakeElasticsearch() as fake:
+        yield fake
+
+
+def _client(fake: FakeElasticsearch, **kwargs) -> elasticsearch.Elasticsearch:
+    """
+    Create a client for the fake server.
+
+    :param fake: the fake server
+    :param kwargs: more client arguments
+    :return: the client
+    """
+    return elasticsearch.Elasticsearch(fake.seeds, **kwargs)
+
+
+def _bulk_body(index: str, ids=_IDS) -> str:
+    """
+    Create the body of a bulk request that indexes a document for each ID.
+
+    :param index: the name of the index
+    :param ids: the document IDs
+    :return: the request body
+    """
+    return ''.join(
+        json.dumps({'index': {'_index': index, '_type': 'cat', '_id': id_}})
+        + '\n' + json.dumps({'name': f'cat {n}', 'n': n}) + '\n'
+        for n, id_ in enumerate(ids)
+    )
+
+
+def test_fake_indexes(fake: FakeElasticsearch):
+    """
+    Arrange: Create a client that sniffs the fake server.
+    Act: Create, check for, update and delete an index.
+    Assert: The server behaves like a (very small) cluster.
+
+    :param fake: the fake server
+    """
+    es = _client(fake, sniff_on_start=True)
+    assert es.cluster.health()['status'] == 'green'
+    assert not es.indices.exists(index='cats')
+    es.indices.create(index='cats', body={'settings': {'number_of_shards': 1}})
+    assert es.indices.exists(index='cats')
+    with pytest.raises(elasticsearch.RequestError):
+        es.indices.create(index='cats')
+    es.indices.put_settings(index='cats', body={'index': {'refresh_interval': '-1'}})
+    settings = es.indices.get_settings(index='cats', flat_settings=True)
+    assert settings['cats']['settings']['index.number_of_shards'] == '1'
+    assert settings['cats']['settings']['index.refresh_interval'] == '-1'
+    es.indices.delete(index='cats')
+    assert not es.indices.exists(index='cats')
+
+
+def test_fake_documents(fake: FakeElasticsearch):
+    """
+    Arrange: Create a client.
+    Act: Write documents (in bulk and one at a time) and page through them.
+    Assert: The documents are stored and returned in order.
+
+    :param fake: the fake server
+    """
+    es = _client(fake)
+    resp = es.bulk(body=_bulk_body('cats'))
+    assert not resp['errors']
+    assert len(fake.documents('cats')) == len(_IDS)
+    es.index(index='cats', doc_type='cat', id='garfield', body={'n': 99})
+    assert es.get(index='cats', doc_type='cat', id='garfield')['_source'] == {
+        'n': 99
+    }
+    hits = es.search(
+        index='cats', body={'query': {'term': {'name': 'cat 3'}}}
+    )['hits']['hits']
+    assert [hit['_id'] for hit in hits] == [_IDS[3]]
+    cnx = ElastalkConnection(ElastalkConf(seeds=fake.seeds))
+    # Page through with search_after...
+    after = [doc['_id'] for doc in iter_documents(
+        cnx, 'cats', size=4, sort=[{'n': 'desc'}], uuids=False
+    )]
+    assert after == ['garfield'] + _IDS[::-1]
+    # ...and with a scroll.
+    scrolled = [doc['_id'] for doc in iter_documents(
+        cnx, 'cats', size=4, uuids=False
+    )]
+    assert sorted(scrolled) == sorted(after)
+    assert fake.stats.read >= 2 * len(after)
+
+
+def test_fake_seed_and_reindex(tmp_path: Path):
+    """
+    Arrange: Create a fake server that rejects some bulk items (and fails
+        some requests) with a `429`.
+    Act: Seed an index and reindex it.
+    Assert: The retries get every document where it belongs.
+
+    :param tmp_path: a temporary directory
+    """
+    (tmp_path / 'config.toml').write_text('')
+    catdir = tmp_path / 'indexes' / 'cats' / 'cat'
+    catdir.mkdir(parents=True)
+    (catdir / 'cats.ndjson').write_text(''.join(
+        json.dumps({'_id': id_, 'name': f'cat {n}'}) + '\n'
+        for n, id_ in enumerate(_IDS)
+    ))
+    with FakeElasticsearch(
+            rejection_rate=0.3,
+            error_rate=0.5,
+            error_statuses=(429,),
+            seed=7
+    ) as fake:
+        options = {
+            'seeds': ','.join(fake.seeds),
+            'bulk_chunk_size': 2,
+            'bulk_max_retries': 20,
+            'bulk_initial_backoff': 0
+        }
+        stats = seed(root=tmp_path, options=options)
+        assert stats['cats'].indexed == len(_IDS)
+        assert sorted(fake.documents('cats')) == _IDS
+        assert fake.stats.rejected and fake.stats.errors, \
+            'Some items (and requests) should have been rejected.'
+        # Searches aren't retried, so let's not fail them.
+        fake.error_rate = 0
+        result = reindex(
+            ElastalkConnection(ElastalkConf().from_dict(options)),
+            source='cats',
+            target='kats',
+            size=10
+        )
+        assert result.indexed == len(_IDS)
+        assert fake.documents('kats') == fake.documents('cats')
+
+
+def test_fake_errors():
+    """
+    Arrange: Create a fake server that fails every request with a `503`.
+    Act: Send a bulk request (without retries).
+    Assert: The client sees the `503`.
+    """
+    with FakeElasticsearch(error_rate=1, error_statuses=(503,)) as fake:
+        es = _client(fake, max_retries=0)
+        with pytest.raises(elasticsearch.TransportError) as info:
+            es.bulk(body=_bulk_body('cats'))
+        assert info.value.status_code == 503
+        assert fake.stats.errors == 1
+        assert es.indices.exists(index='cats') is False, \
+            'Only bulk, document and search requests should fail.'
+
+
+def test_fake_latency_and_throughput():
+    """
+    Arrange: Create a fake server with latency and a throughput cap.
+    Act: Send some bulk requests.
+    Assert: The requests take as long as they should.
+    """
+    with FakeElasticsearch(latency=0.05, max_docs_per_second=250) as fake:
+        es = _client(fake)
+        started = time.perf_counter()
+        es.bulk(body=_bulk_body('cats'))
+        es.bulk(body=_bulk_body('cats'))
+        elapsed = time.perf_counter() - started
+    # 2 x 50ms of latency, and 50 documents at 250 documents per second.
+    assert elapsed >= 0.3
+
+
+def test_fake_cli():
+    """
+    Arrange: Make the server stop as soon as it starts.
+    Act: Run the `fake` subcommand.
+    Assert: The server's address and statistics are reported.
+    """
+    runner: CliRunner = CliRunner()
+    with mock.patch.object(
+            FakeElasticsearch, 'serve_forever', side_effect=KeyboardInterrupt
+    ):
+        result: Result = runner.invoke(
+            cli.cli, ['fake', '--port', '0', '--error-status', '503']
+        )
+    assert result.exit_code == 0, result.output
+    assert 'Serving a fake Elasticsearch at 127.0.0.1:' in result.output
+    assert '0 requests' in result.output
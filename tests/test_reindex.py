@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+from pathlib import Path
+from unittest import mock
+import pytest
+from elastalk.config import ElastalkConf
+from elastalk.connect import ElastalkConnection
+from elastalk.reindex import ReindexStats, _throttled, _Watermark, reindex
+
+_IDS = [f'{i:02d}' for i in range(10)]
+
+
+class _Client:
+    """
+    A stand-in Elasticsearch client that pages through the source documents
+    (with `search_after`) and records the documents it's asked to index.
+    """
+    def __init__(self):
+        self.searches = []
+        self.indexed = {}
+
+    def search(self, index: str, body: dict):
+        self.searches.append(dict(body))
+        after = body.get('search_after', [''])[0]
+        ids = [id_ for id_ in _IDS if id_ > after][:body['size']]
+        return {
+            'hits': {
+                'hits': [
+                    {
+                        '_id': id_,
+                        '_type': 'cat',
+                        '_source': {'name': f'cat {id_}'},
+                        'sort': [id_]
+                    }
+                    for id_ in ids
+                ]
+            }
+        }
+
+    def bulk(self, body: bytes):
+        lines = body.splitlines()
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            meta = json.loads(action)['index']
+            self.indexed[meta['_id']] = (meta['_index'], json.loads(source))
+            items.append({'index': {'status': 201}})
+        return {'items': items}
+
+
+def _cnx() -> ElastalkConnection:
+    """
+    Create a connection that sends small bulk requests one at a time.
+
+    :return: the connection
+    """
+    return ElastalkConnection(
+        ElastalkConf(bulk_chunk_size=2, bulk_threads=1, bulk_initial_backoff=0)
+    )
+
+
+def test_reindex_transform():
+    """
+    Arrange: Create a client with some source documents.
+    Act: Reindex them with a transform that changes some and drops one.
+    Assert: The transformed documents are written to the target index.
+    """
+    client = _Client()
+
+    def _transform(doc: dict):
+        if doc['name'] == 'cat 03':
+            return None
+        return {**doc, 'name': doc['name'].upper()}
+
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        stats = reindex(
+            _cnx(), source='cats', target='kats', transform=_transform, size=3
+        )
+    assert stats == ReindexStats(read=10, indexed=9, dropped=1)
+    assert sorted(client.indexed) == [id_ for id_ in _IDS if id_ != '03']
+    assert client.indexed['00'] == ('kats', {'name': 'CAT 00'})
+    assert client.searches[1]['search_after'] == ['02'], \
+        'Pages should be retrieved with search_after.'
+
+
+def test_reindex_resumes_from_checkpoint(tmp_path: Path):
+    """
+    Arrange: Start a reindex that fails partway through.
+    Act: Run it again with the same checkpoint.
+    Assert: The second run picks up where the first left off.
+
+    :param tmp_path: a temporary directory
+    """
+    client = _Client()
+    checkpoint = tmp_path / 'reindex.json'
+
+    def _fail(doc: dict):
+        if doc['name'] == 'cat 06':
+            raise RuntimeError('Oops!')
+        return doc
+
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        with pytest.raises(RuntimeError):
+            reindex(
+                _cnx(),
+                source='cats',
+                target='kats',
+                transform=_fail,
+                size=4,
+                checkpoint=checkpoint
+            )
+        after = json.loads(checkpoint.read_text())['after'][0]
+        assert after < '06', \
+            'The checkpoint should follow the documents that were written.'
+        client.indexed.clear()
+        stats = reindex(
+            _cnx(),
+            source='cats',
+            target='kats',
+            size=4,
+            checkpoint=checkpoint
+        )
+    assert sorted(client.indexed) == [id_ for id_ in _IDS if id_ > after]
+    assert stats.indexed == 10
+    assert not checkpoint.exists(), \
+        'The checkpoint should be removed when the reindex finishes.'
+    with pytest.raises(ValueError):
+        checkpoint.write_text(json.dumps({'source': 'dogs', 'target': 'x'}))
+        reindex(_cnx(), source='cats', target='kats', checkpoint=checkpoint)
+
+
+def test_watermark_waits_for_earlier_documents():
+    """
+    Arrange: Note some documents.
+    Act: Finish them out of order.
+    Assert: The watermark only moves past documents that are all done.
+    """
+    watermark = _Watermark(None)
+    for id_ in 'abcd':
+        watermark.add(id_, [id_])
+    watermark.done('b')
+    assert watermark.after is None
+    watermark.done('a')
+    assert watermark.after == ['b']
+    watermark.add('e', ['e'], pending=False)
+    watermark.done('d')
+    assert watermark.after == ['b']
+    watermark.done('c')
+    assert watermark.after == ['e']
+
+
+def test_throttled():
+    """
+    Arrange: Replace the clock.
+    Act: Throttle some items.
+    Assert: The items are spaced out.
+    """
+    clock = mock.MagicMock()
+    clock.monotonic.return_value = 0
+    with mock.patch('elastalk.reindex.time', clock):
+        assert list(_throttled(range(3), rate=2)) == [0, 1, 2]
+    assert [c[0][0] for c in clock.sleep.call_args_list] == [0.5, 1.0]
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+from unittest import mock
+import uuid
+import pytest
+from elastalk.config import BlobConf, ElastalkConf
+from elastalk.connect import ElastalkConnection
+from elastalk.search import (
+    HitView,
+    extract_hit,
+    extract_hits,
+    export_slices,
+    iter_documents,
+    iter_sliced_documents
+)
+
+
+class _SearchClient:
+    """
+    A stand-in Elasticsearch client that serves a fixed set of documents
+    through scrolls and `search_after` searches.
+    """
+    def __init__(self, docs):
+        self.hits = [
+            {'_id': str(uuid.UUID(int=i)), '_source': doc, 'sort': [i]}
+            for i, doc in enumerate(docs)
+        ]
+        self.scrolls = {}
+        self.cleared = []
+        self.searches = 0
+
+    @staticmethod
+    def _page(hits, start: int, size: int):
+        return {'hits': {'hits': hits[start:start + size]}}
+
+    def search(self, index, body, scroll=None):
+        self.searches += 1
+        size = body['size']
+        if scroll:
+            hits = self.hits
+            # If this is a slice, only include the hits in the slice.
+            if 'slice' in body:
+                hits = [
+                    h for h in hits
+                    if h['sort'][0] % body['slice']['max'] ==
+                    body['slice']['id']
+                ]
+            scroll_id = f'scroll-{len(self.scrolls)}'
+            self.scrolls[scroll_id] = (size, size, hits)
+            return {'_scroll_id': scroll_id, **self._page(hits, 0, size)}
+        start = body.get('search_after', [-1])[0] + 1
+        return self._page(self.hits, start, size)
+
+    def scroll(self, scroll_id, scroll):
+        start, size, hits = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (start + size, size, hits)
+        return {'_scroll_id': scroll_id, **self._page(hits, start, size)}
+
+    def clear_scroll(self, body, ignore=()):
+        self.cleared.extend(body['scroll_id'])
+
+
+#: a search result used to test hit extraction
+_RESULT = {
+    'hits': {
+        'hits': [
+            {
+                '_id': '22cda64a-15f3-4368-81da-656ac6c2856f',
+                '_index': 'cats',
+                '_source': {'name': 'Mittens', 'lives': 9}
+            },
+            {
+                '_id': '5836327c-3592-4fcb-a925-14a106bdcdab',
+                '_index': 'cats',
+                '_source': {'name': 'Boots', '_index': 'kittens'}
+            }
+        ]
+    }
+}
+
+
+def test_extract_hits():
+    """
+    Arrange/Act: Extract the documents from a search result.
+    Assert: The documents contain the source and the (converted) ID.
+    """
+    docs = list(extract_hits(_RESULT))
+    assert docs[0] == {
+        '_id': uuid.UUID('22cda64a-15f3-4368-81da-656ac6c2856f'),
+        'name': 'Mittens',
+        'lives': 9
+    }
+
+
+def test_extract_hit_no_uuids():
+    """
+    Arrange/Act: Extract a document and opt out of UUID conversion.
+    Assert: The document ID is the raw string.
+    """
+    hit = _RESULT['hits']['hits'][0]
+    assert extract_hit(hit, uuids=False)['_id'] == hit['_id']
+
+
+@pytest.mark.parametrize('uuids', [True, False])
+def test_extract_hits_lazy(uuids: bool):
+    """
+    Arrange/Act: Extract lazy views of the documents in a search result.
+    Assert: The views behave like the dictionaries `extract_hit` returns.
+
+    :param uuids: `True` to convert the document IDs to UUIDs
+    """
+    includes = ('_id', '_index')
+    views = list(
+        extract_hits(_RESULT, includes=includes, uuids=uuids, lazy=True)
+    )
+    assert all(isinstance(v, HitView) for v in views)
+    for view, hit in zip(views, _RESULT['hits']['hits']):
+        expected = extract_hit(hit, includes=includes, uuids=uuids)
+        assert view == expected, \
+            'The view should be equal to the extracted document.'
+        assert len(view) == len(expected)
+        assert set(view.keys()) == set(expected.keys())
+        assert view.materialize() == expected
+        assert isinstance(view.materialize(), dict)
+    assert views[1]['_index'] == 'kittens', \
+        'Values in the source document should take precedence over metadata.'
+    with pytest.raises(KeyError):
+        _ = views[0]['_score']
+
+
+def test_hit_view_read_only():
+    """
+    Arrange: Create a view of a search hit.
+    Act: Try to change a value.
+    Assert: The view can't be modified.
+    """
+    view = HitView(_RESULT['hits']['hits'][0])
+    with pytest.raises(TypeError):
+        view['name'] = 'Socks'
+    assert view['_id'] is view['_id'], 'The UUID should be converted once.'
+
+
+@pytest.fixture(name='cnx')
+def cnx_fixture() -> ElastalkConnection:
+    """
+    This fixture returns a connection to a stand-in client that holds 25
+    documents.
+
+    :return: the connection
+    """
+    client = _SearchClient([{'n': i} for i in range(25)])
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        cnx = ElastalkConnection(ElastalkConf())
+        _ = cnx.client
+    return cnx
+
+
+@pytest.mark.parametrize('sort', [None, [{'n': 'asc'}]])
+def test_iter_documents(cnx: ElastalkConnection, sort):
+    """
+    Arrange: Create a connection to a client that holds 25 documents.
+    Act: Iterate over all the documents, ten at a time.
+    Assert: Every document is returned (in order) and scrolls are cleared.
+
+    :param cnx: the connection
+    :param sort: the search_after sort (or `None` to scroll)
+    """
+    docs = list(iter_documents(cnx, index='test', size=10, sort=sort))
+    assert [d['n'] for d in docs] == list(range(25)), \
+        'All of the documents should be returned in order.'
+    assert docs[0]['_id'] == uuid.UUID(int=0), \
+        'The document ID should be included.'
+    if not sort:
+        assert cnx.client.cleared == ['scroll-0'], \
+            'The scroll should be cleared.'
+
+
+def test_iter_documents_closed_early(cnx: ElastalkConnection):
+    """
+    Arrange: Start iterating over the documents with a scroll.
+    Act: Close the iteration after the first document.
+    Assert: The scroll is cleared.
+
+    :param cnx: the connection
+    """
+    docs = iter_documents(cnx, index='test', size=10)
+    assert next(docs)['n'] == 0
+    docs.close()
+    assert cnx.client.cleared == ['scroll-0'], \
+        'The scroll should be cleared when the iteration is closed early.'
+
+
+def test_iter_documents_unpack():
+    """
+    Arrange: Create a connection to a client that holds packed documents.
+    Act: Iterate over the documents and ask for them to be unpacked.
+    Assert: The unpacked documents match the originals.
+    """
+    cnx = ElastalkConnection(ElastalkConf(blobs=BlobConf(enabled=True)))
+    originals = [{'n': i} for i in range(5)]
+    client = _SearchClient([cnx.pack(doc, index='test') for doc in originals])
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        docs = list(
+            iter_documents(cnx, index='test', size=2, includes=(), unpack=True)
+        )
+    assert docs == originals, 'The documents should be unpacked.'
+
+
+@pytest.mark.parametrize('slices', [1, 4])
+def test_iter_sliced_documents(cnx: ElastalkConnection, slices: int):
+    """
+    Arrange: Create a connection to a client that holds 25 documents.
+    Act: Iterate over all the documents with a sliced scroll.
+    Assert: Every document is returned and every scroll is cleared.
+
+    :param cnx: the connection
+    :param slices: the number of slices
+    """
+    docs = list(
+        iter_sliced_documents(cnx, index='test', slices=slices, size=3)
+    )
+    assert sorted(d['n'] for d in docs) == list(range(25)), \
+        'All of the documents should be returned.'
+    assert sorted(cnx.client.cleared) == sorted(cnx.client.scrolls.keys()), \
+        'Every scroll should be cleared.'
+    assert len(cnx.client.scrolls) == slices, \
+        'There should be a scroll for each slice.'
+
+
+def test_iter_sliced_documents_closed_early(cnx: ElastalkConnection):
+    """
+    Arrange: Start iterating over the documents with a sliced scroll.
+    Act: Close the iteration after the first document.
+    Assert: Every scroll is cleared.
+
+    :param cnx: the connection
+    """
+    docs = iter_sliced_documents(cnx, index='test', slices=4, size=2)
+    _ = next(docs)
+    docs.close()
+    assert sorted(cnx.client.cleared) == sorted(cnx.client.scrolls.keys()), \
+        'Every scroll should be cleared when the iteration is closed early.'
+
+
+def test_iter_sliced_documents_limited_by_maxsize(cnx: ElastalkConnection):
+    """
+    Arrange: Create a connection with a connection pool of ten.
+    Act: Ask for more slices than there are connections.
+    Assert: The number of slices is limited to the size of the pool.
+
+    :param cnx: the connection
+    """
+    docs = list(iter_sliced_documents(cnx, index='test', slices=100))
+    assert len(docs) == 25
+    assert len(cnx.client.scrolls) == cnx.config.maxsize
+
+
+def test_export_slices(cnx: ElastalkConnection, tmp_path: Path):
+    """
+    Arrange: Create a connection to a client that holds 25 documents.
+    Act: Export the documents, one file per slice.
+    Assert: Every document is written to one of the files.
+
+    :param cnx: the connection
+    :param tmp_path: a temporary directory
+    """
+    counts = export_slices(cnx, index='test', path=tmp_path, slices=3, size=4)
+    assert len(counts) == 3, 'There should be a file for each slice.'
+    docs = [
+        json.loads(line)
+        for file in counts
+        for line in file.read_text().splitlines()
+    ]
+    assert sum(counts.values()) == len(docs) == 25
+    assert sorted(d['n'] for d in docs) == list(range(25))
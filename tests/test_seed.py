@@ -1,9 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import gzip
+import json
+import os
 from pathlib import Path
+import shutil
+import threading
 from unittest import mock
+import uuid
 import pytest
-from elastalk.seed import seed
+from elastalk.config import ElastalkConf
+from elastalk.connect import ElastalkConnection
+from elastalk.seed import (
+    iter_seed_files,
+    seed,
+    SeedStats,
+    _chunks,
+    _Manifest,
+    _pipeline
+)
+from elastalk.serializers import get_serializer
 
 
 @pytest.fixture(scope='module', name='es_config')
@@ -26,6 +42,51 @@ def seed_root_fixture() -> Path:
     return Path(__file__).resolve().parent / 'data' / 'seed'
 
 
+def write_config(path: Path, es_config: Path, extra: str) -> Path:
+    """
+    Write a seed configuration based on another one.
+
+    :param path: the directory in which the configuration is written
+    :param es_config: the original configuration
+    :param extra: additional (top-level) TOML
+    :return: the path to the new configuration
+    """
+    config = path / 'config.toml'
+    config.write_text(f"{extra}\n{es_config.read_text()}")
+    return config
+
+
+def test_iter_seed_files(seed_root: Path):
+    """
+    Arrange: Locate the seed data defined for tests.
+    Act: Walk the seed data.
+    Assert: Each seed file is generated with its index and document type.
+
+    :param seed_root: the path to the seed data directory
+    """
+    seed_files = iter_seed_files(seed_root)
+    assert iter(seed_files) is seed_files, 'The walk should be lazy.'
+    assert sorted((i, d, p.name) for i, d, p in seed_files) == sorted(
+        (p.parent.parent.name, p.parent.name, p.name)
+        for p in (seed_root / 'indexes').glob('*/*/*')
+        if p.is_file()
+    )
+
+
+def test_iter_seed_files_bad_path(seed_root: Path):
+    """
+    Arrange/Act: Walk seed data paths that don't exist (or aren't
+        directories).
+    Assert: The correct exceptions are raised.
+
+    :param seed_root: the path to the seed data directory
+    """
+    with pytest.raises(FileNotFoundError):
+        list(iter_seed_files(seed_root / 'does_not_exist'))
+    with pytest.raises(NotADirectoryError):
+        list(iter_seed_files(seed_root / 'config.toml'))
+
+
 @mock.patch(
     'elasticsearch.Elasticsearch',
     lambda *args, **kwargs: mock.MagicMock()
@@ -81,3 +142,513 @@ def test_seed_index_exists(es_config: str, seed_root: Path):
     """
     # TODO: Add assertions.
     seed(config=es_config, root=seed_root, force=False)
+
+
+class _BulkClient:
+    """
+    A stand-in Elasticsearch client that answers bulk requests, rejecting
+    each document with a `429` the first time it sees it.
+    """
+    def __init__(self):
+        self.seen = set()
+        self.requests = 0
+        self.indices = mock.MagicMock(**{'exists.return_value': False})
+
+    def bulk(self, body: str):
+        self.requests += 1
+        lines = body.splitlines()
+        items = []
+        for action in lines[::2]:
+            _id = json.loads(action)['index']['_id']
+            status = 201 if _id in self.seen else 429
+            self.seen.add(_id)
+            items.append({'index': {'_id': _id, 'status': status}})
+        return {'items': items}
+
+
+def test_seed_bulk_retries_rejected(
+        tmp_path: Path,
+        es_config: Path,
+        seed_root: Path
+):
+    """
+    Arrange: Mock a client that rejects each document once with a `429`.
+    Act:  Call the `seed` function.
+    Assert: Every document is eventually indexed and the summary reflects it.
+
+    :param es_config: the Elasticsearch config
+    :param seed_root: the path to the seed data directory
+    """
+    client = _BulkClient()
+    config = write_config(tmp_path, es_config, 'bulk_initial_backoff = 0')
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        stats = seed(config=config, root=seed_root, force=True)
+    assert stats['cats'] == SeedStats(indexed=3), \
+        "All of the 'cats' documents should be indexed."
+    assert stats['dogs'] == SeedStats(indexed=2), \
+        "All of the 'dogs' documents should be indexed."
+    assert client.requests == 2, \
+        "Rejected documents should be retried in a single extra request."
+
+
+def test_seed_bulk_chunks():
+    """
+    Arrange: Create a set of documents.
+    Act: Split them into chunks with count and size limits.
+    Assert: No chunk exceeds either limit.
+    """
+    docs = [('idx', 'doc', str(i), {'n': 'x' * 50}) for i in range(10)]
+    chunks = list(_chunks(docs, chunk_size=3, max_bytes=10485760))
+    assert [len(c) for c in chunks] == [3, 3, 3, 1], \
+        'Chunks should be limited by the document count.'
+    chunks = list(_chunks(docs, chunk_size=100, max_bytes=300))
+    assert all(
+        sum(len(a) + len(s) + 2 for _, _, a, s in c) <= 300 for c in chunks
+    ), 'Chunks should be limited by size.'
+    assert sum(len(c) for c in chunks) == len(docs), \
+        'Every document should appear in a chunk.'
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_seed_pipeline(seed_root: Path, processes: bool):
+    """
+    Arrange: Collect the seed files for the 'cats' index.
+    Act: Load them through the worker pipeline with a very small queue.
+    Assert: Every document is produced in the order the files were supplied.
+
+    :param seed_root: the path to the seed data directory
+    :param processes: `True` to load the files in worker processes
+    """
+    files = [
+        ('cats', 'cat', f)
+        for f in sorted((seed_root / 'indexes' / 'cats' / 'cat').iterdir())
+    ]
+    docs = list(
+        _pipeline(
+            files=iter(files),
+            packer=ElastalkConnection(ElastalkConf()),
+            workers=2,
+            queue_size=1,
+            processes=processes
+        )
+    )
+    assert [d[2] for d in docs] == [f.name for _, _, f in files], \
+        'Documents should be produced in order.'
+    assert all(d[0] == 'cats' and d[1] == 'cat' for d in docs), \
+        'The index and document type should be preserved.'
+
+
+def write_lines(path: Path, docs: list) -> Path:
+    """
+    Write documents to an NDJSON seed file (compressing it if the name says
+    so).
+
+    :param path: the path to the seed file
+    :param docs: the documents
+    :return: the path to the seed file
+    """
+    data = b''.join(json.dumps(doc).encode('utf-8') + b'\n\n' for doc in docs)
+    if path.name.endswith('.gz'):
+        data = gzip.compress(data)
+    elif path.name.endswith('.zst'):
+        data = pytest.importorskip('zstandard').ZstdCompressor().compress(data)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.parametrize('name', ['cats.ndjson', 'cats.jsonl.gz', 'cats.jsonl.zst'])
+def test_seed_pipeline_lines(tmp_path: Path, name: str):
+    """
+    Arrange: Write an NDJSON seed file (and an empty one).
+    Act: Load them through the worker pipeline.
+    Assert: A document is produced for each line, in order, with its ID
+        taken from the document.
+
+    :param tmp_path: a temporary directory
+    :param name: the name of the seed file
+    """
+    docs = [{'_id': str(i), 'name': f'cat {i}'} for i in range(250)]
+    docs.append({'name': 'anonymous'})
+    files = [
+        ('cats', 'cat', write_lines(tmp_path / name, docs)),
+        ('cats', 'cat', write_lines(tmp_path / 'empty.ndjson', []))
+    ]
+    loaded = list(
+        _pipeline(
+            files=iter(files),
+            packer=ElastalkConnection(ElastalkConf()),
+            workers=2,
+            queue_size=1
+        )
+    )
+    assert [d[2] for d in loaded] == [str(i) for i in range(250)] + [None], \
+        'Each line should produce a document (in order).'
+    assert loaded[0][3] == {'name': 'cat 0'}, \
+        'The ID field should not be part of the document.'
+
+
+def test_seed_pipeline_closed_early(seed_root: Path):
+    """
+    Arrange: Start loading seed files through the worker pipeline.
+    Act: Close the pipeline after the first document.
+    Assert: The pipeline shuts down without consuming the remaining files.
+
+    :param seed_root: the path to the seed data directory
+    """
+    def _files():
+        while True:
+            yield (
+                'cats',
+                'cat',
+                seed_root / 'indexes' / 'cats' / 'cat' /
+                '22cda64a-15f3-4368-81da-656ac6c2856f'
+            )
+
+    docs = _pipeline(
+        files=_files(),
+        packer=ElastalkConnection(ElastalkConf()),
+        workers=1,
+        queue_size=2
+    )
+    assert next(docs)[0] == 'cats'
+    docs.close()
+
+
+def test_seed_routes_writes(tmp_path: Path, seed_root: Path):
+    """
+    Arrange: Configure writes to the 'dogs' index to go to another cluster.
+    Act:  Call the `seed` function.
+    Assert: Each index is seeded on the cluster that serves its writes.
+
+    :param tmp_path: a temporary directory
+    :param seed_root: the path to the seed data directory
+    """
+    config = tmp_path / 'config.toml'
+    config.write_text(
+        "seeds = ['hot01']\n"
+        "bulk_initial_backoff = 0\n"
+        "[clusters.ingest]\n"
+        "seeds = ['ingest01']\n"
+        "[indexes.dogs]\n"
+        "write_cluster = 'ingest'\n"
+    )
+    clients = {}
+
+    def _client(seeds, **_):
+        return clients.setdefault(seeds[0], _BulkClient())
+
+    with mock.patch('elasticsearch.Elasticsearch', _client):
+        stats = seed(config=config, root=seed_root, force=True)
+    assert stats['cats'] == SeedStats(indexed=3)
+    assert stats['dogs'] == SeedStats(indexed=2)
+    assert len(clients['hot01'].seen) == 3, \
+        "The 'cats' documents should be sent to the default cluster."
+    assert len(clients['ingest01'].seen) == 2, \
+        "The 'dogs' documents should be sent to the 'ingest' cluster."
+
+
+def test_seed_creates_indexes_with_mappings(es_config: Path, seed_root: Path):
+    """
+    Arrange: Mock a client.
+    Act:  Call the `seed` function.
+    Assert: Each index is created (with its mappings and settings), on the
+        calling thread, before any documents are sent.
+
+    :param es_config: the Elasticsearch config
+    :param seed_root: the path to the seed data directory
+    """
+    calls = []
+    threads = set()
+    client = mock.MagicMock()
+    client.indices.exists.return_value = False
+    client.indices.create.side_effect = (
+        lambda index, body: calls.append(('create', index, body))
+        or threads.add(threading.current_thread())
+    )
+    client.bulk.side_effect = lambda body: calls.append(('bulk', body)) or {
+        'items': [
+            {'index': {'status': 201}} for _ in body.splitlines()[::2]
+        ]
+    }
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        seed(config=seed_root / 'config.toml', root=seed_root, force=True)
+    creates = {c[1]: c[2] for c in calls if c[0] == 'create'}
+    assert set(creates) == {'cats', 'dogs'}
+    assert 'cat' in creates['cats']['mappings'], \
+        "The 'cats' index should be created with its mappings."
+    assert 'mappings' not in creates['dogs']
+    assert creates['dogs']['settings'] == {
+        'index.mapping.total_fields.limit': 1000
+    }
+    first_bulk = next(i for i, c in enumerate(calls) if c[0] == 'bulk')
+    assert all(
+        calls.index(('create', index, body)) < first_bulk
+        for index, body in creates.items()
+    ), 'Every index should be created before documents are sent.'
+    assert threads == {threading.current_thread()}, \
+        'Indexes should be created before the workers start reading files.'
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_seed_load_mode(
+        tmp_path: Path,
+        es_config: Path,
+        seed_root: Path,
+        fail: bool
+):
+    """
+    Arrange: Mock a client and enable load mode (and force-merging).
+    Act:  Call the `seed` function (with bulk requests that may fail).
+    Assert: Each index is switched into load mode and restored afterwards.
+
+    :param tmp_path: a temporary directory
+    :param es_config: the Elasticsearch config
+    :param seed_root: the path to the seed data directory
+    :param fail: `True` if the bulk requests should fail
+    """
+    config = write_config(
+        tmp_path, es_config, 'seed_load_mode = true\nseed_forcemerge = 1'
+    )
+    client = mock.MagicMock()
+    client.indices.exists.return_value = False
+    client.indices.get_settings.side_effect = lambda index, **_: {
+        index: {'settings': {'index.number_of_replicas': '1'}}
+    }
+    client.bulk.side_effect = (
+        RuntimeError('Oops.') if fail
+        else lambda body: {
+            'items': [
+                {'index': {'status': 201}} for _ in body.splitlines()[::2]
+            ]
+        }
+    )
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        if fail:
+            with pytest.raises(RuntimeError):
+                seed(config=config, root=seed_root, force=True)
+        else:
+            seed(config=config, root=seed_root, force=True)
+    bodies = {}
+    for call in client.indices.put_settings.call_args_list:
+        bodies.setdefault(call[1]['index'], []).append(call[1]['body'])
+    for index in ('cats', 'dogs'):
+        assert bodies[index] == [
+            {
+                'index': {
+                    'refresh_interval': '-1',
+                    'number_of_replicas': 0,
+                    'translog.durability': 'async'
+                }
+            },
+            {
+                'index': {
+                    'refresh_interval': None,
+                    'number_of_replicas': '1',
+                    'translog.durability': None
+                }
+            }
+        ], f"The '{index}' index should be restored after load mode."
+    assert client.indices.refresh.call_count == 2
+    client.indices.forcemerge.assert_any_call(
+        index='cats', max_num_segments=1
+    )
+
+
+class _RecordingClient:
+    """
+    A stand-in Elasticsearch client that accepts every bulk item and records
+    the actions it was asked to perform.
+    """
+    def __init__(self):
+        self.exists = False
+        self.actions = []
+        self.indices = mock.MagicMock()
+        self.indices.exists.side_effect = lambda index: self.exists
+        self.transport = mock.MagicMock()
+
+    def bulk(self, body: str):
+        items = []
+        for line in body.splitlines():
+            action = json.loads(line)
+            op = next(iter(action))
+            if op not in ('index', 'delete'):
+                continue  # This is a source line.
+            self.actions.append((op, action[op]['_id']))
+            items.append({op: {'status': 404 if op == 'delete' else 201}})
+        return {'items': items}
+
+
+def test_seed_incremental(tmp_path: Path, seed_root: Path):
+    """
+    Arrange: Copy the seed data and seed it incrementally.
+    Act: Seed it again without changes, then again after adding, changing,
+        touching and removing seed files.
+    Assert: Only new and changed files are sent and the documents of removed
+        files are deleted.
+
+    :param tmp_path: a temporary directory
+    :param seed_root: the path to the seed data directory
+    """
+    root = tmp_path / 'seed'
+    shutil.copytree(seed_root, root)
+    cats = root / 'indexes' / 'cats' / 'cat'
+    dogs = root / 'indexes' / 'dogs' / 'dog'
+    client = _RecordingClient()
+
+    def _seed():
+        client.actions = []
+        with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+            stats = seed(root=root, incremental=True)
+        client.exists = True
+        return stats
+
+    # The first run sends everything.
+    stats = _seed()
+    assert stats['cats'] == SeedStats(indexed=3)
+    assert stats['dogs'] == SeedStats(indexed=2)
+    assert (root / '.seed-manifest.json').exists()
+    # The second run has nothing to do.
+    stats = _seed()
+    assert stats['cats'] == SeedStats(skipped=3)
+    assert stats['dogs'] == SeedStats(skipped=2)
+    assert client.actions == []
+    # Make some changes.
+    changed, touched = sorted(cats.iterdir())[:2]
+    changed.write_text('{"name": "Changed"}')
+    os.utime(changed, ns=(0, changed.stat().st_mtime_ns + 10 ** 9))
+    os.utime(touched, ns=(0, touched.stat().st_mtime_ns + 10 ** 9))
+    added = cats / str(uuid.UUID(int=1))
+    added.write_text('{"name": "Added"}')
+    removed = sorted(dogs.iterdir())[0]
+    removed.unlink()
+    stats = _seed()
+    assert stats['cats'] == SeedStats(indexed=2, skipped=2)
+    assert stats['dogs'] == SeedStats(skipped=1, deleted=1)
+    assert sorted(client.actions) == sorted([
+        ('index', changed.name),
+        ('index', added.name),
+        ('delete', removed.name)
+    ])
+    # And now there's nothing to do again.
+    stats = _seed()
+    assert client.actions == []
+
+
+def test_seed_incremental_load_mode(tmp_path: Path, seed_root: Path):
+    """
+    Arrange: Copy the seed data and mock a client for which the indexes
+        already exist.
+    Act: Seed the data incrementally, in load mode.
+    Assert: The existing indexes are switched into load mode and restored
+        afterwards (without being created again).
+
+    :param tmp_path: a temporary directory
+    :param seed_root: the path to the seed data directory
+    """
+    root = tmp_path / 'seed'
+    shutil.copytree(seed_root, root)
+    client = _RecordingClient()
+    client.exists = True
+    client.indices.get_settings.side_effect = lambda index, **_: {
+        index: {'settings': {'index.number_of_replicas': '1'}}
+    }
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        stats = seed(
+            root=root, incremental=True, options={'seed_load_mode': True}
+        )
+    assert stats['cats'] == SeedStats(indexed=3)
+    client.indices.create.assert_not_called()
+    replicas = {}
+    for call in client.indices.put_settings.call_args_list:
+        replicas.setdefault(call[1]['index'], []).append(
+            call[1]['body']['index']['number_of_replicas']
+        )
+    assert replicas == {'cats': [0, '1'], 'dogs': [0, '1']}, \
+        'Existing indexes should be switched into load mode and restored.'
+
+
+def test_seed_index_exists_skips_documents(tmp_path: Path):
+    """
+    Arrange: Write seed files (including plain and compressed NDJSON files)
+        and mock a client for which the index already exists.
+    Act: Seed the data.
+    Assert: Every document in the seed files is counted as skipped.
+
+    :param tmp_path: a temporary directory
+    """
+    (tmp_path / 'config.toml').write_text('')
+    catdir = tmp_path / 'indexes' / 'cats' / 'cat'
+    catdir.mkdir(parents=True)
+    for i in range(2):
+        (catdir / str(uuid.UUID(int=i))).write_text('{"name": "Cat"}')
+    (catdir / 'more.ndjson').write_text(
+        '{"_id": "a"}\n\n{"_id": "b"}\n{"_id": "c"}\n'
+    )
+    with gzip.open(str(catdir / 'even-more.ndjson.gz'), 'wt') as gz:
+        gz.write('{"_id": "d"}\n{"_id": "e"}\n')
+    client = _RecordingClient()
+    client.exists = True
+    with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+        stats = seed(root=tmp_path)
+    assert stats['cats'] == SeedStats(skipped=7)
+    assert client.actions == []
+
+
+def test_seed_manifest_replays_journal(tmp_path: Path):
+    """
+    Arrange: Write a manifest and a journal (with an unfinished last line).
+    Act: Load the manifest.
+    Assert: The journal's complete entries are applied.
+
+    :param tmp_path: a temporary directory
+    """
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps({
+        'version': 1,
+        'files': {'a': {'index': 'i'}, 'b': {'index': 'i'}}
+    }))
+    (tmp_path / 'manifest.json.journal').write_text(
+        '["c", {"index": "i"}]\n["a", null]\n["d", {"ind'
+    )
+    manifest = _Manifest.load(path, serializer=get_serializer())
+    assert sorted(manifest.files) == ['b', 'c']
+    manifest.save()
+    assert not (tmp_path / 'manifest.json.journal').exists()
+    assert sorted(json.loads(path.read_text())['files']) == ['b', 'c']
+
+
+def test_seed_incremental_lines(tmp_path: Path):
+    """
+    Arrange: Seed an NDJSON seed file incrementally.
+    Act: Remove and change some of its documents and seed it again.
+    Assert: The file's documents are sent again and the documents that are
+        no longer in it are deleted.
+
+    :param tmp_path: a temporary directory
+    """
+    root = tmp_path / 'seed'
+    lines = root / 'indexes' / 'cats' / 'cat' / 'cats.ndjson'
+    write_lines(lines, [{'_id': str(i), 'name': f'cat {i}'} for i in range(5)])
+    (root / 'config.toml').write_text('')
+    client = _RecordingClient()
+
+    def _seed():
+        client.actions = []
+        with mock.patch('elasticsearch.Elasticsearch', lambda *a, **kw: client):
+            stats = seed(root=root, incremental=True)
+        client.exists = True
+        return stats
+
+    assert _seed()['cats'] == SeedStats(indexed=5)
+    assert _seed()['cats'] == SeedStats(skipped=5)
+    write_lines(lines, [{'_id': str(i), 'name': 'cat'} for i in range(3)])
+    os.utime(lines, ns=(0, lines.stat().st_mtime_ns + 10 ** 9))
+    assert _seed()['cats'] == SeedStats(indexed=3, deleted=2)
+    assert sorted(client.actions) == sorted(
+        [('index', str(i)) for i in range(3)] +
+        [('delete', str(i)) for i in range(3, 5)]
+    )
+    assert _seed()['cats'] == SeedStats(skipped=3)
+    lines.unlink()
+    assert _seed()['cats'] == SeedStats(deleted=3)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from decimal import Decimal
+import json
+from unittest import mock
+import uuid
+import elasticsearch.helpers
+import pytest
+from elastalk.config import ElastalkConf, ElastalkConfigException
+from elastalk.connect import ElastalkConnection
+from elastalk.fake import FakeElasticsearch
+from elastalk.serializers import (
+    ElasticsearchSerializer,
+    Serializer,
+    SERIALIZERS,
+    get_serializer
+)
+
+
+@pytest.mark.parametrize('name', list(SERIALIZERS.keys()))
+def test_serializer_round_trip(name: str):
+    """
+    Arrange: Get each of the installed serializers.
+    Act: Serialize, then deserialize, a document.
+    Assert: The serialized form is UTF-8 encoded bytes and the deserialized
+        document matches the original.
+
+    :param name: the name of the serializer
+    """
+    if not SERIALIZERS[name].available():
+        pytest.skip(f"The '{name}' serializer is not installed.")
+    serializer = get_serializer(name)
+    original = {'name': 'Mittens', 'lives': 9, 'toys': ['yarn', 'mouse']}
+    dumped = serializer.dumps(original)
+    assert isinstance(dumped, bytes), 'Serialized documents should be bytes.'
+    assert serializer.loads(dumped) == original, \
+        'The deserialized document should match the original.'
+
+
+@pytest.mark.parametrize('name', list(SERIALIZERS.keys()))
+def test_serializer_default(name: str):
+    """
+    Arrange: Get each of the installed serializers.
+    Act: Serialize a document that contains a UUID and a datetime.
+    Assert: The values are serialized as strings.
+
+    :param name: the name of the serializer
+    """
+    if not SERIALIZERS[name].available():
+        pytest.skip(f"The '{name}' serializer is not installed.")
+    _id = uuid.uuid4()
+    when = datetime(2019, 1, 23, 12, 30)
+    loaded = get_serializer(name).loads(
+        get_serializer(name).dumps({'id': _id, 'when': when})
+    )
+    assert loaded['id'] == str(_id), 'UUIDs should be serialized as strings.'
+    assert loaded['when'].startswith('2019-01-23T12:30'), \
+        'Datetimes should be serialized in ISO format.'
+
+
+@pytest.mark.parametrize('name', list(SERIALIZERS.keys()))
+def test_serializer_matches_json(name: str):
+    """
+    Arrange: Get each of the installed serializers.
+    Act: Serialize a document with integer keys and an integer that doesn't
+        fit in 64 bits.
+    Assert: The output is the same as the standard library's.
+
+    :param name: the name of the serializer
+    """
+    if not SERIALIZERS[name].available():
+        pytest.skip(f"The '{name}' serializer is not installed.")
+    serializer = get_serializer(name)
+    for original in [{1: 'one', 2: 'two'}, {'big': 2 ** 70}]:
+        dumped = serializer.dumps(original)
+        assert json.loads(dumped) == json.loads(json.dumps(original)), \
+            f"The '{name}' serializer should match the standard library."
+    assert json.loads(serializer.dumps({'big': 2 ** 70}))['big'] == 2 ** 70, \
+        'Big integers should be serialized exactly.'
+
+
+@pytest.mark.parametrize('name', list(SERIALIZERS.keys()))
+def test_serializer_decimal(name: str):
+    """
+    Arrange: Get each of the installed serializers.
+    Act: Serialize decimals that can (and can't) be represented as floats.
+    Assert: The decimals are serialized as floats unless that would lose
+        precision, in which case they're serialized as strings.
+
+    :param name: the name of the serializer
+    """
+    if not SERIALIZERS[name].available():
+        pytest.skip(f"The '{name}' serializer is not installed.")
+    precise = Decimal('3.14159265358979323846264338327950288')
+    loaded = json.loads(get_serializer(name).dumps({
+        'price': Decimal('19.99'),
+        'pi': precise
+    }))
+    assert loaded['price'] == 19.99, \
+        'Decimals that survive the trip should be serialized as floats.'
+    assert Decimal(loaded['pi']) == precise, \
+        'Decimals should be serialized without losing precision.'
+
+
+def test_get_serializer_default():
+    """
+    Arrange/Act: Get a serializer without naming one.
+    Assert: The standard library's serializer is returned.
+    """
+    assert type(get_serializer()) is Serializer  # pylint: disable=unidiomatic-typecheck
+
+
+def test_get_serializer_unknown():
+    """
+    Arrange/Act: Get a serializer with a name that isn't known.
+    Assert: A `ValueError` is raised.
+    """
+    with pytest.raises(ValueError):
+        get_serializer('not_a_serializer')
+
+
+def test_elasticsearch_serializer_passes_strings():
+    """
+    Arrange: Wrap a serializer for the Elasticsearch client.
+    Act: Serialize a string, bytes and a dictionary.
+    Assert: Strings and bytes are passed along and dictionaries are encoded
+        as strings.
+    """
+    es_serializer = ElasticsearchSerializer(Serializer())
+    assert es_serializer.dumps('{"a":1}') == '{"a":1}'
+    assert es_serializer.dumps(b'{"a":1}') == b'{"a":1}'
+    assert es_serializer.dumps({'a': 'ü'}) == '{"a":"ü"}'
+    assert es_serializer.loads(b'{"a":1}') == {'a': 1}
+
+
+@pytest.mark.parametrize('name', list(SERIALIZERS.keys()))
+def test_elasticsearch_serializer_client(name: str):
+    """
+    Arrange: Create a connection (to a fake server) configured to use each of
+        the installed serializers.
+    Act: Send a bulk request with a list body, index documents with the
+        bulk helper and send a multi-search.
+    Assert: The client accepts what the serializer gives it, and the
+        documents are indexed and found.
+
+    :param name: the name of the serializer
+    """
+    if not SERIALIZERS[name].available():
+        pytest.skip(f"The '{name}' serializer is not installed.")
+    with FakeElasticsearch() as fake:
+        es = ElastalkConnection(
+            config=ElastalkConf(seeds=fake.seeds, serializer=name)
+        ).client
+        resp = es.bulk(body=[
+            {'index': {'_index': 'cats', '_type': 'cat', '_id': 'garfield'}},
+            {'name': 'Garfield'}
+        ])
+        assert not resp['errors']
+        indexed, errors = elasticsearch.helpers.bulk(es, [
+            {'_index': 'cats', '_type': 'cat', '_id': str(i), 'name': f'cat {i}'}
+            for i in range(5)
+        ])
+        assert (indexed, errors) == (5, [])
+        resp = es.msearch([
+            {'index': 'cats'}, {'query': {'term': {'name': 'Garfield'}}},
+            {'index': 'cats'}, {'query': {'match_all': {}}, 'size': 10}
+        ])
+        assert [
+            len(r['hits']['hits']) for r in resp['responses']
+        ] == [1, 6]
+
+
+def test_connection_serializer_not_installed():
+    """
+    Arrange: Configure a connection with an unknown serializer.
+    Act: Retrieve the serializer.
+    Assert: An `ElastalkConfigException` is raised.
+    """
+    es_cnx = ElastalkConnection(
+        config=ElastalkConf(serializer='not_a_serializer')
+    )
+    with pytest.raises(ElastalkConfigException):
+        _ = es_cnx.serializer
+
+
+def test_connection_client_serializer():
+    """
+    Arrange: Create a connection configured to use the standard library.
+    Act: Retrieve the client.
+    Assert: The client is created with the connection's serializer.
+    """
+    es_cnx = ElastalkConnection(config=ElastalkConf(serializer='json'))
+    with mock.patch('elasticsearch.Elasticsearch') as es_cls:
+        _ = es_cnx.client
+    serializer = es_cls.call_args[1]['serializer']
+    assert isinstance(serializer, ElasticsearchSerializer)
+    assert serializer.serializer is es_cnx.serializer